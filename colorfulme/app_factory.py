@@ -24,6 +24,7 @@ def create_app() -> Flask:
         static_folder=os.path.join(project_root, 'static'),
     )
 
+    source_image_max_bytes = int(os.getenv('SOURCE_IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
     app.config.update(
         SECRET_KEY=os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production'),
         SQLALCHEMY_DATABASE_URI=os.getenv('DATABASE_URL', 'sqlite:///colorfulme.db'),
@@ -39,6 +40,10 @@ def create_app() -> Flask:
         SESSION_COOKIE_HTTPONLY=True,
         SESSION_COOKIE_SAMESITE='Lax',
         REMEMBER_COOKIE_DURATION=timedelta(days=30),
+        # Room for a base64-encoded source image plus the rest of the JSON body.
+        MAX_CONTENT_LENGTH=int(os.getenv('MAX_CONTENT_LENGTH') or source_image_max_bytes * 4 // 3 + 1024 * 1024),
+        SOURCE_IMAGE_MAX_BYTES=source_image_max_bytes,
+        SOURCE_IMAGE_MAX_DECODE_MB=int(os.getenv('SOURCE_IMAGE_MAX_DECODE_MB', '96')),
         PROGRAMMATIC_CONTENT_SOURCE=os.getenv('PROGRAMMATIC_CONTENT_SOURCE', 'content/programmatic_content.csv'),
         PROGRAMMATIC_CONTENT_SHEET=os.getenv('PROGRAMMATIC_CONTENT_SHEET', 'content'),
         PROGRAMMATIC_CONTENT_MANIFEST=os.getenv('PROGRAMMATIC_CONTENT_MANIFEST', 'static/data/programmatic_content_manifest.json'),
@@ -52,8 +57,87 @@ def create_app() -> Flask:
         OPENAI_QUALITY_PREMIUM=os.getenv('OPENAI_QUALITY_PREMIUM', 'high'),
         OPENAI_IMAGE_QUALITY_DEFAULT=os.getenv('OPENAI_IMAGE_QUALITY_DEFAULT', 'medium'),
         OPENAI_API_KEY=os.getenv('OPENAI_API_KEY', ''),
+        OPENAI_BASE_URL=os.getenv('OPENAI_BASE_URL', ''),
+        OPENAI_POOL_MAX_CONNECTIONS=int(os.getenv('OPENAI_POOL_MAX_CONNECTIONS', '20')),
+        OPENAI_POOL_MAX_KEEPALIVE=int(os.getenv('OPENAI_POOL_MAX_KEEPALIVE', '10')),
+        OPENAI_POOL_KEEPALIVE_SECONDS=float(os.getenv('OPENAI_POOL_KEEPALIVE_SECONDS', '60')),
+        OPENAI_TIMEOUT_SECONDS=float(os.getenv('OPENAI_TIMEOUT_SECONDS', '120')),
+        OPENAI_CONNECT_TIMEOUT_SECONDS=float(os.getenv('OPENAI_CONNECT_TIMEOUT_SECONDS', '10')),
+        OPENAI_MAX_RETRIES=int(os.getenv('OPENAI_MAX_RETRIES', '2')),
+        OPENAI_HEDGE_ENABLED=_bool_env('OPENAI_HEDGE_ENABLED', False),
+        OPENAI_HEDGE_PERCENTILE=float(os.getenv('OPENAI_HEDGE_PERCENTILE', '95')),
+        OPENAI_HEDGE_MIN_SAMPLES=int(os.getenv('OPENAI_HEDGE_MIN_SAMPLES', '20')),
+        OPENAI_HEDGE_DELAY_SECONDS=float(os.getenv('OPENAI_HEDGE_DELAY_SECONDS', '20')),
+        OPENAI_HEDGE_POOL_SIZE=int(os.getenv('OPENAI_HEDGE_POOL_SIZE', '16')),
+        MODEL_CIRCUIT_ENABLED=_bool_env('MODEL_CIRCUIT_ENABLED', True),
+        MODEL_HEALTH_DB_PATH=os.getenv('MODEL_HEALTH_DB_PATH', ''),
+        MODEL_CIRCUIT_WINDOW_SECONDS=float(os.getenv('MODEL_CIRCUIT_WINDOW_SECONDS', '60')),
+        MODEL_CIRCUIT_MIN_REQUESTS=int(os.getenv('MODEL_CIRCUIT_MIN_REQUESTS', '5')),
+        MODEL_CIRCUIT_FAILURE_RATE=float(os.getenv('MODEL_CIRCUIT_FAILURE_RATE', '0.5')),
+        MODEL_CIRCUIT_SLOW_CALL_SECONDS=float(os.getenv('MODEL_CIRCUIT_SLOW_CALL_SECONDS', '0')),
+        MODEL_CIRCUIT_OPEN_SECONDS=float(os.getenv('MODEL_CIRCUIT_OPEN_SECONDS', '30')),
         ALLOW_FAKE_AI=_bool_env('ALLOW_FAKE_AI', True),
         STRICT_MODERATION=_bool_env('STRICT_MODERATION', True),
+        SPECULATIVE_MODERATION=_bool_env('SPECULATIVE_MODERATION', False),
+        LINE_ART_PIPELINE=os.getenv('LINE_ART_PIPELINE', 'auto'),
+        LINE_ART_OUTPUT_MODE=os.getenv('LINE_ART_OUTPUT_MODE', 'rgb'),
+        VECTOR_EXPORT_ENABLED=_bool_env('VECTOR_EXPORT_ENABLED', True),
+        VECTOR_PDF_PAGE_SIZE=os.getenv('VECTOR_PDF_PAGE_SIZE', 'letter'),
+        PNG_ENCODER_PROFILE=os.getenv('PNG_ENCODER_PROFILE', 'fast'),
+        CPU_POOL_WORKERS=int(os.getenv('CPU_POOL_WORKERS', '0')),
+        FALLBACK_RENDER_CACHE_MAX_ENTRIES=int(os.getenv('FALLBACK_RENDER_CACHE_MAX_ENTRIES', '128')),
+        PNG_RECOMPRESS_IDLE=_bool_env('PNG_RECOMPRESS_IDLE', True),
+        PNG_RECOMPRESS_BATCH_SIZE=int(os.getenv('PNG_RECOMPRESS_BATCH_SIZE', '10')),
+        DERIVATIVE_WARM_SIZES=os.getenv('DERIVATIVE_WARM_SIZES', '256:webp,1024:webp'),
+        DERIVATIVE_CACHE_MAX_ENTRIES=int(os.getenv('DERIVATIVE_CACHE_MAX_ENTRIES', '20000')),
+        DERIVATIVE_CACHE_MAX_BYTES=int(os.getenv('DERIVATIVE_CACHE_MAX_BYTES', str(1024 * 1024 * 1024))),
+        DERIVATIVE_CACHE_EVICT_INTERVAL_SECONDS=float(os.getenv('DERIVATIVE_CACHE_EVICT_INTERVAL_SECONDS', '60')),
+        PREVIEW_CACHE_SECONDS=int(os.getenv('PREVIEW_CACHE_SECONDS', str(365 * 24 * 3600))),
+        ASSET_CACHE_SECONDS=int(os.getenv('ASSET_CACHE_SECONDS', str(365 * 24 * 3600))),
+        LOCAL_DELIVERY_MODE=(os.getenv('LOCAL_DELIVERY_MODE') or 'direct').strip().lower(),
+        LOCAL_ACCEL_REDIRECT_PREFIX=os.getenv('LOCAL_ACCEL_REDIRECT_PREFIX', '/_protected/generated/'),
+        LOCAL_STORAGE_LAYOUT=(os.getenv('LOCAL_STORAGE_LAYOUT') or 'sharded').strip().lower(),
+        BOOK_MAX_PAGES=int(os.getenv('BOOK_MAX_PAGES', '200')),
+        STORAGE_UPLOAD_CONCURRENCY=int(os.getenv('STORAGE_UPLOAD_CONCURRENCY', '8')),
+        S3_MULTIPART_THRESHOLD_MB=int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '16')),
+        S3_MULTIPART_CHUNK_MB=int(os.getenv('S3_MULTIPART_CHUNK_MB', '8')),
+        S3_MULTIPART_CONCURRENCY=int(os.getenv('S3_MULTIPART_CONCURRENCY', '4')),
+        S3_POOL_MAX_CONNECTIONS=int(os.getenv('S3_POOL_MAX_CONNECTIONS', '50')),
+        S3_CONNECT_TIMEOUT_SECONDS=float(os.getenv('S3_CONNECT_TIMEOUT_SECONDS', '5')),
+        S3_READ_TIMEOUT_SECONDS=float(os.getenv('S3_READ_TIMEOUT_SECONDS', '60')),
+        S3_MAX_ATTEMPTS=int(os.getenv('S3_MAX_ATTEMPTS', '3')),
+        PRESIGNED_URL_CACHE_MAX_ENTRIES=int(os.getenv('PRESIGNED_URL_CACHE_MAX_ENTRIES', '50000')),
+        PRESIGNED_URL_REUSE_FRACTION=float(os.getenv('PRESIGNED_URL_REUSE_FRACTION', '0.75')),
+        BLOB_STORE_ENABLED=_bool_env('BLOB_STORE_ENABLED', True),
+        BLOB_SWEEP_GRACE_SECONDS=int(os.getenv('BLOB_SWEEP_GRACE_SECONDS', '3600')),
+        BLOB_SWEEP_IDLE=_bool_env('BLOB_SWEEP_IDLE', True),
+        BLOB_SWEEP_BATCH_SIZE=int(os.getenv('BLOB_SWEEP_BATCH_SIZE', '100')),
+        ASSET_RETENTION_DAYS=os.getenv('ASSET_RETENTION_DAYS', ''),
+        JOB_SOURCE_RETENTION_HOURS=int(os.getenv('JOB_SOURCE_RETENTION_HOURS', '24')),
+        ORPHAN_GRACE_HOURS=int(os.getenv('ORPHAN_GRACE_HOURS', '24')),
+        LIFECYCLE_BATCH_SIZE=int(os.getenv('LIFECYCLE_BATCH_SIZE', '500')),
+        MODERATION_EXTRA_BLOCKED_TERMS=os.getenv('MODERATION_EXTRA_BLOCKED_TERMS', ''),
+        MODERATION_CACHE_MAX_ENTRIES=int(os.getenv('MODERATION_CACHE_MAX_ENTRIES', '10000')),
+        MODERATION_CACHE_TTL_SECONDS=float(os.getenv('MODERATION_CACHE_TTL_SECONDS', '3600')),
+        GENERATION_QUEUE_ENABLED=_bool_env('GENERATION_QUEUE_ENABLED', False),
+        GENERATION_WORKER_CONCURRENCY=int(os.getenv('GENERATION_WORKER_CONCURRENCY', '2')),
+        GENERATION_WORKER_POLL_SECONDS=float(os.getenv('GENERATION_WORKER_POLL_SECONDS', '1.0')),
+        GENERATION_CLAIM_TIMEOUT_SECONDS=int(os.getenv('GENERATION_CLAIM_TIMEOUT_SECONDS', '900')),
+        GENERATION_MAX_ATTEMPTS=int(os.getenv('GENERATION_MAX_ATTEMPTS', '2')),
+        GENERATION_BACKGROUND_THREADS=int(os.getenv('GENERATION_BACKGROUND_THREADS', '4')),
+        JOB_EVENTS_POLL_SECONDS=float(os.getenv('JOB_EVENTS_POLL_SECONDS', '1.0')),
+        JOB_EVENTS_HEARTBEAT_SECONDS=float(os.getenv('JOB_EVENTS_HEARTBEAT_SECONDS', '15')),
+        JOB_EVENTS_MAX_SECONDS=float(os.getenv('JOB_EVENTS_MAX_SECONDS', '300')),
+        JOB_EVENTS_MAX_STREAMS=int(os.getenv('JOB_EVENTS_MAX_STREAMS', '6')),
+        GENERATION_BATCH_MAX_ITEMS=int(os.getenv('GENERATION_BATCH_MAX_ITEMS', '50')),
+        GENERATION_BATCH_CONCURRENCY=int(os.getenv('GENERATION_BATCH_CONCURRENCY', '4')),
+        RENDER_CACHE_ENABLED=_bool_env('RENDER_CACHE_ENABLED', True),
+        RENDER_CACHE_MAX_ENTRIES=int(os.getenv('RENDER_CACHE_MAX_ENTRIES', '5000')),
+        RENDER_CACHE_MAX_BYTES=int(os.getenv('RENDER_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024))),
+        RENDER_CACHE_MAX_AGE_SECONDS=int(os.getenv('RENDER_CACHE_MAX_AGE_SECONDS', str(7 * 24 * 3600))),
+        RENDER_CACHE_EVICT_INTERVAL_SECONDS=float(os.getenv('RENDER_CACHE_EVICT_INTERVAL_SECONDS', '60')),
+        PUBLIC_BASE_URL=os.getenv('PUBLIC_BASE_URL', ''),
+        METRICS_TOKEN=os.getenv('METRICS_TOKEN', ''),
         APP_BRAND_NAME=os.getenv('APP_BRAND_NAME', 'ColorfulMe'),
         STRIPE_SECRET_KEY=os.getenv('STRIPE_SECRET_KEY', ''),
         STRIPE_WEBHOOK_SECRET=os.getenv('STRIPE_WEBHOOK_SECRET', ''),
@@ -68,6 +152,16 @@ def create_app() -> Flask:
         RESEND_FROM_EMAIL=os.getenv('RESEND_FROM_EMAIL', ''),
     )
 
+    from colorfulme.services.delivery import DELIVERY_MODES
+    from colorfulme.services.storage_service import LOCAL_LAYOUTS
+
+    if app.config['LOCAL_STORAGE_LAYOUT'] not in LOCAL_LAYOUTS:
+        raise ValueError(f"Unknown LOCAL_STORAGE_LAYOUT: {app.config['LOCAL_STORAGE_LAYOUT']}")
+    if app.config['LOCAL_DELIVERY_MODE'] not in DELIVERY_MODES:
+        raise ValueError(f"Unknown LOCAL_DELIVERY_MODE: {app.config['LOCAL_DELIVERY_MODE']}")
+    # Flask's send_file emits X-Sendfile instead of the body when this is set.
+    app.config['USE_X_SENDFILE'] = app.config['LOCAL_DELIVERY_MODE'] == 'x-sendfile'
+
     # Ensure absolute manifest path for deterministic loading.
     manifest_path = app.config['PROGRAMMATIC_CONTENT_MANIFEST']
     if not os.path.isabs(manifest_path):
@@ -77,6 +171,9 @@ def create_app() -> Flask:
 
     os.makedirs(app.instance_path, exist_ok=True)
     os.makedirs(os.path.join(app.instance_path, 'generated'), exist_ok=True)
+    if not app.config['MODEL_HEALTH_DB_PATH']:
+        # One file per host so every gunicorn worker sees the same circuit state.
+        app.config['MODEL_HEALTH_DB_PATH'] = os.path.join(app.instance_path, 'model_health.sqlite3')
 
     logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 
@@ -1,22 +1,39 @@
 from __future__ import annotations
 
-import base64
 from datetime import timedelta
+import json
 from pathlib import Path
+import time
 
-from flask import Blueprint, jsonify, redirect, request, send_file
+from flask import Blueprint, Response, current_app, jsonify, redirect, request, stream_with_context, url_for
 from flask_login import current_user
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from extensions import db
-from models import ApiKey, ApiUsageEvent, GeneratedAsset, GenerationJob
+from models import ApiKey, ApiUsageEvent, ColoringBook, GeneratedAsset, GenerationBatch, GenerationJob
+from colorfulme.services import job_events
+from colorfulme.services.book_service import BookService
 from colorfulme.services.credits_service import ensure_wallet_for_user, get_active_plan
+from colorfulme.services.delivery import send_stored_file
+from colorfulme.services.derivative_service import DerivativeService
 from colorfulme.services.generation_service import GenerationService
+from colorfulme.services.render_artifact import PREVIEW_FORMATS
 from colorfulme.services.storage_service import StorageService
+from colorfulme.services.uploads import UploadTooLarge, check_size, prepare_source_image, spool_base64
+from colorfulme.utils import metrics
 from colorfulme.utils.security import generate_api_token, hash_token, utcnow
 
 
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
+# format query value -> (GeneratedAsset key column, mimetype, download extension)
+DOWNLOAD_FORMATS = {
+    'png': ('png_key', 'image/png', 'png'),
+    'pdf': ('pdf_key', 'application/pdf', 'pdf'),
+    'svg': ('svg_key', 'image/svg+xml', 'svg'),
+    'vector-pdf': ('vector_pdf_key', 'application/pdf', 'vector.pdf'),
+}
+
 
 def _bearer_token() -> str | None:
     header = (request.headers.get('Authorization') or '').strip()
@@ -74,24 +91,43 @@ def _record_usage(*, user, api_key, status_code: int, credits_used: int = 0):
     db.session.commit()
 
 
+@api_bp.errorhandler(RequestEntityTooLarge)
+def _request_too_large(_exc):
+    return jsonify({'error': 'Request body too large'}), 413
+
+
 def _decode_source_image(payload) -> bytes | None:
-    if request.files and request.files.get('source_image'):
-        data = request.files['source_image'].read()
-        return data or None
+    max_bytes = int(current_app.config.get('SOURCE_IMAGE_MAX_BYTES', 20 * 1024 * 1024))
+    max_decode_bytes = int(current_app.config.get('SOURCE_IMAGE_MAX_DECODE_MB', 96)) * 1024 * 1024
 
-    source_b64 = (payload or {}).get('source_image_base64')
+    if request.files and request.files.get('source_image'):
+        # Werkzeug has already spooled the part to a temporary file; PIL reads it from there.
+        upload = request.files['source_image'].stream
+        check_size(upload, max_bytes=max_bytes)
+        if upload.read(1) == b'':
+            return None
+        upload.seek(0)
+        return prepare_source_image(upload, max_decode_bytes=max_decode_bytes)
+
+    # Supports raw base64 and data URLs. Popped so the parsed body does not keep a second reference.
+    source_b64 = (payload or {}).pop('source_image_base64', None)
     if not source_b64:
         return None
 
-    # Support raw base64 and data URLs.
-    if ',' in source_b64 and source_b64.startswith('data:'):
-        source_b64 = source_b64.split(',', 1)[1]
-
-    return base64.b64decode(source_b64)
+    with spool_base64(source_b64, max_bytes=max_bytes) as upload:
+        del source_b64
+        return prepare_source_image(upload, max_decode_bytes=max_decode_bytes)
 
 
-def _serialize_job(job: GenerationJob):
+def _serialize_job(job: GenerationJob, storage: StorageService | None = None):
     asset = job.assets[-1] if job.assets else None
+    if asset is not None:
+        # URLs stored with the asset were signed when it was saved and expire; hand out current ones.
+        storage = storage or StorageService()
+        png_url, pdf_url, svg_url, vector_pdf_url = (
+            storage.get_download_url(key) if key else None
+            for key in (asset.png_key, asset.pdf_key, asset.svg_key, asset.vector_pdf_key)
+        )
     return {
         'job_id': job.id,
         'status': job.status,
@@ -101,13 +137,23 @@ def _serialize_job(job: GenerationJob):
         'aspect_ratio': job.aspect_ratio,
         'difficulty': job.difficulty,
         'error_message': job.error_message,
+        'cost_credits': job.cost_credits,
         'created_at': job.created_at.isoformat() if job.created_at else None,
         'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+        'render': {
+            'profile': job.render_profile,
+            'model': job.render_model,
+            'quality': job.render_quality,
+            'estimated_cost_usd': job.estimated_cost_usd,
+        },
         'asset': (
             {
                 'asset_id': asset.id,
-                'png_url': asset.png_url,
-                'pdf_url': asset.pdf_url,
+                'png_url': png_url,
+                'pdf_url': pdf_url,
+                'svg_url': svg_url,
+                'vector_pdf_url': vector_pdf_url,
+                'preview_url': url_for('api.asset_preview', asset_id=asset.id, w=256, fmt='webp'),
                 'width': asset.width,
                 'height': asset.height,
             }
@@ -117,16 +163,51 @@ def _serialize_job(job: GenerationJob):
     }
 
 
+def _serialize_batch(batch: GenerationBatch, jobs=None):
+    jobs = batch.jobs if jobs is None else jobs
+    storage = StorageService()
+    return {
+        'batch_id': batch.id,
+        'status': batch.status,
+        'item_count': batch.item_count,
+        'cost_credits': batch.cost_credits,
+        'refunded_credits': batch.refunded_credits,
+        'error_message': batch.error_message,
+        'created_at': batch.created_at.isoformat() if batch.created_at else None,
+        'completed_at': batch.completed_at.isoformat() if batch.completed_at else None,
+        'items': [
+            {'index': job.batch_index, **_serialize_job(job, storage)}
+            for job in jobs
+        ],
+    }
+
+
 def _handle_generation(mode: str):
     user, api_key, error = _authenticate(require_user=True)
     if error:
         return error
 
     payload = request.get_json(silent=True) or {}
-    source_image = _decode_source_image(payload)
+    try:
+        source_image = _decode_source_image(payload)
+    except UploadTooLarge as exc:
+        _record_usage(user=user, api_key=api_key, status_code=413)
+        return jsonify({'error': str(exc)}), 413
+    except ValueError as exc:
+        _record_usage(user=user, api_key=api_key, status_code=400)
+        return jsonify({'error': str(exc)}), 400
 
     service = GenerationService()
-    result = service.create_and_process(
+    queued = bool(current_app.config.get('GENERATION_QUEUE_ENABLED'))
+    if queued:
+        handler = service.enqueue
+    elif payload.get('async'):
+        # Render in the background and let the client follow the job's event stream.
+        handler = service.submit
+        queued = True
+    else:
+        handler = service.create_and_process
+    result = handler(
         user=user,
         mode=mode,
         prompt=(payload.get('prompt') or '').strip(),
@@ -135,31 +216,33 @@ def _handle_generation(mode: str):
         difficulty=(payload.get('difficulty') or 'standard').strip(),
         quality_profile=(payload.get('quality_profile') or 'auto').strip(),
         source_image_bytes=source_image,
+        fresh=bool(payload.get('fresh')),
     )
 
-    status_code = 200
+    status_code = 202 if queued else 200
     if result.job.status in {'failed', 'blocked'}:
         status_code = 422
 
     _record_usage(user=user, api_key=api_key, status_code=status_code, credits_used=result.credits_used)
 
-    return (
-        jsonify(
-            {
-                'job_id': result.job.id,
-                'status': result.job.status,
-                'credits_used': result.credits_used,
-                'render': {
-                    'profile': result.render_profile,
-                    'model': result.render_model,
-                    'quality': result.render_quality,
-                    'estimated_cost_usd': result.estimated_cost_usd,
-                },
-                'job': _serialize_job(result.job),
-            }
-        ),
-        status_code,
-    )
+    body = {
+        'job_id': result.job.id,
+        'status': result.job.status,
+        'credits_used': result.credits_used,
+        'render': {
+            'profile': result.render_profile,
+            'model': result.render_model,
+            'quality': result.render_quality,
+            'estimated_cost_usd': result.estimated_cost_usd,
+            'cache_hit': result.cache_hit,
+            'hedged': result.hedged,
+        },
+        'job': _serialize_job(result.job),
+    }
+    if queued:
+        body['poll_url'] = url_for('api.get_job', job_id=result.job.id)
+        body['events_url'] = url_for('api.job_events_stream', job_id=result.job.id)
+    return jsonify(body), status_code
 
 
 @api_bp.post('/generations/text')
@@ -177,6 +260,55 @@ def generate_recolor():
     return _handle_generation('recolor')
 
 
+@api_bp.post('/generations/batch')
+def generate_batch():
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    payload = request.get_json(silent=True) or {}
+    queued = bool(current_app.config.get('GENERATION_QUEUE_ENABLED'))
+
+    try:
+        result = GenerationService().create_batch(user=user, items=payload.get('items'), queued=queued)
+    except ValueError as exc:
+        db.session.rollback()
+        _record_usage(user=user, api_key=api_key, status_code=400)
+        return jsonify({'error': str(exc)}), 400
+
+    status_code = 202 if queued else 200
+    if result.batch.status == 'failed':
+        status_code = 422
+
+    _record_usage(user=user, api_key=api_key, status_code=status_code, credits_used=result.credits_used)
+
+    body = {
+        'batch_id': result.batch.id,
+        'status': result.batch.status,
+        'credits_used': result.credits_used,
+        'job_ids': [job.id for job in result.jobs],
+        'batch': _serialize_batch(result.batch, result.jobs),
+    }
+    if queued:
+        body['poll_url'] = url_for('api.get_batch', batch_id=result.batch.id)
+    return jsonify(body), status_code
+
+
+@api_bp.get('/batches/<batch_id>')
+def get_batch(batch_id: str):
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    batch = GenerationBatch.query.filter_by(id=batch_id, user_id=user.id).first()
+    if not batch:
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': 'Batch not found'}), 404
+
+    _record_usage(user=user, api_key=api_key, status_code=200)
+    return jsonify({'batch': _serialize_batch(batch)})
+
+
 @api_bp.get('/jobs/<job_id>')
 def get_job(job_id: str):
     user, api_key, error = _authenticate(require_user=True)
@@ -192,6 +324,66 @@ def get_job(job_id: str):
     return jsonify({'job': _serialize_job(job)})
 
 
+def _sse(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@api_bp.get('/jobs/<job_id>/events')
+def job_events_stream(job_id: str):
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    job = GenerationJob.query.filter_by(id=job_id, user_id=user.id).first()
+    if not job:
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': 'Job not found'}), 404
+
+    # Each open stream holds a server thread for up to JOB_EVENTS_MAX_SECONDS; past the cap, clients poll.
+    if not job_events.open_stream(int(current_app.config.get('JOB_EVENTS_MAX_STREAMS', 6))):
+        metrics.increment('job_events.streams_rejected')
+        _record_usage(user=user, api_key=api_key, status_code=503)
+        body = {'error': 'Too many open event streams, poll the job instead', 'poll_url': url_for('api.get_job', job_id=job_id)}
+        return jsonify(body), 503, {'Retry-After': '5'}
+
+    # One usage event per stream rather than one per poll.
+    _record_usage(user=user, api_key=api_key, status_code=200)
+    status = job.status
+    subscription = job_events.subscribe(job_id, status, app=current_app._get_current_object())
+    heartbeat = float(current_app.config.get('JOB_EVENTS_HEARTBEAT_SECONDS', 15))
+    deadline = time.monotonic() + float(current_app.config.get('JOB_EVENTS_MAX_SECONDS', 300))
+
+    def stream():
+        nonlocal status
+        try:
+            yield _sse('status', {'job_id': job_id, 'status': status})
+            while status not in job_events.TERMINAL_STATUSES:
+                if time.monotonic() >= deadline:
+                    # Clients reconnect (EventSource does so automatically) and pick up the current status.
+                    yield _sse('timeout', {'job_id': job_id, 'status': status})
+                    return
+                next_status = subscription.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0.01)))
+                if next_status is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                status = next_status
+                yield _sse('status', {'job_id': job_id, 'status': status})
+
+            db.session.expire_all()
+            yield _sse('job', _serialize_job(db.session.get(GenerationJob, job_id)))
+        finally:
+            job_events.unsubscribe(subscription)
+
+    response = Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+    # Runs even when the client leaves before the stream starts, unlike the generator's finally.
+    response.call_on_close(job_events.close_stream)
+    return response
+
+
 @api_bp.get('/assets/<asset_id>/download')
 def download_asset(asset_id: str):
     user, api_key, error = _authenticate(require_user=True)
@@ -199,16 +391,19 @@ def download_asset(asset_id: str):
         return error
 
     fmt = (request.args.get('format') or 'png').lower()
-    if fmt not in {'png', 'pdf'}:
-        return jsonify({'error': 'Invalid format. Use png or pdf'}), 400
+    if fmt not in DOWNLOAD_FORMATS:
+        return jsonify({'error': 'Invalid format. Use png, pdf, svg or vector-pdf'}), 400
 
     asset = GeneratedAsset.query.filter_by(id=asset_id, user_id=user.id).first()
     if not asset:
         _record_usage(user=user, api_key=api_key, status_code=404)
         return jsonify({'error': 'Asset not found'}), 404
 
-    key = asset.png_key if fmt == 'png' else asset.pdf_key
-    mime = 'image/png' if fmt == 'png' else 'application/pdf'
+    key_attr, mime, extension = DOWNLOAD_FORMATS[fmt]
+    key = getattr(asset, key_attr)
+    if not key:
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': f'No {fmt} export for this asset'}), 404
 
     storage = StorageService()
     if storage.uses_s3:
@@ -221,7 +416,133 @@ def download_asset(asset_id: str):
         return jsonify({'error': 'Asset file not found'}), 404
 
     _record_usage(user=user, api_key=api_key, status_code=200)
-    return send_file(path, mimetype=mime, as_attachment=True, download_name=f'{asset_id}.{fmt}')
+    return send_stored_file(storage, key, mimetype=mime, as_attachment=True, download_name=f'{asset_id}.{extension}')
+
+
+@api_bp.get('/assets/<asset_id>/preview')
+def asset_preview(asset_id: str):
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    try:
+        width, fmt = DerivativeService.normalize(request.args.get('w', 256), request.args.get('fmt'))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    asset = GeneratedAsset.query.filter_by(id=asset_id, user_id=user.id).first()
+    if not asset:
+        return jsonify({'error': 'Asset not found'}), 404
+
+    service = DerivativeService()
+    derivative = service.get_or_create(asset, width, fmt)
+    if api_key:
+        # Page views load many previews; only API callers are metered per image.
+        _record_usage(user=user, api_key=api_key, status_code=200)
+
+    if service.storage.uses_s3:
+        response = redirect(service.storage.get_download_url(derivative.storage_key))
+        # The presigned URL expires, so the redirect itself is only briefly cacheable.
+        response.headers['Cache-Control'] = 'private, max-age=600'
+        return response
+
+    path = service.storage.absolute_local_path(derivative.storage_key)
+    if not Path(path).exists():
+        return jsonify({'error': 'Preview file not found'}), 404
+
+    # Preview bytes never change for a key (the source PNG is only ever re-encoded losslessly).
+    return send_stored_file(
+        service.storage,
+        derivative.storage_key,
+        mimetype=PREVIEW_FORMATS[fmt][1],
+        max_age=int(current_app.config.get('PREVIEW_CACHE_SECONDS', 31536000)),
+    )
+
+
+def _serialize_book(book: ColoringBook):
+    return {
+        'book_id': book.id,
+        'title': book.title,
+        'page_count': book.page_count,
+        'page_size': book.page_size,
+        'margin_in': book.margin_in,
+        'size_bytes': book.size_bytes,
+        'pdf_url': StorageService().get_download_url(book.pdf_key),
+        'download_url': url_for('api.download_book', book_id=book.id),
+        'created_at': book.created_at.isoformat() if book.created_at else None,
+    }
+
+
+@api_bp.post('/books')
+def create_book():
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        book = BookService().create_book(
+            user=user,
+            asset_ids=payload.get('asset_ids'),
+            page_size=payload.get('page_size') or 'letter',
+            margin_in=payload.get('margin_in', 0.5),
+            cover=payload.get('cover'),
+        )
+    except ValueError as exc:
+        db.session.rollback()
+        _record_usage(user=user, api_key=api_key, status_code=400)
+        return jsonify({'error': str(exc)}), 400
+
+    _record_usage(user=user, api_key=api_key, status_code=201)
+    return jsonify({'book': _serialize_book(book)}), 201
+
+
+@api_bp.get('/books/<book_id>')
+def get_book(book_id: str):
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    book = ColoringBook.query.filter_by(id=book_id, user_id=user.id).first()
+    if not book:
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': 'Book not found'}), 404
+
+    _record_usage(user=user, api_key=api_key, status_code=200)
+    return jsonify({'book': _serialize_book(book)})
+
+
+@api_bp.get('/books/<book_id>/download')
+def download_book(book_id: str):
+    user, api_key, error = _authenticate(require_user=True)
+    if error:
+        return error
+
+    book = ColoringBook.query.filter_by(id=book_id, user_id=user.id).first()
+    if not book:
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': 'Book not found'}), 404
+
+    storage = StorageService()
+    if storage.uses_s3:
+        # S3 answers Range requests on the presigned URL itself.
+        _record_usage(user=user, api_key=api_key, status_code=302)
+        return redirect(storage.get_download_url(book.pdf_key))
+
+    path = storage.absolute_local_path(book.pdf_key)
+    if not Path(path).exists():
+        _record_usage(user=user, api_key=api_key, status_code=404)
+        return jsonify({'error': 'Book file not found'}), 404
+
+    _record_usage(user=user, api_key=api_key, status_code=200)
+    # Range and If-None-Match are answered (here or by the proxy), so large books can be resumed.
+    return send_stored_file(
+        storage,
+        book.pdf_key,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'{book_id}.pdf',
+    )
 
 
 @api_bp.get('/me')
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
-from pathlib import Path
+import hmac
+import os
+import time
 from urllib.parse import unquote
 
-from flask import Blueprint, abort, current_app, jsonify, render_template, request, send_file
+from flask import Blueprint, abort, current_app, jsonify, render_template, request
 from flask_login import current_user, login_required
+from werkzeug.security import safe_join
 
 from models import ApiKey, GenerationJob
+from colorfulme.services import model_health
 from colorfulme.services.credits_service import ensure_wallet_for_user, get_active_plan
+from colorfulme.services.delivery import send_stored_file
 from colorfulme.services.programmatic_service import ProgrammaticService
+from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
 
 
 web_bp = Blueprint('web', __name__)
@@ -110,6 +117,37 @@ def health_check():
     return jsonify({'status': 'ok', 'service': 'colorfulme'})
 
 
+def _metrics_auth_error():
+    """Internal health data is only served with `Authorization: Bearer <METRICS_TOKEN>`, and not at all without a token."""
+    expected = current_app.config.get('METRICS_TOKEN') or ''
+    if not expected:
+        abort(404)
+    header = (request.headers.get('Authorization') or '').strip()
+    token = header.split(' ', 1)[1].strip() if header.lower().startswith('bearer ') else ''
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return jsonify({'error': 'Authentication required'}), 401
+    return None
+
+
+@web_bp.get('/health/models')
+def health_models():
+    error = _metrics_auth_error()
+    if error:
+        return error
+    breaker = model_health.get_circuit_breaker(current_app.config)
+    if breaker is None:
+        return jsonify({'enabled': False, 'models': []})
+    return jsonify({'enabled': True, 'models': breaker.status()})
+
+
+@web_bp.get('/health/metrics')
+def health_metrics():
+    error = _metrics_auth_error()
+    if error:
+        return error
+    return jsonify({'pid': os.getpid(), 'counters': metrics.snapshot()})
+
+
 @web_bp.get('/')
 def index():
     featured_library = [
@@ -226,11 +264,18 @@ def dashboard():
 
 @web_bp.get('/assets/local/<path:key>')
 def local_asset(key: str):
-    # Local development/static fallback only.
-    base = Path(current_app.instance_path) / 'generated'
-    target = base / key
-    if not target.exists() or not target.is_file():
+    # Local storage only; with S3 the stored URLs point at the bucket.
+    storage = StorageService()
+    if safe_join(str(storage.local_root), key) is None:
+        abort(404)
+    # Blob keys are content hashes, so only a signed, unexpired URL is honoured.
+    expires = storage.local_url_expiry(key, request.args.get('expires'), request.args.get('signature'))
+    if expires is None:
+        abort(403)
+    if not storage.absolute_local_path(key).is_file():
         abort(404)
 
     as_download = request.args.get('download') == '1'
-    return send_file(target, as_attachment=as_download)
+    # Browser cache only, and not past the URL's own expiry.
+    max_age = max(0, expires - int(time.time()))
+    return send_stored_file(storage, key, as_attachment=as_download, max_age=max_age)
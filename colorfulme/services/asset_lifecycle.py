@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+import logging
+import time
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from extensions import db
+from models import (
+    AssetDerivative,
+    BlobRef,
+    ColoringBook,
+    GeneratedAsset,
+    GenerationJob,
+    Plan,
+    RenderCacheEntry,
+    StoredBlob,
+    Subscription,
+    User,
+)
+from colorfulme.services.blob_store import BLOB_PREFIX, BlobStore
+from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
+from colorfulme.utils.security import utcnow
+
+
+ASSET_KEY_COLUMNS = (
+    GeneratedAsset.png_key,
+    GeneratedAsset.pdf_key,
+    GeneratedAsset.svg_key,
+    GeneratedAsset.vector_pdf_key,
+)
+CACHE_KEY_COLUMNS = (
+    RenderCacheEntry.png_key,
+    RenderCacheEntry.pdf_key,
+    RenderCacheEntry.svg_key,
+    RenderCacheEntry.vector_pdf_key,
+)
+# Every column that can hold a storage key; anything stored under no such key is an orphan.
+KNOWN_KEY_COLUMNS = ASSET_KEY_COLUMNS + CACHE_KEY_COLUMNS + (
+    StoredBlob.key,
+    AssetDerivative.storage_key,
+    GenerationJob.source_key,
+    ColoringBook.pdf_key,
+)
+FINISHED_STATUSES = ('completed', 'failed', 'blocked')
+
+
+def parse_retention(spec: str | None) -> dict[str, int]:
+    """Parse ``plan:days`` pairs such as ``free:30,starter:365``. Plans not listed keep assets forever."""
+    retention = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        code, _, days = part.partition(':')
+        try:
+            days = int(days)
+        except ValueError as exc:
+            raise ValueError(f'ASSET_RETENTION_DAYS entries must be plan:days, got {part!r}') from exc
+        if days <= 0:
+            raise ValueError(f'Retention for plan {code!r} must be a positive number of days')
+        retention[code.strip().lower()] = days
+    return retention
+
+
+@dataclass
+class LifecycleReport:
+    dry_run: bool = False
+    assets: int = 0
+    assets_by_plan: dict[str, int] = field(default_factory=dict)
+    books: int = 0
+    job_sources: int = 0
+    # Released blobs are deleted by the blob sweeper once their grace period is over.
+    blobs_released: int = 0
+    objects_deleted: int = 0
+    orphans: int = 0
+    orphan_bytes: int = 0
+    failed: int = 0
+
+
+class AssetLifecycleManager:
+    """Retention for stored outputs: expired assets and books, leftover job uploads and orphaned objects.
+
+    Rows go in bulk, one transaction per batch; objects are deleted (in bulk) only after their rows
+    are committed, so a failure leaves an unreferenced object behind, never a dangling row. With
+    ``dry_run`` nothing is changed and the report counts what would be removed.
+    """
+
+    def __init__(self, storage: StorageService | None = None):
+        self.storage = storage or StorageService()
+        self.blobs = BlobStore(self.storage)
+        self.retention = parse_retention(current_app.config.get('ASSET_RETENTION_DAYS'))
+        self.job_source_retention = timedelta(hours=int(current_app.config.get('JOB_SOURCE_RETENTION_HOURS', 24)))
+        self.orphan_grace = timedelta(hours=int(current_app.config.get('ORPHAN_GRACE_HOURS', 24)))
+        self.batch_size = max(1, int(current_app.config.get('LIFECYCLE_BATCH_SIZE', 500)))
+
+    def run(
+        self,
+        *,
+        dry_run: bool = False,
+        max_assets: int | None = None,
+        orphans: bool = False,
+        orphan_prefix: str | None = None,
+    ) -> LifecycleReport:
+        report = LifecycleReport(dry_run=dry_run)
+        self.expire_assets(report, max_assets=max_assets)
+        self.expire_books(report)
+        self.discard_job_sources(report)
+        if orphans:
+            self.collect_orphans(report, prefix=orphan_prefix)
+
+        if not dry_run:
+            metrics.increment('lifecycle.assets_expired', report.assets)
+            metrics.increment('lifecycle.books_expired', report.books)
+            metrics.increment('lifecycle.objects_deleted', report.objects_deleted)
+            metrics.increment('lifecycle.orphans_deleted', report.orphans)
+            logging.info(
+                'Lifecycle removed %s assets, %s books, %s job uploads, %s objects and %s orphans (%s failed)',
+                report.assets,
+                report.books,
+                report.job_sources,
+                report.objects_deleted,
+                report.orphans,
+                report.failed,
+            )
+        return report
+
+    def expire_assets(self, report: LifecycleReport, *, max_assets: int | None = None) -> None:
+        """Remove assets older than their owner's plan retention."""
+        for expired in self._expired(GeneratedAsset):
+            if max_assets is not None:
+                expired = expired[:max_assets - report.assets]
+            if expired:
+                self._delete_assets([asset_id for asset_id, _plan in expired], report)
+                report.assets += len(expired)
+                for _asset_id, plan in expired:
+                    report.assets_by_plan[plan] = report.assets_by_plan.get(plan, 0) + 1
+            if max_assets is not None and report.assets >= max_assets:
+                return
+
+    def expire_books(self, report: LifecycleReport) -> None:
+        """Remove coloring books older than their owner's plan retention, like the pages they hold."""
+        for expired in self._expired(ColoringBook):
+            if not expired:
+                continue
+            book_ids = [book_id for book_id, _plan in expired]
+            keys = [row.pdf_key for row in db.session.query(ColoringBook.pdf_key).filter(ColoringBook.id.in_(book_ids))]
+            report.books += len(book_ids)
+            if report.dry_run:
+                report.objects_deleted += len(keys)
+                continue
+            ColoringBook.query.filter(ColoringBook.id.in_(book_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            self._delete_objects(keys, report)
+
+    def _expired(self, model):
+        """Yield one list of ``(id, plan)`` per page of ``model`` rows past their owner's retention."""
+        if not self.retention:
+            return
+        now = utcnow()
+        cutoffs = {code: now - timedelta(days=days) for code, days in self.retention.items()}
+        newest_cutoff = max(cutoffs.values())
+
+        last = None
+        while True:
+            query = db.session.query(model.id, model.user_id, model.created_at).filter(model.created_at < newest_cutoff)
+            if last is not None:
+                # Keyset pagination: stable whether or not the previous page was deleted.
+                query = query.filter(
+                    or_(
+                        model.created_at > last.created_at,
+                        and_(model.created_at == last.created_at, model.id > last.id),
+                    )
+                )
+            rows = query.order_by(model.created_at, model.id).limit(self.batch_size).all()
+            if not rows:
+                return
+            last = rows[-1]
+
+            plans = self._plan_codes({row.user_id for row in rows})
+            yield [
+                (row.id, plans[row.user_id])
+                for row in rows
+                if plans[row.user_id] in cutoffs and row.created_at < cutoffs[plans[row.user_id]]
+            ]
+
+    def discard_job_sources(self, report: LifecycleReport) -> None:
+        """Drop photo uploads left on finished jobs (the worker normally removes them itself)."""
+        pending = GenerationJob.query.filter(
+            GenerationJob.source_key.isnot(None),
+            GenerationJob.status.in_(FINISHED_STATUSES),
+            GenerationJob.updated_at < utcnow() - self.job_source_retention,
+        )
+        if report.dry_run:
+            report.job_sources += pending.count()
+            report.objects_deleted += pending.filter(~GenerationJob.source_key.startswith(BLOB_PREFIX)).count()
+            report.blobs_released += (
+                db.session.query(BlobRef.blob_key)
+                .filter(
+                    BlobRef.owner_type == 'job_source',
+                    BlobRef.owner_id.in_(pending.with_entities(GenerationJob.id).scalar_subquery()),
+                )
+                .distinct()
+                .count()
+            )
+            return
+
+        while True:
+            rows = (
+                pending.with_entities(GenerationJob.id, GenerationJob.source_key)
+                .order_by(GenerationJob.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not rows:
+                return
+            job_ids = [row.id for row in rows]
+            legacy = [row.source_key for row in rows if not self.blobs.is_blob_key(row.source_key)]
+            report.blobs_released += len(self.blobs.release_many(owner_type='job_source', owner_ids=job_ids))
+            GenerationJob.query.filter(GenerationJob.id.in_(job_ids)).update(
+                {'source_key': None},
+                synchronize_session=False,
+            )
+            db.session.commit()
+            self._delete_objects(legacy, report)
+            report.job_sources += len(rows)
+
+    def collect_orphans(self, report: LifecycleReport, *, prefix: str | None = None) -> None:
+        """Delete stored objects no row points at, e.g. uploads from renders that failed after storing.
+
+        Only objects older than ORPHAN_GRACE_HOURS are touched, so in-flight jobs keep their files.
+        Without a ``prefix`` only the key spaces this app writes are scanned (see ``orphan_prefixes``);
+        pass ``''`` explicitly to scan the whole bucket.
+        """
+        cutoff = time.time() - self.orphan_grace.total_seconds()
+        prefixes = self.orphan_prefixes() if prefix is None else [prefix]
+        chunk = []
+        for scan_prefix in prefixes:
+            for key, size, modified in self.storage.iter_objects(scan_prefix):
+                if modified >= cutoff:
+                    continue
+                chunk.append((key, size))
+                if len(chunk) >= self.batch_size:
+                    self._remove_orphans(chunk, report)
+                    chunk = []
+        if chunk:
+            self._remove_orphans(chunk, report)
+
+    def orphan_prefixes(self) -> list[str]:
+        # Local storage is a directory the app owns outright. A bucket may be shared, so only blobs/
+        # and the per-user folders every other key lives under are scanned there.
+        if not self.storage.uses_s3:
+            return ['']
+        user_ids = [row.id for row in db.session.query(User.id).order_by(User.id).all()]
+        db.session.commit()
+        return [BLOB_PREFIX] + [f'{user_id}/' for user_id in user_ids]
+
+    def _remove_orphans(self, chunk: list[tuple[str, int]], report: LifecycleReport) -> None:
+        keys = [key for key, _size in chunk]
+        known = set()
+        for column in KNOWN_KEY_COLUMNS:
+            known.update(row[0] for row in db.session.query(column).filter(column.in_(keys)).all())
+        db.session.commit()
+        orphans = [(key, size) for key, size in chunk if key not in known]
+        if not orphans:
+            return
+        failed = set() if report.dry_run else set(self.storage.delete_many([key for key, _size in orphans]))
+        report.failed += len(failed)
+        for key, size in orphans:
+            if key not in failed:
+                report.orphans += 1
+                report.orphan_bytes += size
+
+    def _delete_assets(self, asset_ids: list[str], report: LifecycleReport) -> None:
+        assets = db.session.query(*ASSET_KEY_COLUMNS).filter(GeneratedAsset.id.in_(asset_ids)).all()
+        # Content-addressed outputs are released to the blob sweeper; older per-job keys are
+        # deleted here unless a surviving asset shares them (render-cache hits reuse keys).
+        legacy = {key for row in assets for key in row if key and not self.blobs.is_blob_key(key)}
+        if legacy:
+            for column in ASSET_KEY_COLUMNS:
+                shared = (
+                    db.session.query(column)
+                    .filter(column.in_(legacy), GeneratedAsset.id.notin_(asset_ids))
+                    .all()
+                )
+                legacy -= {row[0] for row in shared}
+        previews = [
+            row.storage_key
+            for row in db.session.query(AssetDerivative.storage_key).filter(AssetDerivative.source_key.in_(legacy)).all()
+        ] if legacy else []
+
+        if report.dry_run:
+            report.blobs_released += (
+                db.session.query(BlobRef.blob_key)
+                .filter(BlobRef.owner_type == 'asset', BlobRef.owner_id.in_(asset_ids))
+                .distinct()
+                .count()
+            )
+            report.objects_deleted += len(legacy) + len(previews)
+            return
+
+        report.blobs_released += len(self.blobs.release_many(owner_type='asset', owner_ids=asset_ids))
+        if legacy:
+            AssetDerivative.query.filter(AssetDerivative.source_key.in_(legacy)).delete(synchronize_session=False)
+            RenderCacheEntry.query.filter(or_(*(column.in_(legacy) for column in CACHE_KEY_COLUMNS))).delete(
+                synchronize_session=False
+            )
+        GeneratedAsset.query.filter(GeneratedAsset.id.in_(asset_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        self._delete_objects(sorted(legacy) + previews, report)
+
+    def _delete_objects(self, keys: list[str], report: LifecycleReport) -> None:
+        if not keys:
+            return
+        failed = self.storage.delete_many(keys)
+        report.objects_deleted += len(keys) - len(failed)
+        report.failed += len(failed)
+
+    @staticmethod
+    def _plan_codes(user_ids: set[str]) -> dict[str, str]:
+        # Same rule as User.get_plan_code: the newest active subscription wins, otherwise free.
+        now = utcnow()
+        codes = {user_id: 'free' for user_id in user_ids}
+        rows = (
+            db.session.query(Subscription.user_id, Plan.code)
+            .join(Plan, Plan.id == Subscription.plan_id)
+            .filter(
+                Subscription.user_id.in_(user_ids),
+                Subscription.status == 'active',
+                or_(Subscription.current_period_end.is_(None), Subscription.current_period_end > now),
+            )
+            .order_by(Subscription.created_at)
+            .all()
+        )
+        for user_id, code in rows:
+            codes[user_id] = code
+        return codes
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import timedelta
+import hashlib
+import logging
+
+from flask import current_app
+from sqlalchemy import exists, or_
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import AssetDerivative, BlobRef, RenderCacheEntry, StoredBlob
+from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
+from colorfulme.utils.security import utcnow
+
+
+BLOB_PREFIX = 'blobs/'
+
+
+@dataclass
+class StoredObject:
+    key: str
+    url: str
+    # True when this call wrote the object; False when identical bytes were already stored.
+    created: bool
+
+
+@dataclass
+class SweepReport:
+    blobs: int = 0
+    failed: int = 0
+    bytes_freed: int = 0
+
+
+def _insert_ignoring_conflicts(model, values: dict) -> bool:
+    """Insert one row unless it would break a unique constraint; True if it went in.
+
+    Runs inside the caller's transaction without rolling it back, so pending work survives a
+    concurrent writer having inserted the same row first.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in {'postgresql', 'sqlite'}:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        result = db.session.execute(insert(model).values(**values).on_conflict_do_nothing())
+        return result.rowcount == 1
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(model.__table__.insert().values(**values))
+    except IntegrityError:
+        return False
+    return True
+
+
+class BlobStore:
+    """Content-addressed objects, keyed by SHA-256 and shared between owners.
+
+    Every owner (a generated asset, a queued job's source photo) holds a ``BlobRef``. Blobs left
+    without references are removed by ``sweep`` once BLOB_SWEEP_GRACE_SECONDS have passed.
+    Nothing here commits except ``sweep``; new rows go out with the caller's transaction.
+    """
+
+    def __init__(self, storage: StorageService | None = None):
+        self.storage = storage or StorageService()
+        self.enabled = bool(current_app.config.get('BLOB_STORE_ENABLED', True))
+        self.grace = timedelta(seconds=int(current_app.config.get('BLOB_SWEEP_GRACE_SECONDS', 3600)))
+
+    @staticmethod
+    def key_for(digest: str, extension: str) -> str:
+        return f"{BLOB_PREFIX}{digest[:2]}/{digest}.{extension.lstrip('.').lower()}"
+
+    @staticmethod
+    def is_blob_key(key: str | None) -> bool:
+        return bool(key) and key.startswith(BLOB_PREFIX)
+
+    def put(self, payload: bytes, *, extension: str, owner_type: str, owner_id: str) -> StoredObject:
+        return self.put_many([(payload, extension)], owner_type=owner_type, owner_id=owner_id)[0]
+
+    def put_many(self, items: list[tuple[bytes, str]], *, owner_type: str, owner_id: str) -> list[StoredObject]:
+        """Store ``(payload, extension)`` items for one owner; only content not stored yet is uploaded."""
+        digests = [hashlib.sha256(payload).hexdigest() for payload, _ext in items]
+        keys = [self.key_for(digest, ext) for digest, (_payload, ext) in zip(digests, items)]
+        payloads = {key: (digest, payload) for key, digest, (payload, _ext) in zip(keys, digests, items)}
+
+        # Touch the rows first: that locks them, so a running sweep either finishes deleting a
+        # blob (and we upload it again below) or sees the fresh timestamp and leaves it alone.
+        self._touch(list(payloads))
+        known = self._existing(list(payloads))
+        missing = [key for key in payloads if key not in known]
+        self.storage.write_many([(key, payloads[key][1]) for key in missing], cleanup=False)
+
+        created = set()
+        for key in missing:
+            digest, payload = payloads[key]
+            if _insert_ignoring_conflicts(StoredBlob, {
+                'key': key,
+                'sha256': digest,
+                'size_bytes': len(payload),
+                'created_at': utcnow(),
+                'last_referenced_at': utcnow(),
+            }):
+                created.add(key)
+        self._add_refs(list(payloads), owner_type, owner_id)
+
+        reused = [key for key in payloads if key not in created]
+        metrics.increment('blobs.uploaded', len(created))
+        metrics.increment('blobs.bytes_uploaded', sum(len(payloads[key][1]) for key in created))
+        if reused:
+            metrics.increment('blobs.deduplicated', len(reused))
+            metrics.increment('blobs.bytes_deduplicated', sum(len(payloads[key][1]) for key in reused))
+        return [StoredObject(key, self.storage.get_download_url(key), key in created) for key in keys]
+
+    def add_refs(self, keys: list[str | None], *, owner_type: str, owner_id: str) -> bool:
+        """Reference already stored blobs; keys outside the blob store are ignored.
+
+        Returns False (adding nothing) if any of the blobs has been swept in the meantime.
+        """
+        blob_keys = sorted({key for key in keys if self.is_blob_key(key)})
+        if not blob_keys:
+            return True
+        self._touch(blob_keys)
+        if len(self._existing(blob_keys)) != len(blob_keys):
+            return False
+        self._add_refs(blob_keys, owner_type, owner_id)
+        return True
+
+    def replace(self, old_key: str, payload: bytes, *, extension: str) -> str:
+        """Move every reference on ``old_key`` to the blob holding ``payload`` and return its key.
+
+        For re-encoded content: a blob's bytes never change under its key, so the old blob is left
+        unreferenced (and swept with its previews) while the new bytes get a key of their own.
+        """
+        digest = hashlib.sha256(payload).hexdigest()
+        key = self.key_for(digest, extension)
+        if key == old_key:
+            return key
+
+        self._touch([key])
+        if not self._existing([key]):
+            self.storage.write_many([(key, payload)], cleanup=False)
+            _insert_ignoring_conflicts(StoredBlob, {
+                'key': key,
+                'sha256': digest,
+                'size_bytes': len(payload),
+                'created_at': utcnow(),
+                'last_referenced_at': utcnow(),
+            })
+        owners = db.session.query(BlobRef.owner_type, BlobRef.owner_id).filter(BlobRef.blob_key == old_key).all()
+        for owner_type, owner_id in owners:
+            self._add_refs([key], owner_type, owner_id)
+        BlobRef.query.filter(BlobRef.blob_key == old_key).delete(synchronize_session=False)
+        self._touch([old_key])
+        return key
+
+    def release(self, *, owner_type: str, owner_id: str) -> list[str]:
+        """Drop an owner's references; the blobs become sweepable after the grace period."""
+        return self.release_many(owner_type=owner_type, owner_ids=[owner_id])
+
+    def release_many(self, *, owner_type: str, owner_ids: list[str]) -> list[str]:
+        if not owner_ids:
+            return []
+        owned = BlobRef.query.filter(BlobRef.owner_type == owner_type, BlobRef.owner_id.in_(owner_ids))
+        keys = sorted({row.blob_key for row in owned.with_entities(BlobRef.blob_key).all()})
+        if not keys:
+            return []
+        owned.delete(synchronize_session=False)
+        self._touch(keys)
+        return keys
+
+    def sweep(self, limit: int = 100) -> SweepReport:
+        """Delete up to ``limit`` unreferenced blobs, their previews and render-cache entries."""
+        report = SweepReport()
+        cutoff = utcnow() - self.grace
+        unreferenced = ~exists().where(BlobRef.blob_key == StoredBlob.key)
+        candidates = (
+            db.session.query(StoredBlob.key, StoredBlob.size_bytes)
+            .filter(StoredBlob.last_referenced_at < cutoff, unreferenced)
+            .order_by(StoredBlob.last_referenced_at)
+            .limit(limit)
+            .all()
+        )
+        db.session.commit()
+
+        for key, size_bytes in candidates:
+            # Conditional, so a reference added since the scan wins. The delete keeps the row locked
+            # until commit, which makes a concurrent put_many wait and then upload the object again.
+            deleted = StoredBlob.query.filter(
+                StoredBlob.key == key,
+                StoredBlob.last_referenced_at < cutoff,
+                unreferenced,
+            ).delete(synchronize_session=False)
+            if not deleted:
+                db.session.rollback()
+                continue
+
+            try:
+                self.storage.delete(key)
+            except Exception as exc:
+                db.session.rollback()
+                logging.warning('Could not delete blob %s: %s', key, exc)
+                report.failed += 1
+                continue
+
+            previews = [
+                row.storage_key
+                for row in db.session.query(AssetDerivative.storage_key).filter_by(source_key=key).all()
+            ]
+            AssetDerivative.query.filter_by(source_key=key).delete(synchronize_session=False)
+            RenderCacheEntry.query.filter(
+                or_(
+                    RenderCacheEntry.png_key == key,
+                    RenderCacheEntry.pdf_key == key,
+                    RenderCacheEntry.svg_key == key,
+                    RenderCacheEntry.vector_pdf_key == key,
+                )
+            ).delete(synchronize_session=False)
+            for preview_key in previews:
+                try:
+                    self.storage.delete(preview_key)
+                except Exception as exc:
+                    logging.warning('Could not delete preview %s of swept blob: %s', preview_key, exc)
+            db.session.commit()
+
+            report.blobs += 1
+            report.bytes_freed += size_bytes or 0
+
+        if report.blobs:
+            metrics.increment('blobs.swept', report.blobs)
+            metrics.increment('blobs.bytes_freed', report.bytes_freed)
+            logging.info('Blob sweep removed %s blobs (%s bytes)', report.blobs, report.bytes_freed)
+        return report
+
+    @staticmethod
+    def _touch(keys: list[str]) -> None:
+        if keys:
+            StoredBlob.query.filter(StoredBlob.key.in_(keys)).update(
+                {'last_referenced_at': utcnow()},
+                synchronize_session=False,
+            )
+
+    @staticmethod
+    def _existing(keys: list[str]) -> set[str]:
+        if not keys:
+            return set()
+        return {row.key for row in db.session.query(StoredBlob.key).filter(StoredBlob.key.in_(keys)).all()}
+
+    @staticmethod
+    def _add_refs(keys: list[str], owner_type: str, owner_id: str) -> None:
+        for key in keys:
+            _insert_ignoring_conflicts(BlobRef, {
+                'blob_key': key,
+                'owner_type': owner_type,
+                'owner_id': owner_id,
+                'created_at': utcnow(),
+            })
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import struct
+import tempfile
+from io import BytesIO
+import zlib
+
+from flask import current_app
+from PIL import Image
+
+from extensions import db
+from models import ColoringBook, GeneratedAsset
+from colorfulme.services.storage_service import StorageService
+from colorfulme.services.vectorize import PAGE_SIZES
+
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+MAX_MARGIN_IN = 2.0
+# ColoringBook.title is a String(200); the subtitle is only drawn, but still has to fit on the cover.
+MAX_TITLE_LENGTH = 200
+MAX_SUBTITLE_LENGTH = 300
+
+# PNG colour type -> (PDF colour space, components). Palette and alpha PNGs are re-encoded.
+_PNG_COLOR_TYPES = {0: ('/DeviceGray', 1), 2: ('/DeviceRGB', 3)}
+_VECTOR_STREAM = re.compile(rb'<< /Length (\d+) /Filter /FlateDecode >>\nstream\n')
+_VECTOR_CM = re.compile(rb'^q (\S+) 0 0 (\S+) (\S+) (\S+) cm')
+
+
+class PdfStreamWriter:
+    """Write a PDF object by object to a file, keeping only the xref offsets in memory."""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._offsets: dict[int, int] = {}
+        self._next = 1
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def reserve(self) -> int:
+        number = self._next
+        self._next += 1
+        return number
+
+    def add(self, body: bytes, number: int | None = None) -> int:
+        number = self._begin(number)
+        self._file.write(body + b'\nendobj\n')
+        return number
+
+    def add_stream(self, entries: bytes, chunks, length: int, number: int | None = None) -> int:
+        number = self._begin(number)
+        self._file.write(b'<< %s /Length %d >>\nstream\n' % (entries, length))
+        for chunk in chunks:
+            self._file.write(chunk)
+        self._file.write(b'\nendstream\nendobj\n')
+        return number
+
+    def close(self, root: int) -> None:
+        missing = set(range(1, self._next)) - set(self._offsets)
+        if missing:
+            raise RuntimeError(f'PDF objects reserved but never written: {sorted(missing)}')
+        xref = self._file.tell()
+        self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % self._next)
+        for number in range(1, self._next):
+            self._file.write(b'%010d 00000 n \n' % self._offsets[number])
+        self._file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self._next, root, xref))
+
+    def _begin(self, number: int | None) -> int:
+        if number is None:
+            number = self.reserve()
+        self._offsets[number] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % number)
+        return number
+
+
+class BookService:
+    def __init__(self):
+        self.storage = StorageService()
+        self.max_pages = int(current_app.config.get('BOOK_MAX_PAGES', 200))
+
+    def create_book(
+        self,
+        *,
+        user,
+        asset_ids,
+        page_size: str = 'letter',
+        margin_in: float = 0.5,
+        cover: dict | None = None,
+    ) -> ColoringBook:
+        page_size = (page_size or 'letter').lower()
+        if page_size not in PAGE_SIZES:
+            raise ValueError(f'page_size must be one of {", ".join(PAGE_SIZES)}')
+        if not isinstance(asset_ids, list) or not asset_ids:
+            raise ValueError('asset_ids must be a non-empty list')
+        if not all(isinstance(asset_id, str) for asset_id in asset_ids):
+            raise ValueError('asset_ids must contain only asset id strings')
+        if len(asset_ids) > self.max_pages:
+            raise ValueError(f'Book exceeds {self.max_pages} pages')
+        try:
+            margin_in = float(margin_in)
+        except (TypeError, ValueError) as exc:
+            raise ValueError('margin_in must be a number') from exc
+        if not 0 <= margin_in <= MAX_MARGIN_IN:
+            raise ValueError(f'margin_in must be between 0 and {MAX_MARGIN_IN:g}')
+        if cover is not None and not (isinstance(cover, dict) and isinstance(cover.get('title'), str) and cover['title'].strip()):
+            raise ValueError('cover must be an object with a title')
+        if cover is not None:
+            if len(cover['title'].strip()) > MAX_TITLE_LENGTH:
+                raise ValueError(f'cover title must be at most {MAX_TITLE_LENGTH} characters')
+            subtitle = cover.get('subtitle')
+            if subtitle is not None and not isinstance(subtitle, str):
+                raise ValueError('cover subtitle must be a string')
+            if len((subtitle or '').strip()) > MAX_SUBTITLE_LENGTH:
+                raise ValueError(f'cover subtitle must be at most {MAX_SUBTITLE_LENGTH} characters')
+
+        # Only the rows are loaded up front; page bytes are fetched one at a time while writing.
+        rows = GeneratedAsset.query.filter(GeneratedAsset.user_id == user.id, GeneratedAsset.id.in_(set(asset_ids))).all()
+        by_id = {asset.id: asset for asset in rows}
+        missing = [asset_id for asset_id in asset_ids if asset_id not in by_id]
+        if missing:
+            raise ValueError(f'Unknown asset ids: {", ".join(map(str, missing[:5]))}')
+        pages = [by_id[asset_id] for asset_id in asset_ids]
+
+        title = cover['title'].strip() if cover else None
+        handle, path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(handle, 'wb') as out:
+                self._write_book(out, pages, PAGE_SIZES[page_size], margin_in * 72, cover)
+                size_bytes = out.tell()
+            key, url = self.storage.save_file(path, extension='pdf', folder=f'{user.id}/books')
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+        book = ColoringBook(
+            user_id=user.id,
+            title=title,
+            page_count=len(pages) + (1 if cover else 0),
+            page_size=page_size,
+            margin_in=margin_in,
+            pdf_key=key,
+            pdf_url=url,
+            size_bytes=size_bytes,
+        )
+        db.session.add(book)
+        db.session.commit()
+        return book
+
+    def _write_book(self, out, pages, page_box, margin: float, cover: dict | None) -> None:
+        writer = PdfStreamWriter(out)
+        catalog = writer.reserve()
+        pages_obj = writer.reserve()
+        page_w, page_h = page_box
+        box = (margin, margin, page_w - 2 * margin, page_h - 2 * margin)
+        media_box = b'[0 0 %s %s]' % (_num(page_w), _num(page_h))
+
+        kids = []
+        if cover:
+            font = writer.add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+            content = zlib.compress(_cover_content(cover, page_box, margin))
+            contents = writer.add_stream(b'/Filter /FlateDecode', [content], len(content))
+            kids.append(
+                writer.add(
+                    b'<< /Type /Page /Parent %d 0 R /MediaBox %s /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+                    % (pages_obj, media_box, font, contents)
+                )
+            )
+
+        # A page repeated in the book points at the same XObject instead of embedding it again.
+        written: dict[str, tuple[int, bytes]] = {}
+        for asset in pages:
+            if asset.id not in written:
+                written[asset.id] = self._write_page_xobject(writer, asset, box)
+            xobject, placement = written[asset.id]
+            content = b'q %s cm /P0 Do Q' % placement
+            contents = writer.add_stream(b'', [content], len(content))
+            kids.append(
+                writer.add(
+                    b'<< /Type /Page /Parent %d 0 R /MediaBox %s /Resources << /XObject << /P0 %d 0 R >> >> /Contents %d 0 R >>'
+                    % (pages_obj, media_box, xobject, contents)
+                )
+            )
+
+        writer.add(
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)),
+            number=pages_obj,
+        )
+        writer.add(b'<< /Type /Catalog /Pages %d 0 R >>' % pages_obj, number=catalog)
+        writer.close(catalog)
+
+    def _write_page_xobject(self, writer: PdfStreamWriter, asset: GeneratedAsset, box) -> tuple[int, bytes]:
+        # Prefer the traced vector page; its content stream is embedded as a form without re-compressing.
+        if asset.vector_pdf_key and asset.width and asset.height:
+            try:
+                vector = _vector_form(self.storage.load_bytes(asset.vector_pdf_key), asset.width, asset.height)
+            except Exception:
+                logger.exception('Could not read vector page for asset %s; using the PNG', asset.id)
+                vector = None
+            if vector is not None:
+                bbox, stream = vector
+                x0, y0, x1, y1 = bbox
+                entries = b'/Type /XObject /Subtype /Form /BBox [%s] /Resources << >> /Filter /FlateDecode' % (
+                    b' '.join(_num(value) for value in bbox)
+                )
+                number = writer.add_stream(entries, [stream], len(stream))
+                scale, left, bottom = _fit(box, x1 - x0, y1 - y0)
+                return number, b'%s 0 0 %s %s %s' % (_num(scale), _num(scale), _num(left - x0 * scale), _num(bottom - y0 * scale))
+
+        png = self.storage.load_bytes(asset.png_key)
+        image = _png_image_stream(png)
+        if image is None:
+            image = _reencoded_image_stream(png)
+        width, height, entries, chunks, length = image
+        number = writer.add_stream(entries, chunks, length)
+        # Images are drawn into the unit square, so the matrix carries the final size.
+        scale, left, bottom = _fit(box, width, height)
+        return number, b'%s 0 0 %s %s %s' % (_num(width * scale), _num(height * scale), _num(left), _num(bottom))
+
+
+def _png_image_stream(png: bytes):
+    """Describe a PNG's IDAT data as a FlateDecode image, or None if PDF cannot take it verbatim."""
+    if not png.startswith(PNG_SIGNATURE):
+        return None
+    view = memoryview(png)
+    position = len(PNG_SIGNATURE)
+    header = None
+    chunks = []
+    while position + 8 <= len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        data = view[position + 8:position + 8 + length]
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', data)
+        elif kind == b'IDAT':
+            chunks.append(data)
+        elif kind == b'IEND':
+            break
+        position += 12 + length
+    if header is None or not chunks:
+        return None
+
+    width, height, bit_depth, color_type, _compression, _filter, interlace = header
+    if interlace or color_type not in _PNG_COLOR_TYPES or bit_depth not in (1, 8):
+        return None
+    color_space, colors = _PNG_COLOR_TYPES[color_type]
+    entries = (
+        b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent %d '
+        b'/Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >>'
+        % (width, height, color_space.encode('ascii'), bit_depth, colors, bit_depth, width)
+    )
+    return width, height, entries, chunks, sum(len(chunk) for chunk in chunks)
+
+
+def _reencoded_image_stream(png: bytes):
+    image = Image.open(BytesIO(png))
+    if image.mode not in {'RGB', 'L'}:
+        image = image.convert('RGB')
+    data = zlib.compress(image.tobytes())
+    color_space = b'/DeviceRGB' if image.mode == 'RGB' else b'/DeviceGray'
+    entries = b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode' % (
+        image.width,
+        image.height,
+        color_space,
+    )
+    return image.width, image.height, entries, [data], len(data)
+
+
+def _vector_form(pdf: bytes, width: int, height: int):
+    """Pull the drawing's content stream and bounding box out of a vector page written by vectorize.to_pdf."""
+    match = _VECTOR_STREAM.search(pdf)
+    if not match:
+        return None
+    stream = pdf[match.end():match.end() + int(match.group(1))]
+    # Only the leading transform is needed to locate the drawing on its page.
+    head = zlib.decompressobj().decompress(stream, 128)
+    cm = _VECTOR_CM.match(head)
+    if not cm:
+        return None
+    scale, flipped, tx, ty = (float(value) for value in cm.groups())
+    if scale <= 0 or flipped >= 0:
+        return None
+    return (tx, ty - height * scale, tx + width * scale, ty), stream
+
+
+def _fit(box, width: float, height: float) -> tuple[float, float, float]:
+    """Scale and lower-left corner that centre a width x height source inside the margin box."""
+    x, y, box_w, box_h = box
+    scale = min(box_w / width, box_h / height)
+    return scale, x + (box_w - width * scale) / 2, y + (box_h - height * scale) / 2
+
+
+def _cover_content(cover: dict, page_box, margin: float) -> bytes:
+    page_w, page_h = page_box
+    left = max(margin, 54.0)
+    lines = [(line, 36) for line in _wrap(cover['title'].strip(), page_w - 2 * left, 36)]
+    subtitle = str(cover.get('subtitle') or '').strip()
+    if subtitle:
+        lines += [(line, 18) for line in _wrap(subtitle, page_w - 2 * left, 18)]
+
+    ops = ['BT']
+    y = page_h * 0.62
+    for text, size in lines:
+        ops.append(f'/F1 {size} Tf 1 0 0 1 {_num(left).decode()} {_num(y).decode()} Tm ({_pdf_string(text)}) Tj')
+        y -= size * 1.3
+    ops.append('ET')
+    return '\n'.join(ops).encode('latin-1')
+
+
+def _wrap(text: str, width: float, size: int) -> list[str]:
+    # Helvetica-Bold averages a little over half an em per character.
+    per_line = max(1, int(width / (size * 0.6)))
+    lines, line = [], ''
+    for word in text.split():
+        candidate = f'{line} {word}'.strip()
+        if len(candidate) > per_line and line:
+            lines.append(line)
+            candidate = word
+        line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _pdf_string(text: str) -> str:
+    text = text.encode('cp1252', errors='replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _num(value: float) -> bytes:
+    text = f'{value:.3f}'.rstrip('0').rstrip('.')
+    return (text if text not in {'', '-0'} else '0').encode('ascii')
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import mimetypes
+import re
+from urllib.parse import quote
+
+from flask import Response, current_app, send_file
+
+from colorfulme.services.storage_service import StorageService
+
+
+DELIVERY_MODES = ('direct', 'x-sendfile', 'x-accel-redirect')
+
+# UUID (32 hex) or sha256 (64 hex) file names, optionally with a preview suffix. Such a key is
+# never reused for different content, so the requesting browser may cache it for max_age without
+# revalidating. Responses are always private: a sha256 name can be derived from the file's bytes.
+_IMMUTABLE_NAME = re.compile(r'^(?:[0-9a-f]{32}|[0-9a-f]{64})(?:-w\d+)?\.[a-z0-9]+$')
+
+
+def is_immutable_key(key: str) -> bool:
+    return bool(_IMMUTABLE_NAME.match(key.rsplit('/', 1)[-1]))
+
+
+def send_stored_file(
+    storage: StorageService,
+    key: str,
+    *,
+    mimetype: str | None = None,
+    as_attachment: bool = False,
+    download_name: str | None = None,
+    max_age: int | None = None,
+) -> Response:
+    """Serve a locally stored object according to LOCAL_DELIVERY_MODE.
+
+    ``direct`` answers Range and If-None-Match itself; full responses go out through the
+    server's wsgi.file_wrapper (sendfile() under gunicorn). ``x-sendfile`` (Apache, lighttpd)
+    and ``x-accel-redirect`` (nginx) hand the transfer to the fronting proxy, which then
+    owns ranges and revalidation too. The caller checks that the file exists.
+    """
+    mode = current_app.config.get('LOCAL_DELIVERY_MODE', 'direct')
+    mimetype = mimetype or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    if max_age is None:
+        max_age = int(current_app.config.get('ASSET_CACHE_SECONDS', 31536000))
+
+    if mode == 'x-accel-redirect':
+        prefix = current_app.config.get('LOCAL_ACCEL_REDIRECT_PREFIX', '/_protected/generated/')
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{quote(key)}"
+        if as_attachment:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name or key.rsplit('/', 1)[-1])
+    else:
+        # With USE_X_SENDFILE (set for the x-sendfile mode) Flask sends the header instead of the body.
+        response = send_file(
+            storage.absolute_local_path(key),
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+        )
+
+    if is_immutable_key(key):
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
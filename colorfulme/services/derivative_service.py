@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from io import BytesIO
+import logging
+import posixpath
+
+from flask import current_app
+from PIL import Image, features
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import AssetDerivative, GeneratedAsset
+from colorfulme.services.render_artifact import PREVIEW_FORMATS, RenderArtifact, encode_preview
+from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
+from colorfulme.utils.lru_budget import Throttle, over_budget_ids
+from colorfulme.utils.security import utcnow
+
+
+# Requested widths snap up to one of these, so a client cannot mint unbounded variants.
+PREVIEW_WIDTHS = (128, 256, 512, 1024)
+# last_used_at only moves when it is this stale; LRU order does not need per-view writes.
+TOUCH_INTERVAL = timedelta(hours=1)
+# Previews removed per eviction pass; anything left over goes on the next pass.
+EVICT_BATCH_SIZE = 500
+
+_eviction_throttle = Throttle()
+
+
+def parse_sizes(spec: str | None) -> list[tuple[int, str]]:
+    sizes = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        width, _, fmt = part.partition(':')
+        sizes.append(DerivativeService.normalize(width, fmt or 'webp'))
+    return sizes
+
+
+class DerivativeService:
+    def __init__(self, storage: StorageService | None = None):
+        self.storage = storage or StorageService()
+        self.max_entries = int(current_app.config.get('DERIVATIVE_CACHE_MAX_ENTRIES', 20000))
+        self.max_bytes = int(current_app.config.get('DERIVATIVE_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+        self.warm_sizes = parse_sizes(current_app.config.get('DERIVATIVE_WARM_SIZES'))
+        self.evict_interval = float(current_app.config.get('DERIVATIVE_CACHE_EVICT_INTERVAL_SECONDS', 60))
+
+    @staticmethod
+    def normalize(width, fmt: str | None) -> tuple[int, str]:
+        try:
+            width = int(width)
+        except (TypeError, ValueError) as exc:
+            raise ValueError('w must be an integer') from exc
+        if width <= 0:
+            raise ValueError('w must be positive')
+        fmt = (fmt or 'webp').strip().lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in PREVIEW_FORMATS:
+            raise ValueError(f'fmt must be one of {", ".join(PREVIEW_FORMATS)}')
+        if fmt == 'webp' and not features.check('webp'):
+            fmt = 'png'
+        snapped = next((size for size in PREVIEW_WIDTHS if size >= width), PREVIEW_WIDTHS[-1])
+        return snapped, fmt
+
+    @staticmethod
+    def key_for(source_key: str, width: int, fmt: str) -> str:
+        folder, name = posixpath.split(source_key)
+        stem = name.rsplit('.', 1)[0]
+        return posixpath.join(folder, 'previews', f'{stem}-w{width}.{fmt}')
+
+    def get_or_create(self, asset: GeneratedAsset, width: int, fmt: str) -> AssetDerivative:
+        derivative = AssetDerivative.query.filter_by(source_key=asset.png_key, width=width, fmt=fmt).first()
+        if derivative is not None:
+            metrics.increment('derivatives.hits')
+            now = utcnow()
+            if derivative.last_used_at < now - TOUCH_INTERVAL:
+                derivative.last_used_at = now
+                db.session.commit()
+            return derivative
+
+        metrics.increment('derivatives.misses')
+        image = Image.open(BytesIO(self.storage.load_bytes(asset.png_key)))
+        image.load()
+        derivative = self._add(asset.png_key, width, fmt, encode_preview(image, width, fmt))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request built the same variant; its object has identical bytes.
+            db.session.rollback()
+            return AssetDerivative.query.filter_by(source_key=asset.png_key, width=width, fmt=fmt).one()
+
+        # Not on every miss: one pass per DERIVATIVE_CACHE_EVICT_INTERVAL_SECONDS per process is enough.
+        if _eviction_throttle.ready(self.evict_interval):
+            self.evict()
+        return derivative
+
+    def warm(self, asset: GeneratedAsset, artifact: RenderArtifact) -> None:
+        """Store the configured preview sizes from the in-memory render. Committed with the asset."""
+        for width, fmt in self.warm_sizes:
+            self._add(asset.png_key, width, fmt, artifact.preview(width, fmt))
+
+    def evict(self) -> int:
+        stale_ids = over_budget_ids(
+            AssetDerivative,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+            limit=EVICT_BATCH_SIZE,
+        )
+        stale = [] if stale_ids is None else (
+            db.session.query(AssetDerivative.id, AssetDerivative.storage_key)
+            .filter(AssetDerivative.id.in_(stale_ids))
+            .all()
+        )
+        if not stale:
+            db.session.commit()
+            return 0
+
+        AssetDerivative.query.filter(AssetDerivative.id.in_([derivative_id for derivative_id, _ in stale])).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        for _, storage_key in stale:
+            try:
+                self.storage.delete(storage_key)
+            except Exception as exc:
+                logging.warning('Could not delete evicted preview %s: %s', storage_key, exc)
+        metrics.increment('derivatives.evictions', len(stale))
+        logging.info('Derivative cache evicted %s previews', len(stale))
+        return len(stale)
+
+    def _add(self, source_key: str, width: int, fmt: str, payload: bytes) -> AssetDerivative:
+        storage_key = self.key_for(source_key, width, fmt)
+        self.storage.write_bytes(storage_key, payload)
+        derivative = AssetDerivative(
+            source_key=source_key,
+            width=width,
+            fmt=fmt,
+            storage_key=storage_key,
+            size_bytes=len(payload),
+        )
+        db.session.add(derivative)
+        return derivative
@@ -1,20 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from io import BytesIO
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
 import logging
+import threading
+import uuid
 
 from flask import current_app
-from PIL import Image, ImageOps, ImageFilter
 
 from extensions import db
-from models import GeneratedAsset, GenerationJob, User
+from models import GeneratedAsset, GenerationBatch, GenerationJob, User
+from colorfulme.services import job_events, line_art
+from colorfulme.services.blob_store import BlobStore
 from colorfulme.services.credits_service import InsufficientCreditsError, credit_credits, debit_credits, get_active_plan
+from colorfulme.services.derivative_service import DerivativeService
 from colorfulme.services.moderation_service import ModerationService
-from colorfulme.services.openai_client import OpenAIClient
-from colorfulme.services.pdf_service import PdfService
+from colorfulme.services.openai_client import GeneratedImage, OpenAIClient
+from colorfulme.services.render_artifact import OUTPUT_MODES, PNG_PROFILES, RenderArtifact
+from colorfulme.services.render_cache import RenderCacheService
+from colorfulme.services.render_tasks import RenderTask, run_render_task
 from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
+from colorfulme.utils.executors import discard_process_pool, get_executor, get_process_pool
 from colorfulme.utils.security import utcnow
+from colorfulme.utils.ttl_cache import TTLCache
 
 
 CREDIT_COST = {
@@ -25,6 +34,53 @@ CREDIT_COST = {
 
 VALID_QUALITY_PROFILES = {'auto', 'economy', 'balanced', 'premium'}
 
+# Batch items carry no source image, so only prompt-driven modes are accepted.
+BATCH_MODES = {'text'}
+
+MODERATION_POOL_SIZE = 8
+
+_placeholder_lock = threading.Lock()
+_placeholder_renders: TTLCache | None = None
+
+
+def _get_placeholder_renders() -> TTLCache:
+    global _placeholder_renders
+    if _placeholder_renders is None:
+        with _placeholder_lock:
+            if _placeholder_renders is None:
+                _placeholder_renders = TTLCache(
+                    int(current_app.config.get('FALLBACK_RENDER_CACHE_MAX_ENTRIES', 128)),
+                    name='fallback.render_cache',
+                )
+    return _placeholder_renders
+
+
+def clear_placeholder_renders() -> None:
+    if _placeholder_renders is not None:
+        _placeholder_renders.clear()
+
+
+def _run_in_app(app, fn, *args, **kwargs):
+    with app.app_context():
+        return fn(*args, **kwargs)
+
+
+def _process_detached(job_id: str) -> GenerationResult | None:
+    # Imported here because the queue module is built on top of this one.
+    from colorfulme.services.job_queue import claim_job, default_worker_id
+
+    job = claim_job(job_id, f'{default_worker_id()}/web')
+    if job is None:
+        # A queue worker got to it first.
+        return None
+    return GenerationService().process_job(job)
+
+
+def _log_detached_failure(future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logging.error('Background generation crashed', exc_info=exc)
+
 
 @dataclass(frozen=True)
 class RenderPlan:
@@ -42,6 +98,21 @@ class GenerationResult:
     render_model: str
     render_quality: str
     estimated_cost_usd: float | None
+    cache_hit: bool = False
+    hedged: bool = False
+
+
+@dataclass
+class RenderOutput:
+    render: GeneratedImage
+    artifact: RenderArtifact
+
+
+@dataclass
+class BatchResult:
+    batch: GenerationBatch
+    jobs: list[GenerationJob] = field(default_factory=list)
+    credits_used: int = 0
 
 
 class GenerationService:
@@ -49,7 +120,20 @@ class GenerationService:
         self.openai_client = OpenAIClient()
         self.moderation = ModerationService()
         self.storage = StorageService()
-        self.pdf = PdfService()
+        self.blobs = BlobStore(self.storage)
+        self.render_cache = RenderCacheService()
+        self.derivatives = DerivativeService(self.storage)
+        self.speculative_moderation = bool(current_app.config.get('SPECULATIVE_MODERATION', False))
+        self.line_art_pipeline = line_art.resolve_pipeline(current_app.config.get('LINE_ART_PIPELINE'))
+        self.output_mode = (current_app.config.get('LINE_ART_OUTPUT_MODE') or 'rgb').strip().lower()
+        if self.output_mode not in OUTPUT_MODES:
+            raise ValueError(f'Unknown LINE_ART_OUTPUT_MODE: {self.output_mode}')
+        self.vector_export = bool(current_app.config.get('VECTOR_EXPORT_ENABLED', True))
+        self.vector_page_size = (current_app.config.get('VECTOR_PDF_PAGE_SIZE') or 'letter').strip().lower()
+        self.png_profile = (current_app.config.get('PNG_ENCODER_PROFILE') or 'fast').strip().lower()
+        if self.png_profile not in PNG_PROFILES:
+            raise ValueError(f'Unknown PNG_ENCODER_PROFILE: {self.png_profile}')
+        self.cpu_pool_workers = int(current_app.config.get('CPU_POOL_WORKERS', 0))
 
     def create_and_process(
         self,
@@ -62,7 +146,163 @@ class GenerationService:
         difficulty: str | None,
         quality_profile: str | None,
         source_image_bytes: bytes | None = None,
+        fresh: bool = False,
+    ) -> GenerationResult:
+        job, render_plan = self._create_job(
+            user=user,
+            mode=mode,
+            prompt=prompt,
+            style=style,
+            aspect_ratio=aspect_ratio,
+            difficulty=difficulty,
+            quality_profile=quality_profile,
+            has_source_image=source_image_bytes is not None,
+            fresh=fresh,
+        )
+        return self._process(job=job, user=user, render_plan=render_plan, source_image_bytes=source_image_bytes)
+
+    def enqueue(
+        self,
+        *,
+        user: User,
+        mode: str,
+        prompt: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        difficulty: str | None,
+        quality_profile: str | None,
+        source_image_bytes: bytes | None = None,
+        fresh: bool = False,
     ) -> GenerationResult:
+        job, render_plan = self._create_job(
+            user=user,
+            mode=mode,
+            prompt=prompt,
+            style=style,
+            aspect_ratio=aspect_ratio,
+            difficulty=difficulty,
+            quality_profile=quality_profile,
+            has_source_image=source_image_bytes is not None,
+            fresh=fresh,
+        )
+
+        # The worker runs in another process, so the upload has to outlive this request.
+        if source_image_bytes is not None:
+            if self.blobs.enabled:
+                job.source_key = self.blobs.put(
+                    source_image_bytes,
+                    extension='bin',
+                    owner_type='job_source',
+                    owner_id=job.id,
+                ).key
+            else:
+                job.source_key, _ = self.storage.save_bytes(
+                    source_image_bytes,
+                    extension='bin',
+                    folder=f'{user.id}/{job.id}/source',
+                )
+        job.queued_at = utcnow()
+        db.session.commit()
+        return self._result(job, render_plan)
+
+    def submit(
+        self,
+        *,
+        user: User,
+        mode: str,
+        prompt: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        difficulty: str | None,
+        quality_profile: str | None,
+        source_image_bytes: bytes | None = None,
+        fresh: bool = False,
+    ) -> GenerationResult:
+        # Queued durably first (source stored, queued_at set), so a restart only delays the job: queue
+        # workers pick up whatever this process did not claim. The thread pool just gets the id.
+        result = self.enqueue(
+            user=user,
+            mode=mode,
+            prompt=prompt,
+            style=style,
+            aspect_ratio=aspect_ratio,
+            difficulty=difficulty,
+            quality_profile=quality_profile,
+            source_image_bytes=source_image_bytes,
+            fresh=fresh,
+        )
+        executor = get_executor('generation', current_app.config.get('GENERATION_BACKGROUND_THREADS', 4))
+        future = executor.submit(
+            _run_in_app,
+            current_app._get_current_object(),
+            _process_detached,
+            result.job.id,
+        )
+        future.add_done_callback(_log_detached_failure)
+        return result
+
+    def process_job(self, job: GenerationJob) -> GenerationResult:
+        render_plan = self._stored_plan(job)
+
+        source_image_bytes = None
+        if job.source_key:
+            try:
+                source_image_bytes = self.storage.load_bytes(job.source_key)
+            except Exception as exc:
+                logging.exception('Could not load source image for job=%s', job.id)
+                self._finish(job, status='failed', error_message=f'Source image unavailable: {exc}')
+                return self._result(job, render_plan)
+
+        try:
+            return self._process(job=job, user=job.user, render_plan=render_plan, source_image_bytes=source_image_bytes)
+        finally:
+            if job.source_key:
+                self._discard_source(job)
+
+    def _create_job(
+        self,
+        *,
+        user: User,
+        mode: str,
+        prompt: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        difficulty: str | None,
+        quality_profile: str | None,
+        has_source_image: bool,
+        fresh: bool = False,
+    ) -> tuple[GenerationJob, RenderPlan]:
+        plan = get_active_plan(user)
+        job, render_plan = self._build_job(
+            user=user,
+            plan_code=plan.code if plan else 'free',
+            mode=mode,
+            prompt=prompt,
+            style=style,
+            aspect_ratio=aspect_ratio,
+            difficulty=difficulty,
+            quality_profile=quality_profile,
+            has_source_image=has_source_image,
+            fresh=fresh,
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job, render_plan
+
+    def _build_job(
+        self,
+        *,
+        user: User,
+        plan_code: str,
+        mode: str,
+        prompt: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        difficulty: str | None,
+        quality_profile: str | None,
+        has_source_image: bool,
+        fresh: bool = False,
+    ) -> tuple[GenerationJob, RenderPlan]:
         mode = (mode or 'text').strip().lower()
         if mode not in CREDIT_COST:
             raise ValueError('Invalid generation mode')
@@ -74,14 +314,13 @@ class GenerationService:
         if mode in {'text', 'recolor'} and not prompt:
             raise ValueError('Prompt is required for this generation mode')
 
-        if mode == 'photo' and source_image_bytes is None:
+        if mode == 'photo' and not has_source_image:
             raise ValueError('Source image is required for photo mode')
 
-        plan = get_active_plan(user)
         render_plan = self._resolve_render_plan(
             requested_profile=quality_profile,
             difficulty=difficulty,
-            plan_code=plan.code if plan else 'free',
+            plan_code=plan_code,
         )
 
         job = GenerationJob(
@@ -93,105 +332,531 @@ class GenerationService:
             difficulty=(difficulty or '').strip()[:40] or None,
             status='queued',
             cost_credits=CREDIT_COST[mode],
+            fresh=bool(fresh),
+            render_profile=render_plan.profile,
+            render_model=render_plan.model,
+            render_quality=render_plan.quality,
         )
-        db.session.add(job)
-        db.session.commit()
+        return job, render_plan
 
-        allowed, reason = self.moderation.check_prompt(prompt or 'family-safe coloring page')
+    def _process(
+        self,
+        *,
+        job: GenerationJob,
+        user: User,
+        render_plan: RenderPlan,
+        source_image_bytes: bytes | None,
+    ) -> GenerationResult:
+        prompt = job.prompt or ''
+        moderation_text = prompt or 'family-safe coloring page'
+
+        # Speculative mode keeps only the local gate in front of the render; the
+        # upstream verdict is awaited before anything is stored.
+        speculative = self.speculative_moderation and self.moderation.uses_upstream
+        if speculative:
+            allowed, reason = self.moderation.check_local(moderation_text)
+        else:
+            allowed, reason = self.moderation.check_prompt(moderation_text)
         if not allowed:
-            job.status = 'blocked'
-            job.error_message = reason
-            job.completed_at = utcnow()
-            db.session.commit()
-            return GenerationResult(
-                job=job,
-                asset=None,
-                credits_used=0,
-                render_profile=render_plan.profile,
-                render_model=render_plan.model,
-                render_quality=render_plan.quality,
-                estimated_cost_usd=None,
-            )
+            self._finish(job, status='blocked', error_message=reason)
+            return self._result(job, render_plan)
 
         try:
             debit_credits(user, job.cost_credits, reason='generation', reference_id=job.id)
         except InsufficientCreditsError as exc:
-            job.status = 'failed'
-            job.error_message = str(exc)
-            job.completed_at = utcnow()
-            db.session.commit()
-            return GenerationResult(
-                job=job,
-                asset=None,
-                credits_used=0,
-                render_profile=render_plan.profile,
-                render_model=render_plan.model,
-                render_quality=render_plan.quality,
-                estimated_cost_usd=None,
-            )
+            self._finish(job, status='failed', error_message=str(exc))
+            return self._result(job, render_plan)
 
         job.status = 'processing'
         db.session.commit()
-
-        try:
-            render = self.openai_client.generate_image(
-                prompt=prompt or 'Printable coloring page',
-                mode=mode,
-                style=style,
-                aspect_ratio=aspect_ratio,
-                source_image=source_image_bytes,
-                model=render_plan.model,
-                quality=render_plan.quality,
-            )
-            clean_png = self._post_process_line_art(render.png_bytes)
-            pdf_bytes = self.pdf.png_to_pdf_bytes(clean_png)
-
-            png_key, png_url = self.storage.save_bytes(clean_png, extension='png', folder=f'{user.id}/{job.id}')
-            pdf_key, pdf_url = self.storage.save_bytes(pdf_bytes, extension='pdf', folder=f'{user.id}/{job.id}')
-
-            width, height = self._image_dimensions(clean_png)
-
-            asset = GeneratedAsset(
-                user_id=user.id,
-                job_id=job.id,
-                png_key=png_key,
-                pdf_key=pdf_key,
-                png_url=png_url,
-                pdf_url=pdf_url,
-                width=width,
-                height=height,
+        job_events.publish(job.id, job.status)
+
+        upstream_verdict = None
+        if speculative:
+            upstream_verdict = get_executor('moderation', MODERATION_POOL_SIZE).submit(
+                _run_in_app,
+                current_app._get_current_object(),
+                self.moderation.check_upstream,
+                moderation_text,
             )
-            db.session.add(asset)
 
-            job.status = 'completed'
-            job.completed_at = utcnow()
-            db.session.commit()
+        cache_key = self._render_cache_key(job, render_plan, has_source_image=source_image_bytes is not None)
+        try:
+            cached_asset = self._asset_from_cache(user=user, job=job, cache_key=cache_key) if cache_key else None
+            output = None
+            if cached_asset is None:
+                output = self._render(
+                    **self._render_args(job),
+                    render_plan=render_plan,
+                    source_image_bytes=source_image_bytes,
+                )
+
+            if upstream_verdict is not None:
+                allowed, reason = upstream_verdict.result()
+                if not allowed:
+                    # Drop the render (and any pending cached asset) and give the credits back.
+                    db.session.rollback()
+                    credit_credits(user, job.cost_credits, reason='generation_refund', reference_id=job.id)
+                    self._finish(job, status='blocked', error_message=reason)
+                    return self._result(job, render_plan)
+
+            if cached_asset is not None:
+                self._finish(job, status='completed')
+                return GenerationResult(
+                    job=job,
+                    asset=cached_asset,
+                    credits_used=job.cost_credits,
+                    render_profile=render_plan.profile,
+                    render_model=job.render_model,
+                    render_quality=job.render_quality,
+                    estimated_cost_usd=job.estimated_cost_usd,
+                    cache_hit=True,
+                )
+
+            asset = self._store_asset(user=user, job=job, output=output)
+            self._finish(job, status='completed')
+            self._remember_render(cache_key, job=job, render_plan=render_plan, output=output, asset=asset)
             return GenerationResult(
                 job=job,
                 asset=asset,
                 credits_used=job.cost_credits,
                 render_profile=render_plan.profile,
-                render_model=render.model,
-                render_quality=render.quality,
-                estimated_cost_usd=render.estimated_cost_usd,
+                render_model=output.render.model,
+                render_quality=output.render.quality,
+                estimated_cost_usd=output.render.estimated_cost_usd,
+                hedged=output.render.hedged,
             )
 
         except Exception as exc:
             logging.exception('Generation failed for job=%s', job.id)
+            db.session.rollback()
             credit_credits(user, job.cost_credits, reason='generation_refund', reference_id=job.id)
-            job.status = 'failed'
-            job.error_message = str(exc)
-            job.completed_at = utcnow()
+            self._finish(job, status='failed', error_message=str(exc))
+            return self._result(job, render_plan)
+
+    @staticmethod
+    def _render_args(job: GenerationJob) -> dict:
+        # Plain values only: renders may run on pool threads that must not touch the ORM session.
+        return {
+            'prompt': job.prompt or '',
+            'mode': job.mode,
+            'style': job.style,
+            'aspect_ratio': job.aspect_ratio,
+        }
+
+    def _render(
+        self,
+        *,
+        prompt: str,
+        mode: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        render_plan: RenderPlan,
+        source_image_bytes: bytes | None,
+    ) -> RenderOutput:
+        render = self.openai_client.generate_image(
+            prompt=prompt or 'Printable coloring page',
+            mode=mode,
+            style=style,
+            aspect_ratio=aspect_ratio,
+            source_image=source_image_bytes,
+            model=render_plan.model,
+            quality=render_plan.quality,
+        )
+        task = RenderTask(
+            png_bytes=render.png_bytes,
+            local=render.local,
+            pipeline=self.line_art_pipeline,
+            output_mode=self.output_mode,
+            page_size=self.vector_page_size,
+            png_profile=self.png_profile,
+            vector_export=self.vector_export,
+            preview_sizes=tuple(self.derivatives.warm_sizes),
+        )
+        # The task owns the raw render now; keep only its metadata here.
+        render = replace(render, png_bytes=None, local=None)
+        # Decode, clean and encode in one step, so storing the asset only moves bytes.
+        artifact = self._run_cpu_task(task)
+        return RenderOutput(render=render, artifact=artifact)
+
+    def _run_cpu_task(self, task: RenderTask) -> RenderArtifact:
+        key = task.placeholder_key()
+        if key is None:
+            return self._run_render_task(task)
+        # Fallback pages only vary by their two text lines: repeated prompts reuse the whole
+        # encoded artifact. It holds bytes only, so sharing one between requests is safe.
+        cache = _get_placeholder_renders()
+        artifact = cache.get(key)
+        if artifact is None:
+            artifact = self._run_render_task(task)
+            cache.set(key, artifact)
+        return artifact
+
+    def _run_render_task(self, task: RenderTask) -> RenderArtifact:
+        if self.cpu_pool_workers <= 0:
+            return run_render_task(task)
+        pool = get_process_pool('cpu', self.cpu_pool_workers)
+        try:
+            return pool.submit(run_render_task, task).result()
+        except BrokenProcessPool:
+            # A pool child died (OOM kill, crash); replace the pool and finish this render here.
+            logging.warning('CPU pool broke; restarting it and rendering inline')
+            metrics.increment('cpu_pool.broken')
+            discard_process_pool('cpu', pool)
+            return run_render_task(task)
+
+    def _store_asset(self, *, user: User, job: GenerationJob, output: RenderOutput) -> GeneratedAsset:
+        artifact = output.artifact
+        asset_id = str(uuid.uuid4())
+        folder = f'{user.id}/{job.id}'
+        items = [(artifact.png, 'png', folder), (artifact.pdf, 'pdf', folder)]
+        if self.vector_export:
+            items += [(artifact.svg, 'svg', folder), (artifact.vector_pdf, 'pdf', f'{folder}/vector')]
+        if self.blobs.enabled:
+            # Identical pages (repeated fallback renders, regenerated seeds) share one stored copy.
+            stored = self.blobs.put_many(
+                [(payload, extension) for payload, extension, _folder in items],
+                owner_type='asset',
+                owner_id=asset_id,
+            )
+            saved = [(item.key, item.url) for item in stored]
+            new_png = stored[0].created
+        else:
+            saved = self.storage.save_many(items)
+            new_png = True
+        (png_key, png_url), (pdf_key, pdf_url) = saved[:2]
+        svg_key = svg_url = vector_pdf_key = vector_pdf_url = None
+        if self.vector_export:
+            (svg_key, svg_url), (vector_pdf_key, vector_pdf_url) = saved[2:]
+
+        asset = GeneratedAsset(
+            id=asset_id,
+            user_id=user.id,
+            job_id=job.id,
+            png_key=png_key,
+            pdf_key=pdf_key,
+            png_url=png_url,
+            pdf_url=pdf_url,
+            svg_key=svg_key,
+            svg_url=svg_url,
+            vector_pdf_key=vector_pdf_key,
+            vector_pdf_url=vector_pdf_url,
+            png_profile=artifact.png_profile,
+            width=artifact.width,
+            height=artifact.height,
+        )
+        db.session.add(asset)
+        try:
+            # A deduplicated PNG already has its previews (or rebuilds them on first request).
+            if new_png:
+                self.derivatives.warm(asset, artifact)
+        except Exception as exc:
+            # Previews are rebuilt on first request; never fail a finished render over them.
+            logging.warning('Could not store previews for job=%s: %s', job.id, exc)
+
+        job.render_model = output.render.model
+        job.render_quality = output.render.quality
+        job.estimated_cost_usd = output.render.estimated_cost_usd
+        return asset
+
+    def _render_cache_key(self, job: GenerationJob, render_plan: RenderPlan, *, has_source_image: bool) -> str | None:
+        # Photo-driven renders depend on the upload, which is not part of the key.
+        if job.fresh or has_source_image or not self.render_cache.enabled:
+            return None
+        return RenderCacheService.make_key(
+            mode=job.mode,
+            prompt=job.prompt,
+            style=job.style,
+            aspect_ratio=job.aspect_ratio,
+            model=render_plan.model,
+            quality=render_plan.quality,
+            output_mode=self.output_mode,
+            png_profile=self.png_profile,
+            vector_page_size=self.vector_page_size if self.vector_export else None,
+        )
+
+    def _asset_from_cache(self, *, user: User, job: GenerationJob, cache_key: str) -> GeneratedAsset | None:
+        entry = self.render_cache.lookup(cache_key)
+        if entry is None:
+            return None
+
+        asset_id = str(uuid.uuid4())
+        keys = [entry.png_key, entry.pdf_key, entry.svg_key, entry.vector_pdf_key]
+        if not self.blobs.add_refs(keys, owner_type='asset', owner_id=asset_id):
+            # Swept while the entry was being read; the sweep drops the entry too.
+            return None
+
+        asset = GeneratedAsset(
+            id=asset_id,
+            user_id=user.id,
+            job_id=job.id,
+            png_key=entry.png_key,
+            pdf_key=entry.pdf_key,
+            png_url=self.storage.get_download_url(entry.png_key),
+            pdf_url=self.storage.get_download_url(entry.pdf_key),
+            svg_key=entry.svg_key,
+            svg_url=self.storage.get_download_url(entry.svg_key) if entry.svg_key else None,
+            vector_pdf_key=entry.vector_pdf_key,
+            vector_pdf_url=self.storage.get_download_url(entry.vector_pdf_key) if entry.vector_pdf_key else None,
+            png_profile=entry.png_profile,
+            width=entry.width,
+            height=entry.height,
+        )
+        db.session.add(asset)
+
+        job.render_model = entry.model
+        job.render_quality = entry.quality
+        job.estimated_cost_usd = 0.0
+        return asset
+
+    def _remember_render(
+        self,
+        cache_key: str | None,
+        *,
+        job: GenerationJob,
+        render_plan: RenderPlan,
+        output: RenderOutput,
+        asset: GeneratedAsset,
+    ) -> None:
+        if cache_key is None:
+            return
+
+        # Only cache what was asked for; a degraded fallback render would otherwise stick.
+        render = output.render
+        if render.model != render_plan.model and not (render.used_fallback and not self.openai_client.api_key):
+            return
+
+        try:
+            self.render_cache.store(
+                cache_key,
+                mode=job.mode,
+                model=render.model,
+                quality=render.quality,
+                png_key=asset.png_key,
+                pdf_key=asset.pdf_key,
+                svg_key=asset.svg_key,
+                vector_pdf_key=asset.vector_pdf_key,
+                png_profile=asset.png_profile,
+                width=asset.width,
+                height=asset.height,
+                size_bytes=output.artifact.size_bytes,
+            )
+        except Exception as exc:
+            db.session.rollback()
+            logging.warning('Could not cache render for job=%s: %s', job.id, exc)
+
+    def create_batch(self, *, user: User, items: list[dict], queued: bool = False) -> BatchResult:
+        if not isinstance(items, list) or not items:
+            raise ValueError('Batch requires a non-empty list of items')
+
+        max_items = int(current_app.config.get('GENERATION_BATCH_MAX_ITEMS', 50))
+        if len(items) > max_items:
+            raise ValueError(f'Batch exceeds {max_items} items')
+
+        plan = get_active_plan(user)
+        plan_code = plan.code if plan else 'free'
+
+        batch = GenerationBatch(user_id=user.id, status='queued', item_count=len(items))
+        db.session.add(batch)
+
+        jobs = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f'Batch item {index} must be an object')
+            mode = (item.get('mode') or 'text').strip().lower()
+            if mode not in BATCH_MODES:
+                raise ValueError(f'Batch item {index}: mode must be one of {", ".join(sorted(BATCH_MODES))}')
+            try:
+                job, _ = self._build_job(
+                    user=user,
+                    plan_code=plan_code,
+                    mode=mode,
+                    prompt=str(item.get('prompt') or ''),
+                    style=str(item.get('style') or '') or None,
+                    aspect_ratio=str(item.get('aspect_ratio') or '1:1'),
+                    difficulty=str(item.get('difficulty') or 'standard'),
+                    quality_profile=str(item.get('quality_profile') or 'auto'),
+                    has_source_image=False,
+                    fresh=bool(item.get('fresh')),
+                )
+            except ValueError as exc:
+                raise ValueError(f'Batch item {index}: {exc}') from exc
+            job.batch = batch
+            job.batch_index = index
+            jobs.append(job)
+
+        db.session.add_all(jobs)
+        if queued:
+            batch.queued_at = utcnow()
+        db.session.commit()
+
+        if queued:
+            return BatchResult(batch=batch, jobs=jobs)
+        return self.process_batch(batch)
+
+    def process_batch(self, batch: GenerationBatch) -> BatchResult:
+        user = batch.user
+        jobs = list(batch.jobs)
+        app = current_app._get_current_object()
+        executor = get_executor('generation-batch', current_app.config.get('GENERATION_BATCH_CONCURRENCY', 4))
+
+        batch.status = 'processing'
+        db.session.commit()
+
+        prompts = [job.prompt or 'family-safe coloring page' for job in jobs]
+        verdicts = [executor.submit(_run_in_app, app, self.moderation.check_prompt, prompt) for prompt in prompts]
+        allowed_jobs = []
+        for job, verdict in zip(jobs, verdicts):
+            allowed, reason = verdict.result()
+            if allowed:
+                allowed_jobs.append(job)
+            else:
+                job.status = 'blocked'
+                job.error_message = reason
+                job.completed_at = utcnow()
+        db.session.commit()
+        self._publish(jobs)
+
+        total_cost = sum(job.cost_credits for job in allowed_jobs)
+        try:
+            debit_credits(
+                user,
+                total_cost,
+                reason='generation_batch',
+                reference_type='generation_batch',
+                reference_id=batch.id,
+            )
+        except InsufficientCreditsError as exc:
+            for job in allowed_jobs:
+                job.status = 'failed'
+                job.error_message = str(exc)
+                job.completed_at = utcnow()
+            batch.status = 'failed'
+            batch.error_message = str(exc)
+            batch.completed_at = utcnow()
             db.session.commit()
-            return GenerationResult(
-                job=job,
-                asset=None,
-                credits_used=0,
-                render_profile=render_plan.profile,
-                render_model=render_plan.model,
-                render_quality=render_plan.quality,
-                estimated_cost_usd=None,
+            self._publish(jobs)
+            return BatchResult(batch=batch, jobs=jobs)
+
+        batch.cost_credits = total_cost
+        for job in allowed_jobs:
+            job.status = 'processing'
+        db.session.commit()
+        self._publish(allowed_jobs)
+
+        cache_keys = {}
+        render_jobs = []
+        for job in allowed_jobs:
+            render_plan = RenderPlan(profile=job.render_profile, model=job.render_model, quality=job.render_quality)
+            cache_keys[job.id] = self._render_cache_key(job, render_plan, has_source_image=False)
+            if cache_keys[job.id] and self._asset_from_cache(user=user, job=job, cache_key=cache_keys[job.id]):
+                job.status = 'completed'
+                job.completed_at = utcnow()
+            else:
+                render_jobs.append((job, render_plan))
+        db.session.commit()
+        self._publish(allowed_jobs)
+
+        futures = [
+            executor.submit(
+                _run_in_app,
+                app,
+                self._render,
+                **self._render_args(job),
+                render_plan=render_plan,
+                source_image_bytes=None,
             )
+            for job, render_plan in render_jobs
+        ]
+
+        refund = 0
+        rendered = []
+        for (job, render_plan), future in zip(render_jobs, futures):
+            try:
+                output = future.result()
+                asset = self._store_asset(user=user, job=job, output=output)
+                rendered.append((job, render_plan, output, asset))
+                job.status = 'completed'
+                job.error_message = None
+            except Exception as exc:
+                logging.exception('Batch generation failed for batch=%s job=%s', batch.id, job.id)
+                refund += job.cost_credits
+                job.status = 'failed'
+                job.error_message = str(exc)
+            job.completed_at = utcnow()
+        db.session.commit()
+        self._publish(job for job, _ in render_jobs)
+
+        for job, render_plan, output, asset in rendered:
+            self._remember_render(cache_keys[job.id], job=job, render_plan=render_plan, output=output, asset=asset)
+
+        # One ledger entry for every failed item instead of a refund per job.
+        if refund:
+            credit_credits(
+                user,
+                refund,
+                reason='generation_batch_refund',
+                reference_type='generation_batch',
+                reference_id=batch.id,
+            )
+
+        completed = sum(1 for job in jobs if job.status == 'completed')
+        if completed == len(jobs):
+            batch.status = 'completed'
+        elif completed:
+            batch.status = 'partial'
+        else:
+            batch.status = 'failed'
+        batch.refunded_credits = refund
+        batch.completed_at = utcnow()
+        db.session.commit()
+        return BatchResult(batch=batch, jobs=jobs, credits_used=total_cost - refund)
+
+    @staticmethod
+    def _finish(job: GenerationJob, *, status: str, error_message: str | None = None) -> None:
+        job.status = status
+        job.error_message = error_message
+        job.completed_at = utcnow()
+        db.session.commit()
+        job_events.publish(job.id, status)
+
+    @staticmethod
+    def _publish(jobs) -> None:
+        for job in jobs:
+            job_events.publish(job.id, job.status)
+
+    @staticmethod
+    def _stored_plan(job: GenerationJob) -> RenderPlan:
+        return RenderPlan(
+            profile=job.render_profile or 'economy',
+            model=job.render_model or current_app.config.get('OPENAI_MODEL', 'gpt-image-1.5'),
+            quality=job.render_quality or 'medium',
+        )
+
+    @staticmethod
+    def _result(job: GenerationJob, render_plan: RenderPlan) -> GenerationResult:
+        return GenerationResult(
+            job=job,
+            asset=None,
+            credits_used=0,
+            render_profile=render_plan.profile,
+            render_model=render_plan.model,
+            render_quality=render_plan.quality,
+            estimated_cost_usd=None,
+        )
+
+    def _discard_source(self, job: GenerationJob) -> None:
+        try:
+            if self.blobs.is_blob_key(job.source_key):
+                # Other jobs may have uploaded the same photo; the sweeper deletes it once unowned.
+                self.blobs.release(owner_type='job_source', owner_id=job.id)
+            else:
+                self.storage.delete(job.source_key)
+        except Exception as exc:
+            logging.warning('Could not delete source image for job=%s: %s', job.id, exc)
+            return
+        job.source_key = None
+        db.session.commit()
 
     @staticmethod
     def _normalize_profile(value: str | None) -> str:
@@ -225,21 +890,3 @@ class GenerationService:
         }[profile]
 
         return RenderPlan(profile=profile, model=(model or 'gpt-image-1.5').strip(), quality=(quality or 'medium').strip().lower())
-
-    @staticmethod
-    def _post_process_line_art(png_bytes: bytes) -> bytes:
-        image = Image.open(BytesIO(png_bytes)).convert('L')
-        image = ImageOps.autocontrast(image)
-        image = image.filter(ImageFilter.MedianFilter(size=3))
-
-        # Normalize to white background + black outlines only.
-        image = image.point(lambda p: 255 if p > 170 else 0)
-        rgb = image.convert('RGB')
-        out = BytesIO()
-        rgb.save(out, format='PNG', optimize=True)
-        return out.getvalue()
-
-    @staticmethod
-    def _image_dimensions(png_bytes: bytes) -> tuple[int, int]:
-        image = Image.open(BytesIO(png_bytes))
-        return image.width, image.height
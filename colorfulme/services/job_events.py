@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+
+from flask import Flask
+
+from extensions import db
+from models import GenerationJob
+
+
+TERMINAL_STATUSES = frozenset({'completed', 'failed', 'blocked'})
+
+_lock = threading.Lock()
+_subscriptions: dict[str, set['Subscription']] = {}
+_poller: '_StatusPoller | None' = None
+_open_streams = 0
+
+
+class Subscription:
+    def __init__(self, job_id: str, status: str | None):
+        self.job_id = job_id
+        self.status = status
+        self.queue: queue.Queue[str] = queue.Queue()
+
+    def get(self, timeout: float) -> str | None:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def subscribe(job_id: str, status: str | None, app: Flask | None = None) -> Subscription:
+    subscription = Subscription(job_id, status)
+    with _lock:
+        _subscriptions.setdefault(job_id, set()).add(subscription)
+    if app is not None:
+        _ensure_poller(app)
+    return subscription
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    with _lock:
+        listeners = _subscriptions.get(subscription.job_id)
+        if listeners is None:
+            return
+        listeners.discard(subscription)
+        if not listeners:
+            del _subscriptions[subscription.job_id]
+
+
+def publish(job_id: str, status: str) -> None:
+    with _lock:
+        listeners = list(_subscriptions.get(job_id, ()))
+    for subscription in listeners:
+        # The same transition can arrive from the service and from the poller.
+        if subscription.status != status:
+            subscription.status = status
+            subscription.queue.put(status)
+
+
+def open_stream(limit: int) -> bool:
+    """Take one of ``limit`` event-stream slots in this process; False when all are in use (0 = no limit)."""
+    global _open_streams
+    with _lock:
+        if limit and _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream() -> None:
+    global _open_streams
+    with _lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def open_stream_count() -> int:
+    with _lock:
+        return _open_streams
+
+
+def watched_job_ids() -> list[str]:
+    with _lock:
+        return list(_subscriptions)
+
+
+class _StatusPoller(threading.Thread):
+    """Picks up transitions made by other processes (queue workers, other gunicorn workers).
+
+    One query per interval covers every job watched in this process, however many
+    clients are listening.
+    """
+
+    def __init__(self, app: Flask, interval: float):
+        super().__init__(name='colorfulme-job-events', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            job_ids = watched_job_ids()
+            if not job_ids:
+                continue
+            try:
+                with self.app.app_context():
+                    rows = (
+                        db.session.query(GenerationJob.id, GenerationJob.status)
+                        .filter(GenerationJob.id.in_(job_ids))
+                        .all()
+                    )
+                    db.session.remove()
+            except Exception:
+                logging.exception('Job event poll failed')
+                continue
+            for job_id, status in rows:
+                publish(job_id, status)
+
+
+def _ensure_poller(app: Flask) -> None:
+    global _poller
+    with _lock:
+        if _poller is not None and _poller.is_alive():
+            if _poller.app is app:
+                return
+            _poller.stop_event.set()
+        _poller = _StatusPoller(app, float(app.config.get('JOB_EVENTS_POLL_SECONDS', 1.0)))
+        _poller.start()
+
+
+def stop_poller() -> None:
+    global _poller
+    with _lock:
+        poller, _poller = _poller, None
+    if poller is not None:
+        poller.stop_event.set()
+        poller.join()
+
+
+def _reset_after_fork() -> None:
+    global _lock, _poller, _open_streams
+    _lock = threading.Lock()
+    _subscriptions.clear()
+    _poller = None
+    _open_streams = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+import os
+import socket
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy import func
+
+from extensions import db
+from models import CreditLedger, GenerationBatch, GenerationJob
+from colorfulme.services import job_events
+from colorfulme.services.blob_store import BlobStore
+from colorfulme.services.credits_service import credit_credits
+from colorfulme.services.generation_service import BatchResult, GenerationResult, GenerationService
+from colorfulme.services.png_recompress import recompress_pending
+from colorfulme.utils.security import utcnow
+
+
+CLAIM_BATCH_SIZE = 5
+# How often a worker looks for claims left behind by dead workers.
+RECLAIM_INTERVAL_SECONDS = 60.0
+LOST_WORKER_MESSAGE = 'The worker processing this job stopped before it finished'
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claim(model, item_id: str, worker_id: str):
+    # Conditional UPDATE so two workers can never claim the same row.
+    claimed = (
+        model.query.filter_by(id=item_id, status='queued')
+        .update(
+            {
+                'status': 'processing',
+                'claimed_at': utcnow(),
+                'worker_id': worker_id[:120],
+                'attempts': model.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    return db.session.get(model, item_id) if claimed else None
+
+
+def _claim_next(model, worker_id: str):
+    candidate_ids = [
+        row.id
+        for row in db.session.query(model.id)
+        .filter(model.status == 'queued', model.queued_at.isnot(None))
+        .order_by(model.queued_at.asc())
+        .limit(CLAIM_BATCH_SIZE)
+        .all()
+    ]
+
+    for item_id in candidate_ids:
+        claimed = _claim(model, item_id, worker_id)
+        if claimed is not None:
+            return claimed
+    return None
+
+
+def claim_job(job_id: str, worker_id: str) -> GenerationJob | None:
+    """Claim one queued job, e.g. the web process picking up its own async request."""
+    return _claim(GenerationJob, job_id, worker_id)
+
+
+def claim_next_job(worker_id: str) -> GenerationJob | None:
+    return _claim_next(GenerationJob, worker_id)
+
+
+def claim_next_batch(worker_id: str) -> GenerationBatch | None:
+    return _claim_next(GenerationBatch, worker_id)
+
+
+def process_next_job(worker_id: str | None = None) -> GenerationResult | None:
+    job = claim_next_job(worker_id or default_worker_id())
+    if job is None:
+        return None
+
+    logging.info('Worker %s processing job=%s', job.worker_id, job.id)
+    return GenerationService().process_job(job)
+
+
+def process_next_batch(worker_id: str | None = None) -> BatchResult | None:
+    batch = claim_next_batch(worker_id or default_worker_id())
+    if batch is None:
+        return None
+
+    logging.info('Worker %s processing batch=%s (%s items)', batch.worker_id, batch.id, batch.item_count)
+    return GenerationService().process_batch(batch)
+
+
+def _net_charge(reference_id: str) -> int:
+    # Debits are negative ledger entries; refunds for the same reference cancel them out.
+    return -int(
+        db.session.query(func.coalesce(func.sum(CreditLedger.amount), 0))
+        .filter(CreditLedger.reference_id == reference_id)
+        .scalar()
+    )
+
+
+def reclaim_stale_claims(timeout_seconds: float, max_attempts: int = 2) -> int:
+    """Recover jobs and batches whose worker died mid-render; returns how many were reclaimed.
+
+    A job gets back whatever it was charged and is queued again, or failed once it has been claimed
+    ``max_attempts`` times. A batch cannot resume half-way, so its unfinished items are failed and
+    refunded and the batch is closed. The conditional UPDATEs make concurrent reclaimers safe.
+    """
+    cutoff = utcnow() - timedelta(seconds=timeout_seconds)
+    reclaimed = 0
+
+    stale_jobs = (
+        GenerationJob.query.filter(GenerationJob.status == 'processing', GenerationJob.claimed_at < cutoff)
+        .order_by(GenerationJob.claimed_at)
+        .limit(CLAIM_BATCH_SIZE)
+        .all()
+    )
+    for job in stale_jobs:
+        lost_worker = job.worker_id
+        retry = (job.attempts or 0) < max_attempts
+        changes = {'claimed_at': None, 'worker_id': None, 'status': 'queued'}
+        if not retry:
+            changes = {'status': 'failed', 'error_message': LOST_WORKER_MESSAGE, 'completed_at': utcnow()}
+        taken = GenerationJob.query.filter_by(id=job.id, status='processing', claimed_at=job.claimed_at).update(
+            changes,
+            synchronize_session=False,
+        )
+        if not taken:
+            db.session.rollback()
+            continue
+        charged = _net_charge(job.id)
+        if charged > 0:
+            # Commits the status change and the refund together.
+            credit_credits(job.user, charged, reason='generation_refund', reference_id=job.id)
+        else:
+            db.session.commit()
+        db.session.refresh(job)
+        job_events.publish(job.id, job.status)
+        logging.warning('Reclaimed job=%s from worker %s (%s)', job.id, lost_worker, job.status)
+        reclaimed += 1
+
+    stale_batches = (
+        GenerationBatch.query.filter(GenerationBatch.status == 'processing', GenerationBatch.claimed_at < cutoff)
+        .order_by(GenerationBatch.claimed_at)
+        .limit(CLAIM_BATCH_SIZE)
+        .all()
+    )
+    for batch in stale_batches:
+        jobs = list(batch.jobs)
+        completed = sum(1 for job in jobs if job.status == 'completed')
+        taken = GenerationBatch.query.filter_by(id=batch.id, status='processing', claimed_at=batch.claimed_at).update(
+            {
+                'status': 'partial' if completed else 'failed',
+                'error_message': LOST_WORKER_MESSAGE,
+                'completed_at': utcnow(),
+            },
+            synchronize_session=False,
+        )
+        if not taken:
+            db.session.rollback()
+            continue
+        unfinished = [job for job in jobs if job.status in {'queued', 'processing'}]
+        for job in unfinished:
+            job.status = 'failed'
+            job.error_message = LOST_WORKER_MESSAGE
+            job.completed_at = utcnow()
+        # Only what was actually debited for the batch, and only for items that never finished.
+        refund = min(_net_charge(batch.id), sum(job.cost_credits for job in unfinished))
+        if refund > 0:
+            GenerationBatch.query.filter_by(id=batch.id).update(
+                {'refunded_credits': GenerationBatch.refunded_credits + refund},
+                synchronize_session=False,
+            )
+            credit_credits(
+                batch.user,
+                refund,
+                reason='generation_batch_refund',
+                reference_type='generation_batch',
+                reference_id=batch.id,
+            )
+        else:
+            db.session.commit()
+        for job in unfinished:
+            job_events.publish(job.id, job.status)
+        logging.warning('Reclaimed batch=%s from worker %s', batch.id, batch.worker_id)
+        reclaimed += 1
+
+    return reclaimed
+
+
+def run_worker(
+    app: Flask,
+    *,
+    worker_id: str | None = None,
+    concurrency: int | None = None,
+    poll_interval: float | None = None,
+    stop_event: threading.Event | None = None,
+) -> None:
+    worker_id = worker_id or default_worker_id()
+    concurrency = max(1, int(concurrency or app.config.get('GENERATION_WORKER_CONCURRENCY', 2)))
+    poll_interval = float(poll_interval or app.config.get('GENERATION_WORKER_POLL_SECONDS', 1.0))
+    stop_event = stop_event or threading.Event()
+    recompress_batch = int(app.config.get('PNG_RECOMPRESS_BATCH_SIZE', 10)) if app.config.get('PNG_RECOMPRESS_IDLE') else 0
+    sweep_batch = int(app.config.get('BLOB_SWEEP_BATCH_SIZE', 100)) if app.config.get('BLOB_SWEEP_IDLE') else 0
+    claim_timeout = float(app.config.get('GENERATION_CLAIM_TIMEOUT_SECONDS', 900))
+    max_attempts = int(app.config.get('GENERATION_MAX_ATTEMPTS', 2))
+    next_reclaim = [0.0]
+
+    def _loop(slot: int) -> None:
+        slot_id = f'{worker_id}/{slot}'
+        while not stop_event.is_set():
+            with app.app_context():
+                try:
+                    if slot == 0 and claim_timeout > 0 and time.monotonic() >= next_reclaim[0]:
+                        next_reclaim[0] = time.monotonic() + RECLAIM_INTERVAL_SECONDS
+                        reclaim_stale_claims(claim_timeout, max_attempts)
+                    result = process_next_job(slot_id) or process_next_batch(slot_id)
+                    if result is None and slot == 0 and recompress_batch:
+                        # Idle time goes to shrinking fast-profile PNGs; queued renders always come first.
+                        result = recompress_pending(recompress_batch).objects or None
+                    if result is None and slot == 0 and sweep_batch:
+                        result = BlobStore().sweep(sweep_batch).blobs or None
+                except Exception:
+                    logging.exception('Worker %s crashed while processing a job', slot_id)
+                    db.session.rollback()
+                    result = None
+                finally:
+                    db.session.remove()
+
+            if result is None:
+                stop_event.wait(poll_interval)
+
+    threads = [
+        threading.Thread(target=_loop, args=(slot,), name=f'generation-worker-{slot}', daemon=True)
+        for slot in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    logging.info('Generation worker %s started with %s slot(s)', worker_id, concurrency)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            stop_event.wait(poll_interval)
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
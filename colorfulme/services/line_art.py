@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from PIL import Image, ImageFilter, ImageOps
+
+try:
+    import numpy as np
+except ImportError:  # Declared in the requirements; the PIL pipeline covers installs without it.
+    np = None
+
+
+PIPELINES = ('auto', 'pil', 'numpy')
+THRESHOLD = 170
+
+
+def resolve_pipeline(name: str | None) -> str:
+    name = (name or 'auto').strip().lower()
+    if name not in PIPELINES:
+        raise ValueError(f'Unknown line-art pipeline: {name}')
+    if name == 'auto':
+        return 'numpy' if np is not None else 'pil'
+    if name == 'numpy' and np is None:
+        raise RuntimeError('LINE_ART_PIPELINE=numpy requires numpy to be installed')
+    return name
+
+
+def clean_line_art(gray: Image.Image, pipeline: str | None = 'auto') -> Image.Image:
+    """Autocontrast, 3x3 median and threshold a mode-L render into black-on-white outlines."""
+    if resolve_pipeline(pipeline) == 'pil':
+        image = ImageOps.autocontrast(gray)
+        image = image.filter(ImageFilter.MedianFilter(size=3))
+        return image.point(lambda p: 255 if p > THRESHOLD else 0)
+
+    pixels = np.array(gray, dtype=np.uint8)
+    # Autocontrast and threshold are both monotone, so they commute with the
+    # median: fold them into one lookup applied in place before filtering.
+    lut = _threshold_lut(_autocontrast_lut(np.bincount(pixels.ravel(), minlength=256)))
+    np.take(lut, pixels, out=pixels)
+    return Image.fromarray(_median3(pixels), mode='L')
+
+
+def photo_edges(gray: Image.Image, pipeline: str | None = 'auto') -> Image.Image:
+    """Median, edge-detect, autocontrast, invert and threshold a mode-L photo."""
+    if resolve_pipeline(pipeline) == 'pil':
+        image = gray.filter(ImageFilter.MedianFilter(size=3))
+        edges = ImageOps.autocontrast(image.filter(ImageFilter.FIND_EDGES))
+        return ImageOps.invert(edges).point(lambda p: 255 if p > THRESHOLD else 0)
+
+    edges = _find_edges(_median3(np.array(gray, dtype=np.uint8)))
+    lut = _autocontrast_lut(np.bincount(edges.ravel(), minlength=256))
+    lut = _threshold_lut(255 - lut)
+    np.take(lut, edges, out=edges)
+    return Image.fromarray(edges, mode='L')
+
+
+def _autocontrast_lut(histogram) -> 'np.ndarray':
+    # Mirrors ImageOps.autocontrast(cutoff=0) so both pipelines agree bit for bit.
+    present = np.flatnonzero(histogram)
+    lo, hi = (int(present[0]), int(present[-1])) if present.size else (0, 0)
+    if hi <= lo:
+        return np.arange(256, dtype=np.uint8)
+    scale = 255.0 / (hi - lo)
+    offset = -lo * scale
+    return np.array([min(max(int(ix * scale + offset), 0), 255) for ix in range(256)], dtype=np.uint8)
+
+
+def _threshold_lut(lut) -> 'np.ndarray':
+    return np.where(lut > THRESHOLD, 255, 0).astype(np.uint8)
+
+
+def _median3(pixels) -> 'np.ndarray':
+    # 3x3 median with edge replication (what PIL's RankFilter does). Sorting each
+    # vertical triple once gives low/mid/high planes; a window's median is then
+    # med3(max of the lows, med3 of the mids, min of the highs) over three adjacent
+    # columns, read as shifted views of those planes instead of nine copies.
+    height, width = pixels.shape
+    rows = np.pad(pixels, ((1, 1), (0, 0)), mode='edge')
+    up, centre, down = rows[:-2], rows[1:-1], rows[2:]
+
+    # Two spare columns per plane hold the replicated left and right edges.
+    low, mid, high = (np.empty((height, width + 2), dtype=np.uint8) for _ in range(3))
+    scratch = np.empty_like(pixels)
+    inner = slice(1, width + 1)
+    np.minimum(up, centre, out=low[:, inner])
+    np.maximum(up, centre, out=high[:, inner])
+    np.minimum(high[:, inner], down, out=mid[:, inner])
+    np.maximum(high[:, inner], down, out=high[:, inner])
+    np.maximum(low[:, inner], mid[:, inner], out=scratch)
+    np.minimum(low[:, inner], mid[:, inner], out=low[:, inner])
+    mid[:, inner] = scratch
+    del rows, up, centre, down
+    for plane in (low, mid, high):
+        plane[:, 0] = plane[:, 1]
+        plane[:, -1] = plane[:, -2]
+
+    left, right = slice(0, width), slice(2, width + 2)
+    lows = np.maximum(low[:, left], low[:, inner])
+    np.maximum(lows, low[:, right], out=lows)
+    del low
+    highs = np.minimum(high[:, left], high[:, inner])
+    np.minimum(highs, high[:, right], out=highs)
+    del high
+    mids = _med3(mid[:, left], mid[:, inner], mid[:, right], scratch)
+    return _med3(lows, mids, highs, lows)
+
+
+def _med3(a, b, c, out) -> 'np.ndarray':
+    # max(min(a, b), min(max(a, b), c)); ``out`` may alias ``a``.
+    upper = np.maximum(a, b)
+    np.minimum(upper, c, out=upper)
+    np.minimum(a, b, out=out)
+    return np.maximum(out, upper, out=out)
+
+
+def _find_edges(pixels) -> 'np.ndarray':
+    # ImageFilter.FIND_EDGES: 8 * centre minus the 8 neighbours, clipped to 0..255.
+    # PIL leaves the outermost ring of pixels untouched.
+    height, width = pixels.shape
+    source = pixels.astype(np.int16)
+    acc = source[1:-1, 1:-1] * 9
+    for dy in range(3):
+        for dx in range(3):
+            acc -= source[dy:dy + height - 2, dx:dx + width - 2]
+    np.clip(acc, 0, 255, out=acc)
+    pixels[1:-1, 1:-1] = acc
+    return pixels
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from collections import deque
+from contextlib import contextmanager
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from colorfulme.utils import metrics
+
+
+DEFAULT_WINDOW_SIZE = 200
+
+_lock = threading.Lock()
+_latency_windows: dict[str, 'LatencyWindow'] = {}
+
+
+class LatencyWindow:
+    def __init__(self, size: int = DEFAULT_WINDOW_SIZE):
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(float(seconds))
+
+    def percentile(self, pct: float, *, min_samples: int = 1) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        # Nearest-rank percentile.
+        rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+def _window(model: str) -> LatencyWindow:
+    with _lock:
+        window = _latency_windows.get(model)
+        if window is None:
+            window = LatencyWindow()
+            _latency_windows[model] = window
+        return window
+
+
+def record_latency(model: str, seconds: float) -> None:
+    _window(model).record(seconds)
+
+
+def latency_percentile(model: str, pct: float, *, min_samples: int = 1) -> float | None:
+    return _window(model).percentile(pct, min_samples=min_samples)
+
+
+def reset_latencies() -> None:
+    with _lock:
+        _latency_windows.clear()
+
+
+class CircuitBreaker:
+    """Per-model circuit breaker whose state lives in a local SQLite file.
+
+    Every gunicorn worker on the host opens the same file, so a model tripped by
+    one worker is skipped by all of them. Each thread keeps its connection open
+    between calls instead of reconnecting for every allow/record.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        window_seconds: float = 60.0,
+        min_requests: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 0.0,
+        open_seconds: float = 30.0,
+        clock=time.time,
+    ):
+        self.path = path
+        self.window_seconds = float(window_seconds)
+        self.min_requests = max(1, int(min_requests))
+        self.failure_rate_threshold = float(failure_rate_threshold)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.open_seconds = float(open_seconds)
+        self._clock = clock
+        self._schema_ready = False
+        self._local = threading.local()
+
+    def allow(self, model: str) -> bool:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT state, opened_at, probe_at FROM model_circuits WHERE model = ?', (model,)
+                ).fetchone()
+                if row is None or row[0] == 'closed':
+                    return True
+
+                now = self._clock()
+                state, opened_at, probe_at = row
+                if state == 'open' and now - opened_at < self.open_seconds:
+                    return False
+                if state == 'half_open' and probe_at is not None and now - probe_at < self.open_seconds:
+                    # Another request is already probing this model.
+                    return False
+
+                # Cool-down elapsed: let exactly one request through as a probe.
+                claimed = conn.execute(
+                    "UPDATE model_circuits SET state = 'half_open', probe_at = ? "
+                    'WHERE model = ? AND state = ? AND opened_at = ?',
+                    (now, model, state, opened_at),
+                ).rowcount
+                return bool(claimed)
+        except sqlite3.Error as exc:
+            logging.warning('Circuit breaker store unavailable, allowing model=%s: %s', model, exc)
+            return True
+
+    def record(self, model: str, *, ok: bool, latency_seconds: float | None = None) -> None:
+        now = self._clock()
+        slow = bool(self.slow_call_seconds and latency_seconds is not None and latency_seconds > self.slow_call_seconds)
+        failed = (not ok) or slow
+        try:
+            with self._connect() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    'INSERT INTO model_calls (model, ts, failed, latency) VALUES (?, ?, ?, ?)',
+                    (model, now, int(failed), latency_seconds),
+                )
+                conn.execute('DELETE FROM model_calls WHERE ts < ?', (now - self.window_seconds,))
+
+                row = conn.execute('SELECT state FROM model_circuits WHERE model = ?', (model,)).fetchone()
+                state = row[0] if row else 'closed'
+                if state == 'half_open':
+                    if failed:
+                        self._open(conn, model, now, 'probe failed')
+                    else:
+                        self._close(conn, model)
+                elif state == 'closed':
+                    total, failures = conn.execute(
+                        'SELECT COUNT(*), COALESCE(SUM(failed), 0) FROM model_calls WHERE model = ?', (model,)
+                    ).fetchone()
+                    if total >= self.min_requests and failures / total >= self.failure_rate_threshold:
+                        self._open(conn, model, now, f'{failures}/{total} failed or slow calls')
+                conn.execute('COMMIT')
+        except sqlite3.Error as exc:
+            logging.warning('Could not record model health for model=%s: %s', model, exc)
+
+    def status(self) -> list[dict]:
+        now = self._clock()
+        with self._connect() as conn:
+            circuits = {
+                row[0]: {'state': row[1], 'opened_at': row[2], 'reason': row[3]}
+                for row in conn.execute('SELECT model, state, opened_at, reason FROM model_circuits')
+            }
+            calls = {
+                row[0]: {'calls': row[1], 'failures': row[2], 'avg_latency_seconds': row[3], 'max_latency_seconds': row[4]}
+                for row in conn.execute(
+                    'SELECT model, COUNT(*), COALESCE(SUM(failed), 0), AVG(latency), MAX(latency) '
+                    'FROM model_calls WHERE ts >= ? GROUP BY model',
+                    (now - self.window_seconds,),
+                )
+            }
+
+        report = []
+        for model in sorted(set(circuits) | set(calls)):
+            circuit = circuits.get(model, {'state': 'closed', 'opened_at': None, 'reason': None})
+            window = calls.get(model, {'calls': 0, 'failures': 0, 'avg_latency_seconds': None, 'max_latency_seconds': None})
+            report.append({'model': model, **circuit, **window})
+        return report
+
+    def reset(self) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM model_calls')
+            conn.execute('DELETE FROM model_circuits')
+
+    def _open(self, conn: sqlite3.Connection, model: str, now: float, reason: str) -> None:
+        logging.warning('Opening circuit for model=%s: %s', model, reason)
+        metrics.increment(f'model_health.circuit_opened.{model}')
+        conn.execute(
+            "INSERT INTO model_circuits (model, state, opened_at, probe_at, reason) VALUES (?, 'open', ?, NULL, ?) "
+            "ON CONFLICT(model) DO UPDATE SET state = 'open', opened_at = excluded.opened_at, probe_at = NULL, "
+            'reason = excluded.reason',
+            (model, now, reason),
+        )
+
+    def _close(self, conn: sqlite3.Connection, model: str) -> None:
+        logging.info('Closing circuit for model=%s', model)
+        conn.execute('DELETE FROM model_circuits WHERE model = ?', (model,))
+        # Start the closed state from a clean window so old failures cannot re-trip it.
+        conn.execute('DELETE FROM model_calls WHERE model = ?', (model,))
+
+    @contextmanager
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # sqlite3 connections belong to one thread and must not cross a fork.
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        try:
+            if not self._schema_ready:
+                self._create_schema(conn)
+            yield conn
+        except BaseException:
+            # Never reuse a connection that may be mid-transaction; the next call opens a fresh one.
+            self._local.conn = None
+            conn.close()
+            raise
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS model_calls ('
+            'model TEXT NOT NULL, ts REAL NOT NULL, failed INTEGER NOT NULL, latency REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_model_calls_model_ts ON model_calls (model, ts)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS model_circuits ('
+            'model TEXT PRIMARY KEY, state TEXT NOT NULL, opened_at REAL NOT NULL, probe_at REAL, reason TEXT)'
+        )
+        self._schema_ready = True
+
+
+_breakers: dict[tuple, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(config) -> CircuitBreaker | None:
+    if not config.get('MODEL_CIRCUIT_ENABLED', True):
+        return None
+
+    path = config.get('MODEL_HEALTH_DB_PATH')
+    if not path:
+        return None
+    settings = dict(
+        window_seconds=float(config.get('MODEL_CIRCUIT_WINDOW_SECONDS', 60)),
+        min_requests=int(config.get('MODEL_CIRCUIT_MIN_REQUESTS', 5)),
+        failure_rate_threshold=float(config.get('MODEL_CIRCUIT_FAILURE_RATE', 0.5)),
+        slow_call_seconds=float(config.get('MODEL_CIRCUIT_SLOW_CALL_SECONDS', 0)),
+        open_seconds=float(config.get('MODEL_CIRCUIT_OPEN_SECONDS', 30)),
+    )
+    key = (path, *sorted(settings.items()))
+    with _lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(path, **settings)
+            _breakers[key] = breaker
+        return breaker
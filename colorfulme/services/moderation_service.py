@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import hashlib
 import logging
+import re
+import threading
 from typing import Tuple
 
 from flask import current_app
 
+from colorfulme.services.openai_pool import OpenAIPoolSettings, get_openai_client
+from colorfulme.utils.ttl_cache import TTLCache
+
 
 BLOCKED_TERMS = {
     'nude',
@@ -23,42 +29,115 @@ BLOCKED_TERMS = {
     'nsfw',
 }
 
+_matcher_lock = threading.Lock()
+_matchers: dict[str, re.Pattern] = {}
+_verdict_cache: TTLCache | None = None
+
+
+def blocked_terms_pattern(extra_terms: str = '') -> re.Pattern:
+    # Compiled once per distinct term list; longest terms first so the reported match is the most specific.
+    pattern = _matchers.get(extra_terms)
+    if pattern is not None:
+        return pattern
+
+    with _matcher_lock:
+        pattern = _matchers.get(extra_terms)
+        if pattern is None:
+            terms = set(BLOCKED_TERMS)
+            terms.update(term.strip().lower() for term in extra_terms.split(',') if term.strip())
+            ordered = sorted(terms, key=lambda term: (-len(term), term))
+            pattern = re.compile('|'.join(re.escape(term) for term in ordered))
+            _matchers[extra_terms] = pattern
+        return pattern
+
+
+def reload_blocked_terms() -> None:
+    with _matcher_lock:
+        _matchers.clear()
+
+
+def _get_verdict_cache() -> TTLCache:
+    global _verdict_cache
+    if _verdict_cache is None:
+        with _matcher_lock:
+            if _verdict_cache is None:
+                _verdict_cache = TTLCache(
+                    int(current_app.config.get('MODERATION_CACHE_MAX_ENTRIES', 10000)),
+                    float(current_app.config.get('MODERATION_CACHE_TTL_SECONDS', 3600)),
+                    name='moderation.verdict_cache',
+                )
+    return _verdict_cache
+
+
+def clear_verdict_cache() -> None:
+    if _verdict_cache is not None:
+        _verdict_cache.clear()
+
+
+def _prompt_hash(text: str) -> str:
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
 
 class ModerationService:
     def __init__(self):
         self.strict_mode = bool(current_app.config.get('STRICT_MODERATION', True))
         self.api_key = (current_app.config.get('OPENAI_API_KEY') or current_app.config.get('OPENAI_API_KEY'.lower()) or '').strip()
+        self.pool_settings = OpenAIPoolSettings.from_config(current_app.config)
+        self.blocked_terms = blocked_terms_pattern(current_app.config.get('MODERATION_EXTRA_BLOCKED_TERMS') or '')
+        self.verdict_cache = _get_verdict_cache()
+
+    @property
+    def uses_upstream(self) -> bool:
+        return bool(self.api_key)
 
     def check_prompt(self, prompt: str) -> Tuple[bool, str | None]:
+        allowed, reason = self.check_local(prompt)
+        if not allowed:
+            return allowed, reason
+        return self.check_upstream(prompt)
+
+    def check_local(self, prompt: str) -> Tuple[bool, str | None]:
         text = (prompt or '').lower().strip()
         if not text:
             return False, 'Prompt is required.'
 
         # Local deterministic safety gate for strict family-safe mode.
         if self.strict_mode:
-            for term in BLOCKED_TERMS:
-                if term in text:
-                    return False, f"Prompt blocked by safety policy ({term})."
+            match = self.blocked_terms.search(text)
+            if match:
+                return False, f"Prompt blocked by safety policy ({match.group(0)})."
 
-        # Optional upstream moderation; local strict checks already enforce baseline.
-        try:
-            self._openai_moderation_check(text)
-        except Exception as exc:
-            logging.warning('OpenAI moderation check skipped/failed: %s', exc)
+        return True, None
+
+    def check_upstream(self, prompt: str) -> Tuple[bool, str | None]:
+        text = (prompt or '').lower().strip()
+        if not self.uses_upstream:
+            return True, None
+
+        cache_key = _prompt_hash(text)
+        flagged = self.verdict_cache.get(cache_key)
+        if flagged is None:
+            # Optional upstream moderation; local strict checks already enforce baseline.
+            try:
+                flagged = self._openai_moderation_check(text)
+            except Exception as exc:
+                logging.warning('OpenAI moderation check skipped/failed: %s', exc)
+                return True, None
+            self.verdict_cache.set(cache_key, flagged)
 
+        if flagged:
+            return False, 'Prompt blocked by upstream moderation.'
         return True, None
 
-    def _openai_moderation_check(self, text: str) -> None:
+    def _openai_moderation_check(self, text: str) -> bool:
         if not self.api_key:
-            return
+            return False
 
         try:
-            from openai import OpenAI
-        except Exception:
-            return
+            client = get_openai_client(self.api_key, self.pool_settings)
+        except ImportError:
+            return False
 
-        client = OpenAI(api_key=self.api_key)
         response = client.moderations.create(model='omni-moderation-latest', input=text)
         results = getattr(response, 'results', []) or []
-        if results and getattr(results[0], 'flagged', False):
-            raise ValueError('Prompt blocked by upstream moderation.')
+        return bool(results and getattr(results[0], 'flagged', False))
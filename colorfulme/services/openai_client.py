@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import base64
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from dataclasses import dataclass
 from io import BytesIO
 import logging
+import threading
+import time
 from urllib.request import urlopen
 
 from flask import current_app
-from PIL import Image, ImageDraw, ImageFilter, ImageOps
+from PIL import Image
+
+from colorfulme.services import line_art, model_health
+from colorfulme.services.openai_pool import OpenAIPoolSettings, get_openai_client
+from colorfulme.services.render_tasks import LocalRender
+from colorfulme.utils import metrics
+from colorfulme.utils.executors import get_executor
 
 
 _IMAGE_PRICE_USD = {
@@ -28,15 +37,48 @@ _IMAGE_PRICE_USD = {
     },
 }
 
+# Primary and fallback legs run on separate pools, so a fallback never queues behind primaries.
+HEDGE_PRIMARY_POOL = 'openai-hedge'
+HEDGE_FALLBACK_POOL = 'openai-hedge-fallback'
+
+# Legs submitted and not yet finished, abandoned losers included (an SDK call cannot be cancelled).
+_legs_lock = threading.Lock()
+_outstanding_legs = {HEDGE_PRIMARY_POOL: 0, HEDGE_FALLBACK_POOL: 0}
+
+
+def _leg_started(pool: str) -> None:
+    with _legs_lock:
+        _outstanding_legs[pool] += 1
+
+
+def _leg_finished(pool: str) -> None:
+    with _legs_lock:
+        _outstanding_legs[pool] -= 1
+
+
+def _has_capacity(pool: str, limit: int) -> bool:
+    with _legs_lock:
+        return _outstanding_legs[pool] < limit
+
 
 @dataclass(frozen=True)
 class GeneratedImage:
-    png_bytes: bytes
+    # Upstream renders arrive as PNG bytes; local renders arrive as a spec drawn on decode.
+    png_bytes: bytes | None
     model: str
     quality: str
     size: str
     estimated_cost_usd: float | None
     used_fallback: bool = False
+    hedged: bool = False
+    local: LocalRender | None = None
+
+    def decode(self) -> Image.Image:
+        if self.local is not None:
+            return self.local.draw()
+        image = Image.open(BytesIO(self.png_bytes))
+        image.load()
+        return image
 
 
 class OpenAIClient:
@@ -46,6 +88,14 @@ class OpenAIClient:
         self.fallback_model = current_app.config.get('OPENAI_MODEL_FALLBACK', 'gpt-image-1-mini')
         self.default_quality = current_app.config.get('OPENAI_IMAGE_QUALITY_DEFAULT', 'medium')
         self.allow_fake = bool(current_app.config.get('ALLOW_FAKE_AI', True))
+        self.pool_settings = OpenAIPoolSettings.from_config(current_app.config)
+        self.hedge_enabled = bool(current_app.config.get('OPENAI_HEDGE_ENABLED', False))
+        self.hedge_percentile = float(current_app.config.get('OPENAI_HEDGE_PERCENTILE', 95))
+        self.hedge_min_samples = int(current_app.config.get('OPENAI_HEDGE_MIN_SAMPLES', 20))
+        self.hedge_default_delay = float(current_app.config.get('OPENAI_HEDGE_DELAY_SECONDS', 20.0))
+        self.hedge_pool_size = int(current_app.config.get('OPENAI_HEDGE_POOL_SIZE', 16))
+        self.breaker = model_health.get_circuit_breaker(current_app.config)
+        self.line_art_pipeline = line_art.resolve_pipeline(current_app.config.get('LINE_ART_PIPELINE'))
 
     def generate_image(
         self,
@@ -65,9 +115,40 @@ class OpenAIClient:
         if self.api_key:
             candidates = self._candidate_models(model)
             last_error: Exception | None = None
+            attempted = False
+            hedge = self.hedge_enabled and len(candidates) > 1
+            if hedge and not _has_capacity(HEDGE_PRIMARY_POOL, self.hedge_pool_size):
+                # Every hedge thread is busy (or held by an abandoned leg): render without hedging.
+                metrics.increment('openai.hedge.saturated')
+                hedge = False
+            if hedge:
+                primary, secondary = candidates[:2]
+                candidates = candidates[2:]
+                if self._allowed(primary):
+                    attempted = True
+                    try:
+                        return self._generate_hedged(
+                            primary,
+                            secondary,
+                            prompt=prompt,
+                            mode=mode,
+                            style=style,
+                            quality=quality,
+                            size=size,
+                        )
+                    except Exception as exc:
+                        last_error = exc
+                        logging.warning('Hedged OpenAI generation failed for models=%s: %s', [primary, secondary], exc)
+                else:
+                    candidates.insert(0, secondary)
+
             for candidate in candidates:
+                # Asked right before each attempt: allow() on a cooled-down circuit claims its one probe.
+                if not self._allowed(candidate):
+                    continue
+                attempted = True
                 try:
-                    image_bytes = self._generate_openai_image(
+                    image_bytes = self._timed_generate(
                         prompt=prompt,
                         mode=mode,
                         style=style,
@@ -87,18 +168,23 @@ class OpenAIClient:
                     logging.warning('OpenAI generation failed for model=%s: %s', candidate, exc)
             if not self.allow_fake and last_error is not None:
                 raise last_error
+            if not self.allow_fake and not attempted:
+                raise RuntimeError('All image model circuits are open and ALLOW_FAKE_AI is disabled')
 
         if not self.allow_fake:
             raise RuntimeError('OpenAI API key is missing and ALLOW_FAKE_AI is disabled')
-        image_bytes = self._generate_fallback_image(
+        # Not drawn here: the pixel work runs with the rest of the render (see GenerationService._render).
+        local = LocalRender(
             prompt=prompt,
             mode=mode,
             style=style,
             aspect_ratio=aspect_ratio,
             source_image=source_image,
+            pipeline=self.line_art_pipeline,
         )
         return GeneratedImage(
-            png_bytes=image_bytes,
+            png_bytes=None,
+            local=local,
             model='fallback-deterministic',
             quality='n/a',
             size=size,
@@ -106,6 +192,108 @@ class OpenAIClient:
             used_fallback=True,
         )
 
+    def _generate_hedged(
+        self,
+        primary: str,
+        secondary: str,
+        *,
+        prompt: str,
+        mode: str,
+        style: str | None,
+        quality: str,
+        size: str,
+    ) -> GeneratedImage:
+        request = dict(prompt=prompt, mode=mode, style=style, quality=quality, size=size)
+
+        def _launch(candidate: str, pool: str) -> Future:
+            _leg_started(pool)
+            future = get_executor(pool, self.hedge_pool_size).submit(self._timed_generate, model=candidate, **request)
+            future.add_done_callback(lambda _future: _leg_finished(pool))
+            return future
+
+        futures = {_launch(primary, HEDGE_PRIMARY_POOL): primary}
+        done, _ = wait(futures, timeout=self._hedge_delay(primary))
+        # The secondary's circuit is consulted at most once, and only when it is about to be used.
+        secondary_checked = not done
+        hedged = False
+        if not done:
+            if not _has_capacity(HEDGE_FALLBACK_POOL, self.hedge_pool_size):
+                # Too many fallback legs still running: keep waiting on the primary rather than pile on.
+                metrics.increment('openai.hedge.saturated')
+                secondary_checked = False
+            else:
+                hedged = self._allowed(secondary)
+        if hedged:
+            # Primary is slower than its usual tail latency: race the fallback against it.
+            futures[_launch(secondary, HEDGE_FALLBACK_POOL)] = secondary
+            metrics.increment('openai.hedge.fired')
+
+        pending = set(futures)
+        last_error: Exception | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate = futures[future]
+                try:
+                    image_bytes = future.result()
+                except Exception as exc:
+                    last_error = exc
+                    logging.warning('OpenAI generation failed for model=%s: %s', candidate, exc)
+                    if not secondary_checked:
+                        # Primary failed before the hedge fired: plain fallback.
+                        secondary_checked = True
+                        if not self._allowed(secondary):
+                            continue
+                        # A plain fallback is not speculative, so it is launched even when the pool is busy.
+                        fallback = _launch(secondary, HEDGE_FALLBACK_POOL)
+                        futures[fallback] = secondary
+                        pending.add(fallback)
+                    continue
+
+                # The SDK call cannot be interrupted mid-flight; a running loser is
+                # abandoned and its result dropped, and still counts toward cost.
+                billed = [candidate]
+                for other in pending:
+                    if not other.cancel():
+                        billed.append(futures[other])
+                if hedged:
+                    metrics.increment(f"openai.hedge.won.{'primary' if candidate == primary else 'fallback'}")
+
+                return GeneratedImage(
+                    png_bytes=image_bytes,
+                    model=candidate,
+                    quality=quality,
+                    size=size,
+                    estimated_cost_usd=self._combined_cost(billed, quality, size),
+                    hedged=hedged,
+                )
+
+        raise last_error or RuntimeError('Hedged generation produced no result')
+
+    def _hedge_delay(self, model: str) -> float:
+        observed = model_health.latency_percentile(model, self.hedge_percentile, min_samples=self.hedge_min_samples)
+        return self.hedge_default_delay if observed is None else observed
+
+    def _combined_cost(self, models: list[str], quality: str, size: str) -> float | None:
+        costs = [self.estimate_image_cost_usd(item, quality, size) for item in models]
+        known = [cost for cost in costs if cost is not None]
+        return round(sum(known), 6) if known else None
+
+    def _timed_generate(self, *, model: str, **kwargs) -> bytes:
+        started = time.monotonic()
+        try:
+            image_bytes = self._generate_openai_image(model=model, **kwargs)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(model, ok=False, latency_seconds=time.monotonic() - started)
+            raise
+
+        elapsed = time.monotonic() - started
+        model_health.record_latency(model, elapsed)
+        if self.breaker is not None:
+            self.breaker.record(model, ok=True, latency_seconds=elapsed)
+        return image_bytes
+
     def _generate_openai_image(
         self,
         *,
@@ -116,9 +304,7 @@ class OpenAIClient:
         quality: str,
         size: str,
     ) -> bytes:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=self.api_key)
+        client = get_openai_client(self.api_key, self.pool_settings)
         style_label = (style or 'clean line art').strip()
         system_prompt = (
             'Create a black-and-white printable coloring page. '
@@ -148,66 +334,6 @@ class OpenAIClient:
 
         raise RuntimeError('OpenAI image response did not contain image bytes')
 
-    def _generate_fallback_image(
-        self,
-        *,
-        prompt: str,
-        mode: str,
-        style: str | None,
-        aspect_ratio: str | None,
-        source_image: bytes | None,
-    ) -> bytes:
-        width, height = self._aspect_ratio_to_dims(aspect_ratio)
-
-        if mode in {'photo', 'recolor'} and source_image:
-            return self._photo_to_line_art(source_image, width, height)
-
-        image = Image.new('RGB', (width, height), 'white')
-        draw = ImageDraw.Draw(image)
-
-        headline = (prompt or 'Coloring Page').strip()[:56]
-        subline = (style or 'clean outlines').strip()[:40]
-
-        # Draw decorative line-art style objects.
-        margin = 48
-        draw.rectangle([margin, margin, width - margin, height - margin], outline='black', width=4)
-        draw.ellipse([margin + 40, margin + 120, width // 2, height // 2], outline='black', width=4)
-        draw.polygon(
-            [
-                (width // 2 + 40, height // 2 + 20),
-                (width - margin - 40, height // 2 + 120),
-                (width // 2 + 120, height - margin - 40),
-            ],
-            outline='black',
-            width=4,
-        )
-
-        # Keep text lightweight so output remains printable.
-        draw.text((margin + 24, margin + 24), 'COLORFULME', fill='black')
-        draw.text((margin + 24, height - margin - 44), headline, fill='black')
-        draw.text((margin + 24, height - margin - 24), subline, fill='black')
-
-        return self._to_png_bytes(image)
-
-    def _photo_to_line_art(self, source_bytes: bytes, width: int, height: int) -> bytes:
-        image = Image.open(BytesIO(source_bytes)).convert('RGB')
-        image = ImageOps.fit(image, (width, height), method=Image.Resampling.LANCZOS)
-        gray = ImageOps.grayscale(image)
-        gray = gray.filter(ImageFilter.MedianFilter(size=3))
-        edges = gray.filter(ImageFilter.FIND_EDGES)
-        edges = ImageOps.autocontrast(edges)
-
-        # Invert and threshold for clean coloring outlines.
-        inv = ImageOps.invert(edges)
-        line_art = inv.point(lambda p: 255 if p > 170 else 0)
-        line_art = line_art.convert('RGB')
-        return self._to_png_bytes(line_art)
-
-    def _to_png_bytes(self, image: Image.Image) -> bytes:
-        buffer = BytesIO()
-        image.save(buffer, format='PNG', optimize=True)
-        return buffer.getvalue()
-
     @staticmethod
     def _aspect_ratio_to_size(aspect_ratio: str | None) -> str:
         mapping = {
@@ -223,17 +349,6 @@ class OpenAIClient:
             return '1024x1024'
         return size
 
-    @staticmethod
-    def _aspect_ratio_to_dims(aspect_ratio: str | None) -> tuple[int, int]:
-        mapping = {
-            '1:1': (1200, 1200),
-            '4:5': (1200, 1500),
-            '3:4': (1200, 1600),
-            '16:9': (1600, 900),
-            '9:16': (900, 1600),
-        }
-        return mapping.get((aspect_ratio or '').strip(), (1200, 1200))
-
     @staticmethod
     def _normalize_quality(value: str) -> str:
         cleaned = (value or '').strip().lower()
@@ -252,6 +367,14 @@ class OpenAIClient:
                 models.append(item)
         return models or ['gpt-image-1.5']
 
+    def _allowed(self, model: str) -> bool:
+        # When every candidate is skipped the caller falls through to the deterministic renderer.
+        if self.breaker is None or self.breaker.allow(model):
+            return True
+        logging.info('Skipping model=%s: circuit open', model)
+        metrics.increment('model_health.skipped')
+        return False
+
     @staticmethod
     def estimate_image_cost_usd(model: str, quality: str, size: str) -> float | None:
         pricing_key = OpenAIClient._pricing_key(model)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+
+from colorfulme.utils import metrics
+from colorfulme.utils.client_registry import ClientRegistry
+
+
+_registry: ClientRegistry = ClientRegistry('openai')
+
+
+@dataclass(frozen=True)
+class OpenAIPoolSettings:
+    base_url: str | None = None
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_seconds: float = 60.0
+    timeout_seconds: float = 120.0
+    connect_timeout_seconds: float = 10.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_config(cls, config) -> 'OpenAIPoolSettings':
+        return cls(
+            base_url=(config.get('OPENAI_BASE_URL') or '').strip() or None,
+            max_connections=int(config.get('OPENAI_POOL_MAX_CONNECTIONS', 20)),
+            max_keepalive_connections=int(config.get('OPENAI_POOL_MAX_KEEPALIVE', 10)),
+            keepalive_expiry_seconds=float(config.get('OPENAI_POOL_KEEPALIVE_SECONDS', 60.0)),
+            timeout_seconds=float(config.get('OPENAI_TIMEOUT_SECONDS', 120.0)),
+            connect_timeout_seconds=float(config.get('OPENAI_CONNECT_TIMEOUT_SECONDS', 10.0)),
+            max_retries=int(config.get('OPENAI_MAX_RETRIES', 2)),
+        )
+
+
+def get_openai_client(api_key: str, settings: OpenAIPoolSettings | None = None):
+    settings = settings or OpenAIPoolSettings()
+    # Hash the key so it never shows up in debug dumps of the registry.
+    key = (hashlib.sha256(api_key.encode('utf-8')).hexdigest(), settings.base_url)
+    return _registry.get(key, lambda: _build_client(api_key, settings))
+
+
+def reset_openai_clients() -> None:
+    _registry.clear()
+
+
+def _build_client(api_key: str, settings: OpenAIPoolSettings):
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(settings.timeout_seconds, connect=settings.connect_timeout_seconds),
+        event_hooks={'request': [_attach_connection_trace]},
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=settings.base_url,
+        http_client=http_client,
+        max_retries=settings.max_retries,
+    )
+
+
+def _attach_connection_trace(request) -> None:
+    metrics.increment('openai.http.requests')
+    request.extensions['trace'] = _trace_connection_events
+
+
+def _trace_connection_events(event_name: str, _info: dict) -> None:
+    # Requests that never open a TCP connection went out on a pooled keep-alive socket.
+    if event_name == 'connection.connect_tcp.complete':
+        metrics.increment('openai.http.connections_opened')
+    elif event_name == 'connection.start_tls.complete':
+        metrics.increment('openai.http.tls_handshakes')
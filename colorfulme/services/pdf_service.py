@@ -6,7 +6,13 @@ from PIL import Image
 class PdfService:
     @staticmethod
     def png_to_pdf_bytes(png_bytes: bytes) -> bytes:
-        image = Image.open(BytesIO(png_bytes)).convert('RGB')
+        return PdfService.image_to_pdf_bytes(Image.open(BytesIO(png_bytes)))
+
+    @staticmethod
+    def image_to_pdf_bytes(image: Image.Image) -> bytes:
+        # Pillow stores mode-1 pages as CCITT G4 when built with libtiff (the standard wheels are).
+        if image.mode not in {'RGB', '1'}:
+            image = image.convert('RGB')
         output = BytesIO()
         image.save(output, format='PDF', resolution=300.0)
         return output.getvalue()
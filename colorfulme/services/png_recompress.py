@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from io import BytesIO
+import logging
+
+from PIL import Image
+
+from extensions import db
+from models import GeneratedAsset, RenderCacheEntry
+from colorfulme.services.blob_store import BlobStore
+from colorfulme.services.render_artifact import encode_png
+from colorfulme.services.storage_service import StorageService
+from colorfulme.utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RecompressReport:
+    objects: int = 0
+    failed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def pending_keys(limit: int) -> list[str]:
+    rows = (
+        db.session.query(GeneratedAsset.png_key)
+        .filter(GeneratedAsset.png_profile == 'fast')
+        .distinct()
+        .limit(limit)
+        .all()
+    )
+    return [row.png_key for row in rows]
+
+
+def recompress_pending(limit: int = 10, storage: StorageService | None = None) -> RecompressReport:
+    """Re-encode up to ``limit`` fast-profile PNGs with the compact profile; the pixels are unchanged.
+
+    Older per-job keys are overwritten in place, so stored URLs keep working. Content-addressed
+    blobs are immutable (and served as such), so the compact bytes get their own blob and every
+    asset and render-cache entry is repointed; previews are rebuilt on demand for the new key.
+    """
+    storage = storage or StorageService()
+    blobs = BlobStore(storage)
+    report = RecompressReport()
+    for key in pending_keys(limit):
+        new_key = key
+        try:
+            original = storage.load_bytes(key)
+            image = Image.open(BytesIO(original))
+            image.load()
+            compact = encode_png(image, 'compact')
+            if len(compact) >= len(original):
+                compact = original
+            elif blobs.is_blob_key(key):
+                new_key = blobs.replace(key, compact, extension='png')
+            else:
+                storage.write_bytes(key, compact)
+        except Exception:
+            logger.exception('Could not recompress %s', key)
+            report.failed += 1
+            # Park it so the idle pass does not retry a broken object forever.
+            _mark(key, 'failed')
+            continue
+
+        _mark(key, 'compact', saved=len(original) - len(compact), new_key=new_key, storage=storage)
+        report.objects += 1
+        report.bytes_before += len(original)
+        report.bytes_after += len(compact)
+
+    if report.objects:
+        metrics.increment('png.recompress.objects', report.objects)
+        metrics.increment('png.recompress.bytes_saved', report.bytes_saved)
+    return report
+
+
+def _mark(
+    key: str,
+    profile: str,
+    saved: int = 0,
+    new_key: str | None = None,
+    storage: StorageService | None = None,
+) -> None:
+    asset_changes = {'png_profile': profile}
+    entry_changes = {'png_profile': profile, 'size_bytes': RenderCacheEntry.size_bytes - saved}
+    if new_key and new_key != key:
+        asset_changes.update(png_key=new_key, png_url=storage.get_download_url(new_key))
+        entry_changes['png_key'] = new_key
+    GeneratedAsset.query.filter_by(png_key=key).update(asset_changes, synchronize_session=False)
+    RenderCacheEntry.query.filter_by(png_key=key).update(entry_changes, synchronize_session=False)
+    db.session.commit()
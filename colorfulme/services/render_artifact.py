@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from io import BytesIO
+
+from PIL import Image
+
+from colorfulme.services import vectorize
+from colorfulme.services.pdf_service import PdfService
+
+
+OUTPUT_MODES = ('rgb', 'bilevel')
+
+# PNG encoder settings. 'fast' keeps the synchronous render path short; 'compact' is what
+# the background recompression pass (png_recompress) later swaps in.
+PNG_PROFILES = {
+    'fast': {'compress_level': 1},
+    'compact': {'optimize': True},
+}
+
+
+# Preview format -> (Pillow format, mimetype, save options).
+PREVIEW_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True}),
+}
+
+
+def encode_png(image: Image.Image, profile: str = 'compact') -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', **PNG_PROFILES[profile])
+    return buffer.getvalue()
+
+
+def encode_preview(image: Image.Image, max_width: int, fmt: str = 'png') -> bytes:
+    pil_format, _mime, options = PREVIEW_FORMATS[fmt]
+    width = min(max_width, image.width)
+    height = max(1, round(image.height * width / image.width))
+    # Resample from greyscale so 1-bit line art gets anti-aliased edges rather than dropped lines.
+    source = image.convert('L') if image.mode in {'1', 'P'} else image
+    preview = source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    buffer = BytesIO()
+    preview.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+class RenderArtifact:
+    """A processed render held as decoded pixels.
+
+    Each output format is encoded on first access and kept, so nothing in the
+    pipeline has to parse bytes produced by an earlier stage.
+    """
+
+    def __init__(
+        self,
+        image: Image.Image,
+        output_mode: str = 'rgb',
+        page_size: str = 'letter',
+        png_profile: str = 'compact',
+    ):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f'Unknown line-art output mode: {output_mode}')
+        if png_profile not in PNG_PROFILES:
+            raise ValueError(f'Unknown PNG encoder profile: {png_profile}')
+        self.output_mode = output_mode
+        self.png_profile = png_profile
+        if output_mode == 'bilevel' and image.mode != '1':
+            # Line art is already pure black/white, so a plain threshold is lossless.
+            image = image.convert('1', dither=Image.Dither.NONE)
+        self.image = image
+        self.width, self.height = image.size
+        self._rgb: Image.Image | None = None
+        self._png: bytes | None = None
+        self._pdf: bytes | None = None
+        self._previews: dict[tuple[int, str], bytes] = {}
+        self.page_size = page_size
+        self._outlines: list | None = None
+        self._svg: bytes | None = None
+        self._vector_pdf: bytes | None = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RenderArtifact':
+        image = Image.open(BytesIO(data))
+        image.load()
+        return cls(image)
+
+    @property
+    def png(self) -> bytes:
+        if self._png is None:
+            self._png = encode_png(self._page_image(), self.png_profile)
+        return self._png
+
+    @property
+    def pdf(self) -> bytes:
+        if self._pdf is None:
+            self._pdf = PdfService.image_to_pdf_bytes(self._page_image())
+        return self._pdf
+
+    @property
+    def svg(self) -> bytes:
+        if self._svg is None:
+            self._svg = vectorize.to_svg(self._traced(), self.width, self.height)
+        return self._svg
+
+    @property
+    def vector_pdf(self) -> bytes:
+        if self._vector_pdf is None:
+            self._vector_pdf = vectorize.to_pdf(self._traced(), self.width, self.height, self.page_size)
+        return self._vector_pdf
+
+    def thumbnail(self, max_width: int) -> bytes:
+        return self.preview(max_width, 'png')
+
+    def preview(self, max_width: int, fmt: str = 'png') -> bytes:
+        encoded = self._previews.get((max_width, fmt))
+        if encoded is None:
+            image = self.image if self.image is not None else Image.open(BytesIO(self.png))
+            encoded = encode_preview(image, max_width, fmt)
+            self._previews[(max_width, fmt)] = encoded
+        return encoded
+
+    def encode_all(self, *, vector: bool = False, previews=()) -> None:
+        """Encode the PNG and PDF (plus the vector formats and ``(width, fmt)`` previews) up front."""
+        self.png
+        self.pdf
+        if vector:
+            self.svg
+            self.vector_pdf
+        for max_width, fmt in previews:
+            self.preview(max_width, fmt)
+
+    @property
+    def size_bytes(self) -> int:
+        vectors = sum(len(encoded) for encoded in (self._svg, self._vector_pdf) if encoded)
+        return len(self.png) + len(self.pdf) + vectors
+
+    def release_pixels(self) -> None:
+        # Drop intermediates once the formats built from them exist; thumbnails still work from self.image.
+        if self._png is not None and self._pdf is not None:
+            self._rgb = None
+        if self._svg is not None and self._vector_pdf is not None:
+            self._outlines = None
+
+    def detach(self) -> None:
+        """Drop every decoded image so only encoded bytes remain (cheap to pickle).
+
+        Formats not encoded yet are lost, except previews, which fall back to the PNG.
+        """
+        self.image = None
+        self._rgb = None
+        self._outlines = None
+
+    def _traced(self) -> list:
+        if self._outlines is None:
+            self._outlines = vectorize.trace(self.image)
+        return self._outlines
+
+    def _page_image(self) -> Image.Image:
+        # Bilevel pages stay 1-bit: 1-bit PNG and a CCITT G4 image in the PDF.
+        if self.output_mode == 'bilevel':
+            return self.image
+        if self._rgb is None:
+            self._rgb = self.image if self.image.mode == 'RGB' else self.image.convert('RGB')
+        return self._rgb
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import timedelta
+import hashlib
+import json
+import logging
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import RenderCacheEntry
+from colorfulme.utils.lru_budget import Throttle, over_budget_ids
+from colorfulme.utils.security import utcnow
+
+
+# Rows removed per eviction pass; anything left over goes on the next pass.
+EVICT_BATCH_SIZE = 500
+
+_eviction_throttle = Throttle()
+
+
+class RenderCacheService:
+    def __init__(self):
+        self.enabled = bool(current_app.config.get('RENDER_CACHE_ENABLED', True))
+        self.max_entries = int(current_app.config.get('RENDER_CACHE_MAX_ENTRIES', 5000))
+        self.max_bytes = int(current_app.config.get('RENDER_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+        self.max_age = timedelta(seconds=int(current_app.config.get('RENDER_CACHE_MAX_AGE_SECONDS', 7 * 24 * 3600)))
+        self.evict_interval = float(current_app.config.get('RENDER_CACHE_EVICT_INTERVAL_SECONDS', 60))
+
+    @staticmethod
+    def make_key(
+        *,
+        mode: str,
+        prompt: str,
+        style: str | None,
+        aspect_ratio: str | None,
+        model: str,
+        quality: str,
+        output_mode: str,
+        png_profile: str,
+        vector_page_size: str | None,
+    ) -> str:
+        # Case and whitespace differences should not cost a second render. The output settings are
+        # part of the key so a bilevel or vector-enabled request never gets an entry stored without them;
+        # ``vector_page_size`` is None when vector export is off.
+        normalized = [
+            (mode or '').strip().lower(),
+            ' '.join((prompt or '').lower().split()),
+            ' '.join((style or '').lower().split()),
+            (aspect_ratio or '1:1').strip(),
+            (model or '').strip().lower(),
+            (quality or '').strip().lower(),
+            output_mode,
+            png_profile,
+            vector_page_size,
+        ]
+        payload = json.dumps(normalized, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def lookup(self, cache_key: str) -> RenderCacheEntry | None:
+        if not self.enabled:
+            return None
+
+        entry = RenderCacheEntry.query.filter_by(cache_key=cache_key).first()
+        if entry is None:
+            return None
+
+        now = utcnow()
+        if entry.created_at < now - self.max_age:
+            db.session.delete(entry)
+            db.session.commit()
+            return None
+
+        entry.hit_count += 1
+        entry.last_used_at = now
+        db.session.commit()
+        return entry
+
+    def store(
+        self,
+        cache_key: str,
+        *,
+        mode: str,
+        model: str,
+        quality: str,
+        png_key: str,
+        pdf_key: str,
+        width: int | None,
+        height: int | None,
+        size_bytes: int,
+        svg_key: str | None = None,
+        vector_pdf_key: str | None = None,
+        png_profile: str | None = None,
+    ) -> None:
+        if not self.enabled:
+            return
+
+        db.session.add(
+            RenderCacheEntry(
+                cache_key=cache_key,
+                mode=mode,
+                model=model,
+                quality=quality,
+                png_key=png_key,
+                pdf_key=pdf_key,
+                svg_key=svg_key,
+                vector_pdf_key=vector_pdf_key,
+                png_profile=png_profile,
+                width=width,
+                height=height,
+                size_bytes=size_bytes,
+            )
+        )
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent render of the same prompt got there first.
+            db.session.rollback()
+            return
+
+        # Not on every store: one pass per RENDER_CACHE_EVICT_INTERVAL_SECONDS per process is enough.
+        if _eviction_throttle.ready(self.evict_interval):
+            self.evict()
+
+    def evict(self) -> int:
+        cutoff = utcnow() - self.max_age
+        removed = RenderCacheEntry.query.filter(RenderCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+
+        stale_ids = over_budget_ids(
+            RenderCacheEntry,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+            limit=EVICT_BATCH_SIZE,
+        )
+        if stale_ids is not None:
+            removed += RenderCacheEntry.query.filter(RenderCacheEntry.id.in_(stale_ids)).delete(synchronize_session=False)
+
+        db.session.commit()
+        if removed:
+            logging.info('Render cache evicted %s entries', removed)
+        return removed
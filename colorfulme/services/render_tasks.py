@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageOps
+
+from colorfulme.services import line_art
+from colorfulme.services.render_artifact import RenderArtifact
+
+
+# Everything in this module is Flask-free and picklable so renders can run in the CPU pool
+# (see GenerationService._render); tasks and results cross the process boundary as bytes.
+
+FRAME_MARGIN = 48
+
+
+def aspect_ratio_to_dims(aspect_ratio: str | None) -> tuple[int, int]:
+    mapping = {
+        '1:1': (1200, 1200),
+        '4:5': (1200, 1500),
+        '3:4': (1200, 1600),
+        '16:9': (1600, 900),
+        '9:16': (900, 1600),
+    }
+    return mapping.get((aspect_ratio or '').strip(), (1200, 1200))
+
+
+@lru_cache(maxsize=None)
+def _frame(width: int, height: int) -> Image.Image:
+    # The decorative shapes depend only on the page size (a handful of aspect ratios), so
+    # each process draws them once; requests copy the frame and add their own text.
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+
+    # Draw decorative line-art style objects.
+    margin = FRAME_MARGIN
+    draw.rectangle([margin, margin, width - margin, height - margin], outline='black', width=4)
+    draw.ellipse([margin + 40, margin + 120, width // 2, height // 2], outline='black', width=4)
+    draw.polygon(
+        [
+            (width // 2 + 40, height // 2 + 20),
+            (width - margin - 40, height // 2 + 120),
+            (width // 2 + 120, height - margin - 40),
+        ],
+        outline='black',
+        width=4,
+    )
+    draw.text((margin + 24, margin + 24), 'COLORFULME', fill='black')
+    return image
+
+
+def placeholder_text(prompt: str, style: str | None) -> tuple[str, str]:
+    return (prompt or 'Coloring Page').strip()[:56], (style or 'clean outlines').strip()[:40]
+
+
+def draw_placeholder(prompt: str, style: str | None, width: int, height: int) -> Image.Image:
+    headline, subline = placeholder_text(prompt, style)
+    image = _frame(width, height).copy()
+    draw = ImageDraw.Draw(image)
+
+    # Keep text lightweight so output remains printable.
+    margin = FRAME_MARGIN
+    draw.text((margin + 24, height - margin - 44), headline, fill='black')
+    draw.text((margin + 24, height - margin - 24), subline, fill='black')
+    return image
+
+
+def photo_to_line_art(source_bytes: bytes, width: int, height: int, pipeline: str | None = 'auto') -> Image.Image:
+    image = Image.open(BytesIO(source_bytes))
+    # Edges only need luma: JPEGs decode straight to greyscale at the smallest DCT scale
+    # that still covers the page (square, as EXIF may rotate it).
+    side = max(width, height)
+    image.draft('L', (side, side))
+    image = ImageOps.exif_transpose(image, in_place=True) or image
+    gray = image if image.mode == 'L' else image.convert('L')
+    gray = ImageOps.fit(gray, (width, height), method=Image.Resampling.LANCZOS)
+
+    # Inverted, thresholded edges give clean coloring outlines.
+    return line_art.photo_edges(gray, pipeline=pipeline)
+
+
+@dataclass(frozen=True)
+class LocalRender:
+    """The deterministic fallback render, described rather than drawn.
+
+    Drawing is deferred to ``draw()`` so it happens wherever the rest of the CPU work runs.
+    """
+
+    prompt: str
+    mode: str
+    style: str | None
+    aspect_ratio: str | None
+    source_image: bytes | None = None
+    pipeline: str = 'auto'
+
+    @property
+    def is_placeholder(self) -> bool:
+        return not (self.mode in {'photo', 'recolor'} and self.source_image)
+
+    def draw(self) -> Image.Image:
+        width, height = aspect_ratio_to_dims(self.aspect_ratio)
+        if not self.is_placeholder:
+            return photo_to_line_art(self.source_image, width, height, self.pipeline)
+        return draw_placeholder(self.prompt, self.style, width, height)
+
+
+@dataclass(frozen=True)
+class RenderTask:
+    # Exactly one of png_bytes (an upstream render) or local is set.
+    png_bytes: bytes | None
+    local: LocalRender | None
+    pipeline: str
+    output_mode: str
+    page_size: str
+    png_profile: str
+    vector_export: bool
+    preview_sizes: tuple[tuple[int, str], ...] = field(default_factory=tuple)
+
+    def placeholder_key(self) -> tuple | None:
+        """Everything that determines the output of a placeholder render, or None for other renders."""
+        if self.local is None or not self.local.is_placeholder:
+            return None
+        return (
+            placeholder_text(self.local.prompt, self.local.style),
+            aspect_ratio_to_dims(self.local.aspect_ratio),
+            self.pipeline,
+            self.output_mode,
+            self.page_size,
+            self.png_profile,
+            self.vector_export,
+            self.preview_sizes,
+        )
+
+    def decode(self) -> Image.Image:
+        if self.local is not None:
+            return self.local.draw()
+        image = Image.open(BytesIO(self.png_bytes))
+        image.load()
+        return image
+
+
+def run_render_task(task: RenderTask) -> RenderArtifact:
+    """Clean a render and encode every stored format; the result holds bytes only."""
+    # Normalize to white background + black outlines only.
+    cleaned = line_art.clean_line_art(task.decode().convert('L'), pipeline=task.pipeline)
+    artifact = RenderArtifact(
+        cleaned,
+        output_mode=task.output_mode,
+        page_size=task.page_size,
+        png_profile=task.png_profile,
+    )
+    artifact.encode_all(vector=task.vector_export, previews=task.preview_sizes)
+    artifact.detach()
+    return artifact
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+
+from colorfulme.utils.client_registry import ClientRegistry
+
+
+_registry: ClientRegistry = ClientRegistry('s3')
+
+
+@dataclass(frozen=True)
+class S3PoolSettings:
+    region: str = 'us-east-1'
+    endpoint_url: str | None = None
+    # Covers STORAGE_UPLOAD_CONCURRENCY uploads plus their multipart parts without queueing.
+    max_connections: int = 50
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 60.0
+    max_attempts: int = 3
+
+    @classmethod
+    def from_config(cls, config, *, region: str, endpoint_url: str | None) -> 'S3PoolSettings':
+        return cls(
+            region=region,
+            endpoint_url=endpoint_url,
+            max_connections=int(config.get('S3_POOL_MAX_CONNECTIONS', 50)),
+            connect_timeout_seconds=float(config.get('S3_CONNECT_TIMEOUT_SECONDS', 5.0)),
+            read_timeout_seconds=float(config.get('S3_READ_TIMEOUT_SECONDS', 60.0)),
+            max_attempts=int(config.get('S3_MAX_ATTEMPTS', 3)),
+        )
+
+
+def get_s3_client(access_key: str, secret_key: str, settings: S3PoolSettings | None = None):
+    settings = settings or S3PoolSettings()
+    # Hash the credentials so they never show up in debug dumps of the registry.
+    credentials = hashlib.sha256(f'{access_key}:{secret_key}'.encode('utf-8')).hexdigest()
+    return _registry.get((credentials, settings), lambda: _build_client(access_key, secret_key, settings))
+
+
+def reset_s3_clients() -> None:
+    _registry.clear()
+
+
+def _build_client(access_key: str, secret_key: str, settings: S3PoolSettings):
+    import boto3
+    from botocore.config import Config
+
+    # A session per client: the default session is not safe to share between threads.
+    return boto3.session.Session().client(
+        's3',
+        region_name=settings.region,
+        endpoint_url=settings.endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        config=Config(
+            max_pool_connections=settings.max_connections,
+            connect_timeout=settings.connect_timeout_seconds,
+            read_timeout=settings.read_timeout_seconds,
+            retries={'max_attempts': settings.max_attempts, 'mode': 'standard'},
+        ),
+    )
@@ -1,10 +1,52 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+from io import BytesIO
+import logging
 import os
+import shutil
 from pathlib import Path
+import threading
+import time
 import uuid
 
-from flask import current_app, url_for
+from flask import current_app, has_request_context, url_for
+
+from colorfulme.services.storage_pool import S3PoolSettings, get_s3_client
+from colorfulme.utils.executors import get_executor
+from colorfulme.utils.ttl_cache import TTLCache
+
+
+LOCAL_LAYOUTS = ('sharded', 'nested')
+# The most keys one S3 DeleteObjects request accepts.
+DELETE_BATCH_SIZE = 1000
+# Presigned URLs are reused for at most this fraction of their lifetime, so every URL handed out
+# keeps at least a tenth of it (6 minutes of a 1-hour URL) to be fetched in.
+MAX_SIGNED_URL_REUSE_FRACTION = 0.9
+
+# Local roots already created in this process; the directory only needs making once.
+_prepared_roots: set[Path] = set()
+
+_signed_urls_lock = threading.Lock()
+_signed_urls: TTLCache | None = None
+
+
+def _get_signed_url_cache() -> TTLCache:
+    global _signed_urls
+    if _signed_urls is None:
+        with _signed_urls_lock:
+            if _signed_urls is None:
+                _signed_urls = TTLCache(
+                    int(current_app.config.get('PRESIGNED_URL_CACHE_MAX_ENTRIES', 50000)),
+                    name='storage.presigned_urls',
+                )
+    return _signed_urls
+
+
+def clear_signed_url_cache() -> None:
+    if _signed_urls is not None:
+        _signed_urls.clear()
 
 
 class StorageService:
@@ -18,60 +60,280 @@ class StorageService:
         self._s3_client = None
         if self.bucket and self.access_key and self.secret_key:
             try:
-                import boto3
-
-                self._s3_client = boto3.client(
-                    's3',
-                    region_name=self.region,
-                    endpoint_url=self.endpoint_url,
-                    aws_access_key_id=self.access_key,
-                    aws_secret_access_key=self.secret_key,
+                # Borrowed from the per-process registry: one connection pool per worker.
+                self._s3_client = get_s3_client(
+                    self.access_key,
+                    self.secret_key,
+                    S3PoolSettings.from_config(current_app.config, region=self.region, endpoint_url=self.endpoint_url),
                 )
             except Exception:
                 self._s3_client = None
 
         self.local_root = Path(current_app.instance_path) / 'generated'
-        self.local_root.mkdir(parents=True, exist_ok=True)
+        self.local_layout = (current_app.config.get('LOCAL_STORAGE_LAYOUT') or 'sharded').strip().lower()
+        if self.local_root not in _prepared_roots:
+            self.local_root.mkdir(parents=True, exist_ok=True)
+            _prepared_roots.add(self.local_root)
+        self.upload_concurrency = int(current_app.config.get('STORAGE_UPLOAD_CONCURRENCY', 8))
+        self.multipart_threshold = int(current_app.config.get('S3_MULTIPART_THRESHOLD_MB', 16)) * 1024 * 1024
+        self.multipart_chunk_size = int(current_app.config.get('S3_MULTIPART_CHUNK_MB', 8)) * 1024 * 1024
+        self.multipart_concurrency = int(current_app.config.get('S3_MULTIPART_CONCURRENCY', 4))
+        self.signed_url_reuse_fraction = min(
+            MAX_SIGNED_URL_REUSE_FRACTION,
+            float(current_app.config.get('PRESIGNED_URL_REUSE_FRACTION', 0.75)),
+        )
 
     @property
     def uses_s3(self) -> bool:
         return self._s3_client is not None
 
     def save_bytes(self, payload: bytes, *, extension: str, folder: str = 'assets') -> tuple[str, str]:
-        safe_ext = extension.lstrip('.').lower()
-        key = f"{folder.strip('/')}/{uuid.uuid4().hex}.{safe_ext}"
+        key = self._new_key(extension, folder)
+        self.write_bytes(key, payload)
+        return key, self.get_download_url(key)
+
+    def save_many(self, items: list[tuple[bytes, str, str]]) -> list[tuple[str, str]]:
+        """Store several ``(payload, extension, folder)`` objects at once; returns ``(key, url)`` per item.
+
+        S3 uploads run concurrently on a shared thread pool, so a job pays one round trip
+        instead of one per file. If any upload fails, the others are deleted and the error raised.
+        """
+        keys = [self._new_key(extension, folder) for _payload, extension, folder in items]
+        self.write_many([(key, payload) for key, (payload, _, _) in zip(keys, items)])
+        return [(key, self.get_download_url(key)) for key in keys]
 
+    def write_many(self, items: list[tuple[str, bytes]], *, cleanup: bool = True) -> None:
+        """Write several ``(key, payload)`` objects, concurrently on S3.
+
+        With ``cleanup`` a failure deletes the objects that did go up. Content-addressed callers
+        turn it off: another writer may own the same key.
+        """
+        if not (self.uses_s3 and len(items) > 1):
+            for key, payload in items:
+                self.write_bytes(key, payload)
+            return
+
+        executor = get_executor('storage', self.upload_concurrency)
+        futures = [executor.submit(self.write_bytes, key, payload) for key, payload in items]
+        errors = [future.exception() for future in futures]
+        failed = next((error for error in errors if error is not None), None)
+        if failed is None:
+            return
+        if cleanup:
+            for (key, _payload), error in zip(items, errors):
+                if error is None:
+                    try:
+                        self.delete(key)
+                    except Exception as exc:
+                        logging.warning('Could not delete %s after a failed upload: %s', key, exc)
+        raise failed
+
+    def save_file(self, source_path, *, extension: str, folder: str = 'assets') -> tuple[str, str]:
+        # Large outputs (books) are written to disk first and streamed up instead of held in memory.
+        key = self._new_key(extension, folder)
+
+        if self.uses_s3:
+            self._s3_client.upload_file(
+                str(source_path),
+                self.bucket,
+                key,
+                ExtraArgs={'ContentType': self._mime_for_key(key)},
+                Config=self._transfer_config(),
+            )
+            return key, self.get_download_url(key)
+
+        self._replace_local(key, lambda temp_path: shutil.copyfile(source_path, temp_path))
+        return key, self.get_download_url(key)
+
+    def write_bytes(self, key: str, payload: bytes) -> None:
+        # Write to a caller-chosen key. Readers see the old object or the new one, never a partial write.
         if self.uses_s3:
+            if len(payload) >= self.multipart_threshold:
+                # Parts upload in parallel; the object only appears once every part is in.
+                self._s3_client.upload_fileobj(
+                    BytesIO(payload),
+                    self.bucket,
+                    key,
+                    ExtraArgs={'ContentType': self._mime_for_key(key)},
+                    Config=self._transfer_config(),
+                )
+                return
             self._s3_client.put_object(
                 Bucket=self.bucket,
                 Key=key,
                 Body=payload,
-                ContentType=self._mime_for_ext(safe_ext),
+                ContentType=self._mime_for_key(key),
             )
-            return key, self.get_download_url(key)
+            return
 
-        path = self.local_root / key
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(payload)
-        return key, self.get_download_url(key)
+        self._replace_local(key, lambda temp_path: temp_path.write_bytes(payload))
 
     def get_download_url(self, key: str, expires_seconds: int = 3600) -> str:
         if self.uses_s3:
-            return self._s3_client.generate_presigned_url(
+            return self._signed_url(key, expires_seconds)
+
+        # Signed like the S3 URLs: blob keys derive from the content, so a key alone must not grant access.
+        params = {'key': key, **self._local_signature(key, expires_seconds)}
+        if has_request_context():
+            return url_for('web.local_asset', _external=True, **params)
+
+        # Background workers have no request to derive the host from.
+        adapter = current_app.url_map.bind('localhost')
+        path = adapter.build('web.local_asset', params)
+        return f"{(current_app.config.get('PUBLIC_BASE_URL') or '').rstrip('/')}{path}"
+
+    def local_url_expiry(self, key: str, expires, signature) -> int | None:
+        """The expiry of a signed local URL for ``key``, or None if it is forged or has expired."""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return None
+        if expires <= time.time() or not isinstance(signature, str):
+            return None
+        if not hmac.compare_digest(signature, self._local_digest(key, expires)):
+            return None
+        return expires
+
+    def _local_signature(self, key: str, expires_seconds: int) -> dict:
+        # Aligned to the same reuse windows as presigned S3 URLs, so repeat requests get one URL.
+        reuse_seconds = max(1, int(expires_seconds * self.signed_url_reuse_fraction))
+        expires = int(time.time() // reuse_seconds) * reuse_seconds + expires_seconds
+        return {'expires': expires, 'signature': self._local_digest(key, expires)}
+
+    @staticmethod
+    def _local_digest(key: str, expires: int) -> str:
+        secret = str(current_app.config['SECRET_KEY']).encode('utf-8')
+        return hmac.new(secret, f'{key}\n{expires}'.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _signed_url(self, key: str, expires_seconds: int) -> str:
+        # Every caller within an aligned reuse window gets the same URL, so browsers and CDNs can
+        # cache it. A URL is never handed out more than reuse_seconds after it was signed, so it
+        # always has at least expires_seconds - reuse_seconds of validity left.
+        reuse_seconds = max(1, int(expires_seconds * self.signed_url_reuse_fraction))
+        now = time.time()
+        window = int(now // reuse_seconds)
+        cache = _get_signed_url_cache()
+        cache_key = (self.bucket, key, expires_seconds, window)
+        url = cache.get(cache_key)
+        if url is None:
+            url = self._s3_client.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': self.bucket, 'Key': key},
                 ExpiresIn=expires_seconds,
             )
+            cache.set(cache_key, url, ttl_seconds=(window + 1) * reuse_seconds - now)
+        return url
 
-        return url_for('web.local_asset', key=key, _external=True)
+    def load_bytes(self, key: str) -> bytes:
+        if self.uses_s3:
+            response = self._s3_client.get_object(Bucket=self.bucket, Key=key)
+            return response['Body'].read()
+
+        return self.absolute_local_path(key).read_bytes()
+
+    def delete(self, key: str) -> None:
+        if self.uses_s3:
+            self._s3_client.delete_object(Bucket=self.bucket, Key=key)
+            return
+
+        self.absolute_local_path(key).unlink(missing_ok=True)
+
+    def delete_many(self, keys: list[str]) -> list[str]:
+        """Delete objects in bulk (S3 DeleteObjects, DELETE_BATCH_SIZE keys per request).
+
+        Missing objects count as deleted. Returns the keys that could not be deleted.
+        """
+        failed = []
+        if self.uses_s3:
+            for start in range(0, len(keys), DELETE_BATCH_SIZE):
+                chunk = keys[start:start + DELETE_BATCH_SIZE]
+                try:
+                    response = self._s3_client.delete_objects(
+                        Bucket=self.bucket,
+                        Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True},
+                    )
+                except Exception as exc:
+                    logging.warning('Could not delete %s objects: %s', len(chunk), exc)
+                    failed.extend(chunk)
+                    continue
+                failed.extend(error['Key'] for error in response.get('Errors', []))
+            return failed
+
+        for key in keys:
+            try:
+                self.absolute_local_path(key).unlink(missing_ok=True)
+            except OSError as exc:
+                logging.warning('Could not delete %s: %s', key, exc)
+                failed.append(key)
+        return failed
+
+    def iter_objects(self, prefix: str = ''):
+        """Yield ``(key, size_bytes, modified_epoch)`` for every stored object under ``prefix``."""
+        if self.uses_s3:
+            paginator = self._s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    yield item['Key'], item['Size'], item['LastModified'].timestamp()
+            return
+
+        start = self.local_root / prefix.strip('/') if prefix else self.local_root
+        for directory, _dirs, files in os.walk(start):
+            for name in files:
+                path = Path(directory) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield path.relative_to(self.local_root).as_posix(), stat.st_size, stat.st_mtime
 
     def absolute_local_path(self, key: str) -> Path:
         return self.local_root / key
 
+    def _transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunk_size,
+            max_concurrency=self.multipart_concurrency,
+        )
+
+    def _replace_local(self, key: str, write) -> None:
+        # Written next to the target and renamed over it, so readers never see a partial file.
+        path = self.absolute_local_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    def _new_key(self, extension: str, folder: str) -> str:
+        safe_ext = extension.lstrip('.').lower()
+        folder = folder.strip('/')
+        if not self.uses_s3 and self.local_layout == 'sharded':
+            # <ab>/<cd>/<folder hash>/: no directory grows with the number of users or jobs, and a
+            # job's files still sit together. Keys written under the nested layout keep working.
+            digest = hashlib.sha256(folder.encode('utf-8')).hexdigest()
+            folder = f'{digest[:2]}/{digest[2:4]}/{digest[:32]}'
+        return f'{folder}/{uuid.uuid4().hex}.{safe_ext}'
+
+    @classmethod
+    def _mime_for_key(cls, key: str) -> str:
+        return cls._mime_for_ext(key.rsplit('.', 1)[-1].lower())
+
     @staticmethod
     def _mime_for_ext(ext: str) -> str:
         if ext == 'png':
             return 'image/png'
         if ext == 'pdf':
             return 'application/pdf'
+        if ext == 'svg':
+            return 'image/svg+xml'
+        if ext == 'webp':
+            return 'image/webp'
+        if ext in {'jpg', 'jpeg'}:
+            return 'image/jpeg'
         return 'application/octet-stream'
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from io import BytesIO
+import tempfile
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# Uploads larger than this spill from memory to a temporary file.
+SPOOL_MAX_BYTES = 1024 * 1024
+# base64 characters decoded per step; a multiple of 4 so chunks decode independently.
+BASE64_CHUNK_CHARS = 256 * 1024
+# Shortest side kept for photo sources. Renders are at most 1536px on the long side, and
+# ImageOps.fit crops to the target aspect, so this is enough for every size.
+WORKING_SIZE = 1536
+# Budget per decoded pixel: the decoded frame plus the RGB copy made for the edge filter.
+DECODE_BYTES_PER_PIXEL = 4
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def spool_base64(data: str, *, max_bytes: int):
+    """Decode a base64 string (or data URL) into a spooled temporary file, chunk by chunk."""
+    if data.startswith('data:') and ',' in data:
+        data = data[data.index(',') + 1:]
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    carry = ''
+    written = 0
+    try:
+        for start in range(0, len(data), BASE64_CHUNK_CHARS):
+            chunk = carry + ''.join(data[start:start + BASE64_CHUNK_CHARS].split())
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            written += spool.write(base64.b64decode(chunk[:usable]))
+            if written > max_bytes:
+                raise UploadTooLarge(f'Source image exceeds {max_bytes // (1024 * 1024)} MB')
+        if carry:
+            raise ValueError('Source image is not valid base64')
+    except binascii.Error as exc:
+        spool.close()
+        raise ValueError('Source image is not valid base64') from exc
+    except ValueError:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def check_size(fileobj, *, max_bytes: int) -> None:
+    fileobj.seek(0, 2)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if size > max_bytes:
+        raise UploadTooLarge(f'Source image exceeds {max_bytes // (1024 * 1024)} MB')
+
+
+def prepare_source_image(fileobj, *, max_decode_bytes: int) -> bytes:
+    """Bound an uploaded photo before anything decodes it in full.
+
+    Only the header is read to size the decode: JPEGs are sized at the smallest draft (DCT)
+    scale that still covers WORKING_SIZE, which is how the renderer decodes them too. Images
+    that would still decode at twice the working size or more (large PNGs, for example) are
+    shrunk and re-encoded once here, so the stored source and every later decode stay small.
+    """
+    try:
+        image = Image.open(fileobj)
+    except Image.DecompressionBombError as exc:
+        raise UploadTooLarge('Source image has too many pixels') from exc
+    except UnidentifiedImageError as exc:
+        raise ValueError('Source image is not a supported image format') from exc
+
+    original_size = image.size
+    if image.format == 'JPEG':
+        # Scales by 1/2, 1/4 or 1/8 during decode while keeping both sides >= WORKING_SIZE.
+        image.draft('RGB', (WORKING_SIZE, WORKING_SIZE))
+
+    width, height = image.size
+    if width * height * DECODE_BYTES_PER_PIXEL > max_decode_bytes:
+        raise UploadTooLarge(
+            f'Source image is too large to process ({original_size[0]}x{original_size[1]}); '
+            'please upload a smaller photo'
+        )
+
+    if min(width, height) < 2 * WORKING_SIZE and image.format in {'JPEG', 'PNG', 'WEBP'}:
+        # Close enough to working size: pass the original bytes through untouched.
+        fileobj.seek(0)
+        return fileobj.read()
+
+    image = ImageOps.exif_transpose(image, in_place=True) or image
+    if image.mode not in {'RGB', 'L'}:
+        image = image.convert('RGB')
+    scale = WORKING_SIZE / min(image.size)
+    if scale < 1:
+        target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from collections import defaultdict
+import math
+import re
+import zlib
+
+from PIL import Image
+
+
+# Points (1/72 in) for the printable vector PDF; the drawing is centred with a margin.
+PAGE_SIZES = {
+    'letter': (612.0, 792.0),
+    'a4': (595.28, 841.89),
+}
+PAGE_MARGIN_PT = 36.0
+
+_RUN = re.compile(b'\x01+')
+_CORNER_COS = math.cos(math.radians(70))
+
+
+def trace(image: Image.Image, *, tolerance: float = 1.0, min_area: int = 3) -> list[list[tuple]]:
+    """Trace black regions of a line-art bitmap into closed, smoothed outlines.
+
+    Each outline is a list of drawing commands: ('M', p), ('L', p) and ('Q', c, p)
+    in pixel coordinates. Holes come out as separate loops, so fill with even-odd.
+    """
+    width, height = image.size
+    if image.mode != 'L':
+        image = image.convert('L')
+    black = image.point(lambda p: 1 if p < 128 else 0)
+
+    segments: dict[tuple[int, int], list[tuple[int, int]]] = defaultdict(list)
+    _horizontal_runs(black.tobytes(), width, height, segments, transpose=False)
+    _horizontal_runs(black.transpose(Image.Transpose.TRANSPOSE).tobytes(), height, width, segments, transpose=True)
+
+    outlines = []
+    for loop in _chain(segments):
+        if abs(_area(loop)) < min_area:
+            continue
+        outlines.append(_smooth(_simplify(loop, tolerance)))
+    return outlines
+
+
+def to_svg(outlines: list[list[tuple]], width: int, height: int) -> bytes:
+    path = ' '.join(_svg_commands(outline) for outline in outlines)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        f'<path fill="#000" fill-rule="evenodd" d="{path}"/>'
+        '</svg>'
+    ).encode('utf-8')
+
+
+def to_pdf(outlines: list[list[tuple]], width: int, height: int, page_size: str = 'letter') -> bytes:
+    page_w, page_h = PAGE_SIZES.get(page_size, PAGE_SIZES['letter'])
+    if width > height:
+        page_w, page_h = page_h, page_w
+    scale = min((page_w - 2 * PAGE_MARGIN_PT) / width, (page_h - 2 * PAGE_MARGIN_PT) / height)
+    tx = (page_w - width * scale) / 2
+    ty = page_h - (page_h - height * scale) / 2
+
+    # Flip the y axis so the traced pixel coordinates can be written as-is.
+    ops = [f'q {_num(scale)} 0 0 {_num(-scale)} {_num(tx)} {_num(ty)} cm 0 g']
+    for outline in outlines:
+        ops.append(_pdf_commands(outline))
+    ops.append('f* Q' if outlines else 'Q')
+    content = zlib.compress('\n'.join(ops).encode('ascii'), 9)
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(page_w)} {_num(page_h)}] '
+            '/Resources << >> /Contents 4 0 R >>'
+        ).encode('ascii'),
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream',
+    ]
+    return _write_pdf(objects)
+
+
+def _horizontal_runs(data: bytes, width: int, height: int, segments, *, transpose: bool) -> None:
+    # Boundary line y sits between pixel rows y-1 and y. Edges are directed so the
+    # black pixels are always on the right-hand side (y pointing down).
+    empty = 0
+    previous = empty
+    for y in range(height + 1):
+        current = int.from_bytes(data[y * width:(y + 1) * width], 'big') if y < height else empty
+        changed = previous ^ current
+        if changed:
+            entering = (changed & current).to_bytes(width, 'big')
+            leaving = (changed & previous).to_bytes(width, 'big')
+            for match in _RUN.finditer(entering):
+                _add(segments, (match.start(), y), (match.end(), y), transpose)
+            for match in _RUN.finditer(leaving):
+                _add(segments, (match.end(), y), (match.start(), y), transpose)
+        previous = current
+
+
+def _add(segments, start, end, transpose: bool) -> None:
+    if transpose:
+        # Columns were scanned as rows: swap axes, which also reverses the winding.
+        segments[(end[1], end[0])].append((start[1], start[0]))
+    else:
+        segments[start].append(end)
+
+
+def _chain(segments) -> list[list[tuple[int, int]]]:
+    loops = []
+    while segments:
+        start, ends = next(iter(segments.items()))
+        loop = [start]
+        current, heading = start, None
+        while True:
+            ends = segments[current]
+            end = ends[0] if len(ends) == 1 else _turn_right(current, heading, ends)
+            ends.remove(end)
+            if not ends:
+                del segments[current]
+            heading = (end[0] - current[0], end[1] - current[1])
+            current = end
+            if current == start:
+                break
+            loop.append(current)
+        loops.append(loop)
+    return loops
+
+
+def _turn_right(point, heading, ends):
+    # Only at diagonal pixel contacts; turning right keeps touching regions apart.
+    if heading is None:
+        return ends[0]
+    for end in ends:
+        dx, dy = end[0] - point[0], end[1] - point[1]
+        if heading[0] * dy - heading[1] * dx > 0:
+            return end
+    return ends[0]
+
+
+def _area(loop) -> float:
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(loop, loop[1:] + loop[:1])) / 2
+
+
+def _simplify(loop, tolerance: float):
+    if len(loop) <= 4:
+        return loop
+    # Split the closed loop at its farthest point and simplify both halves.
+    far = max(range(len(loop)), key=lambda i: (loop[i][0] - loop[0][0]) ** 2 + (loop[i][1] - loop[0][1]) ** 2)
+    first = _douglas_peucker(loop[: far + 1], tolerance)
+    second = _douglas_peucker(loop[far:] + loop[:1], tolerance)
+    return first[:-1] + second[:-1]
+
+
+def _douglas_peucker(points, tolerance: float):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x0, y0), (x1, y1) = points[first], points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy) or 1.0
+        index, distance = None, tolerance
+        for i in range(first + 1, last):
+            px, py = points[i]
+            d = abs(dy * (px - x0) - dx * (py - y0)) / length
+            if d > distance:
+                index, distance = i, d
+        if index is not None:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _smooth(points) -> list[tuple]:
+    # Potrace-style: walk segment midpoints, curving through gentle vertices and
+    # keeping sharp ones as corners.
+    count = len(points)
+    mids = [
+        ((points[i][0] + points[(i + 1) % count][0]) / 2, (points[i][1] + points[(i + 1) % count][1]) / 2)
+        for i in range(count)
+    ]
+    commands = [('M', mids[-1])]
+    for i, point in enumerate(points):
+        before, after = points[i - 1], points[(i + 1) % count]
+        ax, ay = point[0] - before[0], point[1] - before[1]
+        bx, by = after[0] - point[0], after[1] - point[1]
+        norms = math.hypot(ax, ay) * math.hypot(bx, by)
+        if norms and (ax * bx + ay * by) / norms < _CORNER_COS:
+            commands.append(('L', point))
+            commands.append(('L', mids[i]))
+        else:
+            commands.append(('Q', point, mids[i]))
+    return commands
+
+
+def _num(value: float) -> str:
+    text = f'{value:.2f}'.rstrip('0').rstrip('.')
+    return text if text not in {'', '-0'} else '0'
+
+
+def _svg_commands(outline) -> str:
+    parts = []
+    for command in outline:
+        if command[0] == 'Q':
+            (cx, cy), (x, y) = command[1], command[2]
+            parts.append(f'Q{_num(cx)} {_num(cy)} {_num(x)} {_num(y)}')
+        else:
+            x, y = command[1]
+            parts.append(f'{command[0]}{_num(x)} {_num(y)}')
+    return ''.join(parts) + 'Z'
+
+
+def _pdf_commands(outline) -> str:
+    parts = []
+    current = (0.0, 0.0)
+    for command in outline:
+        if command[0] == 'Q':
+            # PDF only has cubic curves; raise the quadratic's degree.
+            (cx, cy), (x, y) = command[1], command[2]
+            c1 = (current[0] + 2 / 3 * (cx - current[0]), current[1] + 2 / 3 * (cy - current[1]))
+            c2 = (x + 2 / 3 * (cx - x), y + 2 / 3 * (cy - y))
+            parts.append(f'{_num(c1[0])} {_num(c1[1])} {_num(c2[0])} {_num(c2[1])} {_num(x)} {_num(y)} c')
+            current = (x, y)
+        else:
+            x, y = command[1]
+            parts.append(f"{_num(x)} {_num(y)} {'m' if command[0] == 'M' else 'l'}")
+            current = (x, y)
+    parts.append('h')
+    return '\n'.join(parts)
+
+
+def _write_pdf(objects: list[bytes]) -> bytes:
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
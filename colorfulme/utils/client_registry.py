@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Callable, Generic, Hashable, TypeVar
+
+from colorfulme.utils import metrics
+
+
+T = TypeVar('T')
+
+_registries: list['ClientRegistry'] = []
+
+
+class ClientRegistry(Generic[T]):
+    """Process-wide cache of long-lived SDK clients.
+
+    Clients are keyed by whatever identifies their connection pool (credentials,
+    endpoint). A forked child never reuses its parent's clients: sockets and TLS
+    state must not be shared between gunicorn workers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._clients: dict[Hashable, T] = {}
+        self._pid = os.getpid()
+        _registries.append(self)
+
+    def get(self, key: Hashable, factory: Callable[[], T]) -> T:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients.clear()
+                self._pid = os.getpid()
+
+            client = self._clients.get(key)
+            if client is not None:
+                metrics.increment(f'{self.name}.clients.reused')
+                return client
+
+            client = factory()
+            self._clients[key] = client
+            metrics.increment(f'{self.name}.clients.created')
+            logging.debug('Created %s client (%s cached)', self.name, len(self._clients))
+            return client
+
+    def clear(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            close = getattr(client, 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _reset_after_fork(self) -> None:
+        # Drop without closing: the parent still owns those sockets.
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+
+def _reset_all_after_fork() -> None:
+    for registry in _registries:
+        registry._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_all_after_fork)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import threading
+
+
+_lock = threading.Lock()
+_executors: dict[str, ThreadPoolExecutor] = {}
+_process_pools: dict[str, ProcessPoolExecutor] = {}
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """Return the process-wide thread pool registered under ``name``.
+
+    Pools are created lazily so gunicorn workers never inherit threads from the
+    master, and are dropped in forked children.
+    """
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix=f'colorfulme-{name}')
+            _executors[name] = executor
+        return executor
+
+
+def get_process_pool(name: str, max_workers: int) -> ProcessPoolExecutor:
+    """Return the process-wide process pool registered under ``name``.
+
+    Children start from a forkserver (spawn where that is unavailable) rather than a
+    fork of a threaded web worker, so they only import what their tasks need.
+    """
+    with _lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            pool = ProcessPoolExecutor(
+                max_workers=max(1, int(max_workers)),
+                mp_context=multiprocessing.get_context(method),
+            )
+            _process_pools[name] = pool
+        return pool
+
+
+def discard_process_pool(name: str, pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool so the next get_process_pool call starts a fresh one."""
+    with _lock:
+        if _process_pools.get(name) is pool:
+            del _process_pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    with _lock:
+        executors = [*_executors.values(), *_process_pools.values()]
+        _executors.clear()
+        _process_pools.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def _reset_after_fork() -> None:
+    global _lock
+    _lock = threading.Lock()
+    _executors.clear()
+    _process_pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
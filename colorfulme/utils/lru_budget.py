@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from sqlalchemy import func, or_, select
+
+from extensions import db
+
+
+def over_budget_ids(model, *, max_entries: int, max_bytes: int, limit: int):
+    """Select up to ``limit`` ids of ``model`` rows beyond the entry or byte budget, or None if within it.
+
+    Rows are ranked most recently used first (``last_used_at``), and the running totals come from
+    window functions, so nothing is loaded into Python. Within budget this is one aggregate query.
+    """
+    count, total = db.session.query(func.count(model.id), func.coalesce(func.sum(model.size_bytes), 0)).one()
+    if count <= max_entries and total <= max_bytes:
+        return None
+
+    order = (model.last_used_at.desc(), model.id)
+    ranked = select(
+        model.id,
+        func.row_number().over(order_by=order).label('position'),
+        func.sum(func.coalesce(model.size_bytes, 0)).over(order_by=order, rows=(None, 0)).label('kept_bytes'),
+    ).subquery()
+    return (
+        select(ranked.c.id)
+        .where(or_(ranked.c.position > max_entries, ranked.c.kept_bytes > max_bytes))
+        .order_by(ranked.c.position.desc())
+        .limit(limit)
+    )
+
+
+class Throttle:
+    """Lets periodic upkeep run at most once per interval in this process."""
+
+    def __init__(self, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._last_run: float | None = None
+        self._clock = clock
+
+    def ready(self, interval: float) -> bool:
+        with self._lock:
+            now = self._clock()
+            if self._last_run is not None and now - self._last_run < float(interval):
+                return False
+            self._last_run = now
+            return True
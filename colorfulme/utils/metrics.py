@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import os
+import threading
+
+
+# Per-process counters; each gunicorn worker reports its own numbers.
+_lock = threading.Lock()
+_counters: dict[str, int] = {}
+
+
+def increment(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot(prefix: str | None = None) -> dict[str, int]:
+    with _lock:
+        return {
+            name: value
+            for name, value in sorted(_counters.items())
+            if prefix is None or name.startswith(prefix)
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+
+
+def _reset_after_fork() -> None:
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
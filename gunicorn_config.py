@@ -4,7 +4,10 @@ import os
 
 bind = "0.0.0.0:5000"
 workers = 2
-worker_class = "sync"
+# Threaded workers so long-lived job event streams do not pin a whole process each.
+# JOB_EVENTS_MAX_STREAMS must stay below the thread count so ordinary requests always get a thread.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
 worker_connections = 1000
 timeout = 120
 keepalive = 5
@@ -34,7 +34,9 @@ class User(UserMixin, db.Model):
     wallet = db.relationship('CreditWallet', back_populates='user', uselist=False, cascade='all, delete-orphan')
     credit_ledger_entries = db.relationship('CreditLedger', back_populates='user', cascade='all, delete-orphan')
     generation_jobs = db.relationship('GenerationJob', back_populates='user', cascade='all, delete-orphan')
+    generation_batches = db.relationship('GenerationBatch', back_populates='user', cascade='all, delete-orphan')
     generated_assets = db.relationship('GeneratedAsset', back_populates='user', cascade='all, delete-orphan')
+    coloring_books = db.relationship('ColoringBook', back_populates='user', cascade='all, delete-orphan')
     api_keys = db.relationship('ApiKey', back_populates='user', cascade='all, delete-orphan')
     api_usage_events = db.relationship('ApiUsageEvent', back_populates='user', cascade='all, delete-orphan')
 
@@ -172,17 +174,60 @@ class GenerationJob(db.Model):
     status = db.Column(db.String(20), nullable=False, default='queued')  # queued, processing, completed, failed, blocked
     cost_credits = db.Column(db.Integer, nullable=False, default=0)
     error_message = db.Column(db.Text, nullable=True)
+    # Skip the render cache and always ask the model for a new variation.
+    fresh = db.Column(db.Boolean, nullable=False, default=False)
 
     source_asset_id = db.Column(db.String(36), nullable=True)
+    batch_id = db.Column(db.String(36), db.ForeignKey('generation_batches.id'), nullable=True, index=True)
+    batch_index = db.Column(db.Integer, nullable=True)
+    source_key = db.Column(db.String(512), nullable=True)
+
+    render_profile = db.Column(db.String(20), nullable=True)
+    render_model = db.Column(db.String(80), nullable=True)
+    render_quality = db.Column(db.String(20), nullable=True)
+    estimated_cost_usd = db.Column(db.Float, nullable=True)
+
+    # Only set for jobs handed to the background worker queue.
+    queued_at = db.Column(db.DateTime, nullable=True, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    worker_id = db.Column(db.String(120), nullable=True)
+    # Claims so far; a job whose worker keeps dying is failed after GENERATION_MAX_ATTEMPTS.
+    attempts = db.Column(db.Integer, nullable=False, default=0)
 
     created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow, nullable=False)
     completed_at = db.Column(db.DateTime, nullable=True)
 
     user = db.relationship('User', back_populates='generation_jobs')
+    batch = db.relationship('GenerationBatch', back_populates='jobs')
     assets = db.relationship('GeneratedAsset', back_populates='job', cascade='all, delete-orphan', foreign_keys='GeneratedAsset.job_id')
 
 
+class GenerationBatch(db.Model):
+    __tablename__ = 'generation_batches'
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid_str)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, processing, completed, partial, failed
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    cost_credits = db.Column(db.Integer, nullable=False, default=0)
+    refunded_credits = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+
+    queued_at = db.Column(db.DateTime, nullable=True, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    worker_id = db.Column(db.String(120), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', back_populates='generation_batches')
+    jobs = db.relationship('GenerationJob', back_populates='batch', order_by='GenerationJob.batch_index')
+
+
 class GeneratedAsset(db.Model):
     __tablename__ = 'generated_assets'
 
@@ -194,6 +239,13 @@ class GeneratedAsset(db.Model):
     pdf_key = db.Column(db.String(512), nullable=False)
     png_url = db.Column(db.String(1024), nullable=True)
     pdf_url = db.Column(db.String(1024), nullable=True)
+    # Traced vector exports; absent on assets created before tracing was enabled.
+    svg_key = db.Column(db.String(512), nullable=True)
+    vector_pdf_key = db.Column(db.String(512), nullable=True)
+    svg_url = db.Column(db.String(1024), nullable=True)
+    vector_pdf_url = db.Column(db.String(1024), nullable=True)
+    # PNG encoder profile of the stored object; 'fast' PNGs are queued for recompression. Null = pre-profile (compact).
+    png_profile = db.Column(db.String(20), nullable=True, index=True)
 
     width = db.Column(db.Integer, nullable=True)
     height = db.Column(db.Integer, nullable=True)
@@ -203,6 +255,96 @@ class GeneratedAsset(db.Model):
     job = db.relationship('GenerationJob', back_populates='assets', foreign_keys=[job_id])
 
 
+class AssetDerivative(db.Model):
+    __tablename__ = 'asset_derivatives'
+    __table_args__ = (UniqueConstraint('source_key', 'width', 'fmt', name='uq_asset_derivative_variant'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Keyed by the source PNG rather than the asset: render-cache hits share one PNG, and its previews.
+    source_key = db.Column(db.String(512), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=False)
+    fmt = db.Column(db.String(10), nullable=False)
+    storage_key = db.Column(db.String(512), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+    last_used_at = db.Column(db.DateTime, default=_utcnow, nullable=False, index=True)
+
+
+class StoredBlob(db.Model):
+    """A content-addressed object: the key is the SHA-256 of the bytes first written under it.
+
+    PNG recompression may later swap in a smaller lossless encoding of the same pixels.
+    """
+
+    __tablename__ = 'stored_blobs'
+
+    key = db.Column(db.String(512), primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+    # Bumped whenever a reference is added or released; the sweeper waits out a grace period from here.
+    last_referenced_at = db.Column(db.DateTime, default=_utcnow, nullable=False, index=True)
+
+
+class BlobRef(db.Model):
+    __tablename__ = 'blob_refs'
+    __table_args__ = (
+        UniqueConstraint('blob_key', 'owner_type', 'owner_id', name='uq_blob_ref_owner'),
+        db.Index('ix_blob_refs_owner', 'owner_type', 'owner_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    blob_key = db.Column(db.String(512), db.ForeignKey('stored_blobs.key'), nullable=False, index=True)
+    # 'asset' (GeneratedAsset.id) or 'job_source' (GenerationJob.id for a queued photo upload).
+    owner_type = db.Column(db.String(20), nullable=False)
+    owner_id = db.Column(db.String(36), nullable=False)
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+
+
+class ColoringBook(db.Model):
+    __tablename__ = 'coloring_books'
+
+    id = db.Column(db.String(36), primary_key=True, default=_uuid_str)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+
+    title = db.Column(db.String(200), nullable=True)
+    page_count = db.Column(db.Integer, nullable=False)
+    page_size = db.Column(db.String(20), nullable=False, default='letter')
+    margin_in = db.Column(db.Float, nullable=False, default=0.5)
+
+    pdf_key = db.Column(db.String(512), nullable=False)
+    pdf_url = db.Column(db.String(1024), nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+
+    user = db.relationship('User', back_populates='coloring_books')
+
+
+class RenderCacheEntry(db.Model):
+    __tablename__ = 'render_cache_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    mode = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(80), nullable=False)
+    quality = db.Column(db.String(20), nullable=False)
+
+    png_key = db.Column(db.String(512), nullable=False)
+    pdf_key = db.Column(db.String(512), nullable=False)
+    svg_key = db.Column(db.String(512), nullable=True)
+    vector_pdf_key = db.Column(db.String(512), nullable=True)
+    png_profile = db.Column(db.String(20), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False, index=True)
+    last_used_at = db.Column(db.DateTime, default=_utcnow, nullable=False, index=True)
+
+
 class PromptPreset(db.Model):
     __tablename__ = 'prompt_presets'
 
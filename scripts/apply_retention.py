@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Apply asset retention: expire assets and books per plan, drop leftover job uploads and, optionally, orphaned objects."""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from colorfulme.app_factory import create_app  # noqa: E402
+from colorfulme.services.asset_lifecycle import AssetLifecycleManager  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Apply ASSET_RETENTION_DAYS and clean up stored objects')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+    parser.add_argument('--max-assets', type=int, default=None, help='Expire at most this many assets (default: all)')
+    parser.add_argument('--orphans', action='store_true', help='Also delete objects no database row refers to')
+    parser.add_argument(
+        '--prefix',
+        default=None,
+        help="Limit the orphan scan to keys under this prefix (default: the app's own key prefixes; '' scans everything)",
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        manager = AssetLifecycleManager()
+        report = manager.run(
+            dry_run=args.dry_run,
+            max_assets=args.max_assets,
+            orphans=args.orphans,
+            orphan_prefix=args.prefix,
+        )
+
+    verb = 'would remove' if args.dry_run else 'removed'
+    by_plan = ', '.join(f'{plan}: {count}' for plan, count in sorted(report.assets_by_plan.items())) or 'none'
+    print(f'retention: {manager.retention or "not configured"}')
+    print(f'{verb} {report.assets} asset(s) ({by_plan})')
+    print(f'{verb} {report.books} coloring book(s)')
+    print(f'{verb} {report.job_sources} leftover job upload(s)')
+    print(f'{verb} {report.objects_deleted} object(s); {report.blobs_released} blob(s) released to the sweeper')
+    if args.orphans:
+        print(f'{verb} {report.orphans} orphaned object(s), {report.orphan_bytes / 1024:.0f} KB')
+    if report.failed:
+        print(f'{report.failed} object(s) could not be deleted')
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Measure fallback-render throughput inline (request threads) vs. on the CPU process pool."""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from colorfulme.services.render_tasks import LocalRender, RenderTask, run_render_task  # noqa: E402
+from colorfulme.utils.executors import get_process_pool, shutdown_executors  # noqa: E402
+
+
+def _task(index: int) -> RenderTask:
+    # What GenerationService._render builds for a fake-AI text job with the default settings.
+    return RenderTask(
+        png_bytes=None,
+        local=LocalRender(prompt=f'benchmark page {index}', mode='text', style=None, aspect_ratio='1:1'),
+        pipeline='auto',
+        output_mode='rgb',
+        page_size='letter',
+        png_profile='fast',
+        vector_export=True,
+        preview_sizes=((256, 'webp'), (1024, 'webp')),
+    )
+
+
+def _run(workers: int, renders: int, threads: int) -> float:
+    if workers:
+        pool = get_process_pool(f'benchmark-{workers}', workers)
+        # Start every child before timing, as a long-lived web worker would have.
+        list(pool.map(run_render_task, [_task(index) for index in range(workers)]))
+
+        def render(index):
+            return pool.submit(run_render_task, _task(index)).result()
+    else:
+        render = lambda index: run_render_task(_task(index))  # noqa: E731
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as request_threads:
+        list(request_threads.map(render, range(renders)))
+    return renders / (time.perf_counter() - started)
+
+
+def main() -> int:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Benchmark CPU_POOL_WORKERS against inline rendering')
+    parser.add_argument('--renders', type=int, default=24, help='Renders per run (default: 24)')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads (default: 8)')
+    parser.add_argument(
+        '--workers',
+        default=','.join(str(count) for count in sorted({0, 1, 2, cores // 2 or 1, cores})),
+        help='Comma-separated CPU_POOL_WORKERS values; 0 renders inline (default: 0,1,2,cores/2,cores)',
+    )
+    args = parser.parse_args()
+
+    print(f'{cores} CPU core(s), {args.renders} renders from {args.threads} request threads')
+    print(f"{'workers':<10}{'renders/s':>11}{'speedup':>10}")
+    baseline = None
+    try:
+        for workers in (int(value) for value in args.workers.split(',')):
+            throughput = _run(workers, args.renders, args.threads)
+            baseline = baseline or throughput
+            label = 'inline' if workers == 0 else str(workers)
+            print(f'{label:<10}{throughput:>11.2f}{throughput / baseline:>9.2f}x')
+    finally:
+        shutdown_executors()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Measure the deterministic fallback renderer: frame drawing, and renders/s for new vs. repeated prompts."""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from colorfulme.app_factory import create_app  # noqa: E402
+from colorfulme.services import render_tasks  # noqa: E402
+from colorfulme.services.generation_service import GenerationService, clear_placeholder_renders  # noqa: E402
+from colorfulme.services.render_tasks import LocalRender, RenderTask  # noqa: E402
+
+
+def _per_second(fn, count: int) -> float:
+    started = time.perf_counter()
+    for index in range(count):
+        fn(index)
+    return count / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the fallback renderer caches')
+    parser.add_argument('--draws', type=int, default=200, help='Placeholder draws per case (default: 200)')
+    parser.add_argument('--renders', type=int, default=20, help='Full renders per case (default: 20)')
+    args = parser.parse_args()
+
+    width, height = render_tasks.aspect_ratio_to_dims('1:1')
+
+    def draw_uncached(index):
+        render_tasks._frame.cache_clear()
+        render_tasks.draw_placeholder(f'page {index}', None, width, height)
+
+    def draw_cached(index):
+        render_tasks.draw_placeholder(f'page {index}', None, width, height)
+
+    print(f"{'case':<34}{'per second':>12}")
+    print(f"{'draw, frame redrawn':<34}{_per_second(draw_uncached, args.draws):>12.1f}")
+    print(f"{'draw, cached frame':<34}{_per_second(draw_cached, args.draws):>12.1f}")
+
+    app = create_app()
+    with app.app_context():
+        service = GenerationService()
+
+        def render(prompt):
+            task = RenderTask(
+                png_bytes=None,
+                local=LocalRender(prompt=prompt, mode='text', style=None, aspect_ratio='1:1'),
+                pipeline=service.line_art_pipeline,
+                output_mode=service.output_mode,
+                page_size=service.vector_page_size,
+                png_profile=service.png_profile,
+                vector_export=service.vector_export,
+                preview_sizes=tuple(service.derivatives.warm_sizes),
+            )
+            service._run_cpu_task(task)
+
+        clear_placeholder_renders()
+        print(f"{'render, new prompt each time':<34}{_per_second(lambda index: render(f'page {index}'), args.renders):>12.1f}")
+        render('repeated page')
+        print(f"{'render, repeated prompt':<34}{_per_second(lambda index: render('repeated page'), args.renders * 100):>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
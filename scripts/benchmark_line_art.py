@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Compare the PIL and numpy line-art pipelines on render-sized inputs."""
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from colorfulme.services import line_art  # noqa: E402
+
+
+SIZES = ((1024, 1024), (1536, 1024))
+
+
+def _sample_render(width: int, height: int, seed: int) -> Image.Image:
+    # Grey-ish outlines on an off-white background, with a little noise, like a raw model render.
+    rng = random.Random(seed)
+    image = Image.new('L', (width, height), 236)
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, 400), y0 + rng.randrange(20, 400)
+        draw.ellipse((x0, y0, x1, y1), outline=rng.randrange(10, 90), width=rng.randrange(2, 6))
+    noise = Image.effect_noise((width, height), 24).filter(ImageFilter.BoxBlur(1))
+    return Image.blend(image, noise, 0.15)
+
+
+def _time(fn, image: Image.Image, pipeline: str, iterations: int) -> tuple[float, Image.Image]:
+    result = fn(image, pipeline=pipeline)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = fn(image, pipeline=pipeline)
+    return (time.perf_counter() - started) / iterations * 1000, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark line-art post-processing pipelines')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed runs per case (default: 10)')
+    args = parser.parse_args()
+
+    if line_art.np is None:
+        print('numpy is not installed; only the PIL pipeline is available.')
+        return 1
+
+    print(f"{'step':<16}{'size':<12}{'pil ms':>10}{'numpy ms':>10}{'speedup':>10}  identical")
+    for width, height in SIZES:
+        image = _sample_render(width, height, seed=width * height)
+        for name, fn in (('clean_line_art', line_art.clean_line_art), ('photo_edges', line_art.photo_edges)):
+            pil_ms, pil_out = _time(fn, image, 'pil', args.iterations)
+            np_ms, np_out = _time(fn, image, 'numpy', args.iterations)
+            identical = pil_out.tobytes() == np_out.tobytes()
+            print(
+                f'{name:<16}{f"{width}x{height}":<12}{pil_ms:>10.1f}{np_ms:>10.1f}'
+                f'{pil_ms / np_ms:>9.1f}x  {"yes" if identical else "NO"}'
+            )
+            if not identical:
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compare peak memory of the bounded photo upload path with a full decode of a large JPEG."""
+import argparse
+import base64
+from io import BytesIO
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image, ImageDraw, ImageOps  # noqa: E402
+
+from colorfulme.services import uploads  # noqa: E402
+
+
+MODES = ('full', 'bounded')
+PAGE_SIZE = (1536, 1024)
+
+
+def _write_photo(path: str, megapixels: float) -> None:
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = width * 2 // 3
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for step in range(40):
+        x = step * width // 40
+        draw.ellipse((x, height // 4, x + width // 8, height // 4 + width // 8), outline=(200, 40, 40), width=12)
+    image.save(path, format='JPEG', quality=90)
+
+
+def _full(data_url: str) -> tuple[int, int]:
+    # The old path: decode the whole data URL, then the whole photo, then fit it to the page.
+    raw = base64.b64decode(data_url.split(',', 1)[1])
+    image = Image.open(BytesIO(raw)).convert('RGB')
+    return ImageOps.grayscale(ImageOps.fit(image, PAGE_SIZE, method=Image.Resampling.LANCZOS)).size
+
+
+def _bounded(data_url: str) -> tuple[int, int]:
+    with uploads.spool_base64(data_url, max_bytes=sys.maxsize) as upload:
+        source = uploads.prepare_source_image(upload, max_decode_bytes=sys.maxsize)
+    # Same decode as OpenAIClient._photo_to_line_art.
+    image = Image.open(BytesIO(source))
+    image.draft('L', (max(PAGE_SIZE), max(PAGE_SIZE)))
+    return ImageOps.fit(image.convert('L'), PAGE_SIZE, method=Image.Resampling.LANCZOS).size
+
+
+def _run_mode(mode: str, path: str) -> dict:
+    with open(path, 'rb') as handle:
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(handle.read()).decode('ascii')
+    # ru_maxrss is KiB on Linux; measure what the request adds on top of holding the body.
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    started = time.perf_counter()
+    (_full if mode == 'full' else _bounded)(data_url)
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'peak_rss_mb': round(peak_mb, 1),
+        'added_rss_mb': round(peak_mb - baseline_mb, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark photo upload decoding')
+    parser.add_argument('--megapixels', type=float, default=40, help='Size of the test JPEG (default: 40)')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--photo', help=argparse.SUPPRESS)
+    parser.add_argument('--write-photo', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.write_photo:
+        _write_photo(args.photo, args.megapixels)
+        return 0
+    if args.mode:
+        print(json.dumps(_run_mode(args.mode, args.photo)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'photo.jpg')
+        # Built in a child too: Linux carries peak RSS across fork/exec, which would skew the runs below.
+        subprocess.run(
+            [sys.executable, __file__, '--write-photo', '--photo', path, '--megapixels', str(args.megapixels)],
+            check=True,
+        )
+        print(f'{args.megapixels:g} MP JPEG, {os.path.getsize(path) / 1024 / 1024:.1f} MB')
+        print(f"{'mode':<10}{'seconds':>10}{'peak RSS MB':>14}{'added RSS MB':>15}")
+        # Each mode runs in a fresh process so peak RSS is not shared between them.
+        for mode in MODES:
+            completed = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--photo', path],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            result = json.loads(completed.stdout)
+            print(
+                f"{result['mode']:<10}{result['seconds']:>10.2f}{result['peak_rss_mb']:>14.1f}{result['added_rss_mb']:>15.1f}"
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
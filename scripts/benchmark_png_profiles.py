@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Report encode time and file size of each PNG encoder profile for rgb and bilevel pages."""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from colorfulme.services.render_artifact import OUTPUT_MODES, PNG_PROFILES, RenderArtifact, encode_png  # noqa: E402
+from report_output_modes import SIZES, _sample_page  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the fast and compact PNG encoder profiles')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed encodes per case (default: 5)')
+    args = parser.parse_args()
+
+    print(f"{'size':<12}{'mode':<9}{'profile':<9}{'png KB':>9}{'encode ms':>11}")
+    for width, height in SIZES:
+        page = _sample_page(width, height, seed=width + height)
+        for mode in OUTPUT_MODES:
+            image = RenderArtifact(page, output_mode=mode)._page_image()
+            for profile in PNG_PROFILES:
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    encoded = encode_png(image, profile)
+                elapsed = (time.perf_counter() - started) / args.iterations
+                print(f'{f"{width}x{height}":<12}{mode:<9}{profile:<9}{len(encoded) / 1024:>9.1f}{elapsed * 1000:>11.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare the decode-once render pipeline with the old encode/decode chain under concurrent load."""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from colorfulme.services import line_art  # noqa: E402
+from colorfulme.services.pdf_service import PdfService  # noqa: E402
+from colorfulme.services.render_artifact import RenderArtifact  # noqa: E402
+
+
+MODES = ('chained', 'artifact')
+
+
+def _raw_render(index: int) -> Image.Image:
+    image = Image.new('RGB', (1536, 1024), 'white')
+    draw = ImageDraw.Draw(image)
+    for step in range(12):
+        offset = (index * 37 + step * 53) % 600
+        draw.ellipse((offset, offset // 2, offset + 500, offset // 2 + 400), outline='black', width=4)
+    return image
+
+
+def _chained(index: int) -> int:
+    # The pre-artifact pipeline: every stage re-parsed the previous stage's PNG.
+    buffer = BytesIO()
+    _raw_render(index).save(buffer, format='PNG', optimize=True)
+    gray = Image.open(BytesIO(buffer.getvalue())).convert('L')
+    clean = line_art.clean_line_art(gray).convert('RGB')
+    out = BytesIO()
+    clean.save(out, format='PNG', optimize=True)
+    png = out.getvalue()
+    pdf = PdfService.png_to_pdf_bytes(png)
+    Image.open(BytesIO(png)).size  # Dimensions were read back from the PNG as well.
+    return len(png) + len(pdf)
+
+
+def _artifact(index: int) -> int:
+    artifact = RenderArtifact(line_art.clean_line_art(_raw_render(index).convert('L')))
+    size = artifact.size_bytes
+    artifact.release_pixels()
+    return size
+
+
+def _run_mode(mode: str, renders: int, concurrency: int) -> dict:
+    fn = _chained if mode == 'chained' else _artifact
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fn, range(renders)))
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is KiB on Linux.
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'mode': mode, 'seconds': round(elapsed, 2), 'peak_rss_mb': round(peak_mb, 1)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark render post-processing under concurrent load')
+    parser.add_argument('--renders', type=int, default=32, help='Renders per mode (default: 32)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent renders (default: 8)')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(_run_mode(args.mode, args.renders, args.concurrency)))
+        return 0
+
+    # Each mode runs in a fresh process so peak RSS is not shared between them.
+    print(f"{'mode':<10}{'seconds':>10}{'peak RSS MB':>14}")
+    for mode in MODES:
+        completed = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--renders', str(args.renders), '--concurrency', str(args.concurrency)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        result = json.loads(completed.stdout)
+        print(f"{result['mode']:<10}{result['seconds']:>10.2f}{result['peak_rss_mb']:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
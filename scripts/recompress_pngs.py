@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Recompress fast-profile PNGs with the compact profile, replacing the stored objects in place."""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from colorfulme.app_factory import create_app  # noqa: E402
+from colorfulme.services.png_recompress import pending_keys, recompress_pending  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Swap fast-profile PNGs for compact ones')
+    parser.add_argument('--batch-size', type=int, default=50, help='Objects per pass (default: 50)')
+    parser.add_argument('--max-objects', type=int, default=None, help='Stop after this many objects (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='Only count pending objects')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.dry_run:
+            print(f'{len(pending_keys(sys.maxsize))} PNG object(s) pending recompression')
+            return 0
+
+        done = failed = before = after = 0
+        while args.max_objects is None or done + failed < args.max_objects:
+            limit = args.batch_size if args.max_objects is None else min(args.batch_size, args.max_objects - done - failed)
+            report = recompress_pending(limit)
+            if not report.objects and not report.failed:
+                break
+            done += report.objects
+            failed += report.failed
+            before += report.bytes_before
+            after += report.bytes_after
+
+        saved = before - after
+        ratio = f' ({saved / before:.1%})' if before else ''
+        print(f'recompressed {done} object(s), {failed} failed; {before / 1024:.0f} KB -> {after / 1024:.0f} KB, saved {saved / 1024:.0f} KB{ratio}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Report raster memory, file size and encode time for the rgb and bilevel output modes."""
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from colorfulme.services import line_art  # noqa: E402
+from colorfulme.services.render_artifact import OUTPUT_MODES, RenderArtifact  # noqa: E402
+
+
+SIZES = ((1024, 1024), (1536, 1024))
+
+
+def _sample_page(width: int, height: int, seed: int) -> Image.Image:
+    rng = random.Random(seed)
+    image = Image.new('L', (width, height), 240)
+    draw = ImageDraw.Draw(image)
+    for _ in range(80):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(30, 420), y0 + rng.randrange(30, 420)
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), outline=rng.randrange(0, 60), width=rng.randrange(2, 7))
+        else:
+            draw.line((x0, y0, x1, y1), fill=rng.randrange(0, 60), width=rng.randrange(2, 7))
+    return line_art.clean_line_art(image)
+
+
+def _raster_bytes(artifact: RenderArtifact) -> int:
+    if artifact.output_mode == 'bilevel':
+        return (artifact.width + 7) // 8 * artifact.height
+    return artifact.width * artifact.height * 3
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Compare rgb and bilevel line-art output')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed encodes per case (default: 5)')
+    args = parser.parse_args()
+
+    print(f"{'size':<12}{'mode':<9}{'raster KB':>11}{'png KB':>9}{'pdf KB':>9}{'png ms':>9}{'pdf ms':>9}")
+    for width, height in SIZES:
+        page = _sample_page(width, height, seed=width + height)
+        for mode in OUTPUT_MODES:
+            png_ms = pdf_ms = 0.0
+            for _ in range(args.iterations):
+                artifact = RenderArtifact(page, output_mode=mode)
+                started = time.perf_counter()
+                png = artifact.png
+                png_ms += time.perf_counter() - started
+                started = time.perf_counter()
+                pdf = artifact.pdf
+                pdf_ms += time.perf_counter() - started
+            print(
+                f'{f"{width}x{height}":<12}{mode:<9}{_raster_bytes(artifact) / 1024:>11.0f}'
+                f'{len(png) / 1024:>9.1f}{len(pdf) / 1024:>9.1f}'
+                f'{png_ms / args.iterations * 1000:>9.1f}{pdf_ms / args.iterations * 1000:>9.1f}'
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
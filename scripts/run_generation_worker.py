@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Run the ColorfulMe background generation worker."""
+import argparse
+import os
+import signal
+import sys
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from colorfulme.app_factory import create_app  # noqa: E402
+from colorfulme.services.job_queue import run_worker  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Claim queued generation jobs and render them')
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=None,
+        help='Jobs processed in parallel by this worker (default: GENERATION_WORKER_CONCURRENCY)',
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=None,
+        help='Seconds to wait when the queue is empty (default: GENERATION_WORKER_POLL_SECONDS)',
+    )
+    parser.add_argument('--worker-id', default=None, help='Identifier recorded on claimed jobs')
+    args = parser.parse_args()
+
+    app = create_app()
+    stop_event = threading.Event()
+
+    def _stop(_signum, _frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    run_worker(
+        app,
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        stop_event=stop_event,
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Delete content-addressed blobs that no asset or job references any more."""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import exists  # noqa: E402
+
+from colorfulme.app_factory import create_app  # noqa: E402
+from colorfulme.services.blob_store import BlobStore  # noqa: E402
+from extensions import db  # noqa: E402
+from models import BlobRef, StoredBlob  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Garbage-collect unreferenced blobs')
+    parser.add_argument('--batch-size', type=int, default=100, help='Blobs per pass (default: 100)')
+    parser.add_argument('--dry-run', action='store_true', help='Only count unreferenced blobs')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.dry_run:
+            count, size = (
+                db.session.query(db.func.count(StoredBlob.key), db.func.coalesce(db.func.sum(StoredBlob.size_bytes), 0))
+                .filter(~exists().where(BlobRef.blob_key == StoredBlob.key))
+                .one()
+            )
+            print(f'{count} unreferenced blob(s), {size / 1024:.0f} KB (swept once older than the grace period)')
+            return 0
+
+        store = BlobStore()
+        swept = failed = freed = 0
+        while True:
+            report = store.sweep(args.batch_size)
+            swept += report.blobs
+            failed += report.failed
+            freed += report.bytes_freed
+            if report.blobs < args.batch_size:
+                break
+
+        print(f'swept {swept} blob(s), {failed} failed; freed {freed / 1024:.0f} KB')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -32,6 +32,7 @@ def app(tmp_path, monkeypatch):
     monkeypatch.setenv('STRICT_MODERATION', 'true')
     monkeypatch.setenv('SESSION_SECRET', 'test-secret')
     monkeypatch.setenv('DATABASE_URL', f'sqlite:///{db_path}')
+    monkeypatch.setenv('MODEL_HEALTH_DB_PATH', str(tmp_path / 'model_health.sqlite3'))
     monkeypatch.setenv('PROGRAMMATIC_CONTENT_MANIFEST', str(manifest_path))
     monkeypatch.setenv('OPENAI_API_KEY', '')
     monkeypatch.setenv('STRIPE_SECRET_KEY', '')
@@ -65,3 +66,16 @@ def login_user(client):
         return verify.get_json()['user']
 
     return _login
+
+
+@pytest.fixture()
+def generate_asset(client):
+    def _generate(prompt='A lighthouse at dusk', aspect_ratio='1:1'):
+        response = client.post(
+            '/api/v1/generations/text',
+            json={'prompt': prompt, 'aspect_ratio': aspect_ratio, 'fresh': True},
+        )
+        assert response.status_code == 200
+        return response.get_json()['job']['asset']
+
+    return _generate
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+
+def _age_blobs(seconds):
+    from extensions import db
+    from models import StoredBlob
+    from colorfulme.utils.security import utcnow
+
+    StoredBlob.query.update({'last_referenced_at': utcnow() - timedelta(seconds=seconds)})
+    db.session.commit()
+
+
+def test_identical_renders_share_one_stored_copy(client, app, login_user, generate_asset):
+    from models import AssetDerivative, BlobRef, GeneratedAsset, StoredBlob
+    from colorfulme.utils import metrics
+
+    login_user('blob-dedup@example.com')
+    deduplicated = metrics.get('blobs.deduplicated')
+    first = generate_asset('A bear flying a kite')
+    second = generate_asset('A bear flying a kite')
+
+    assert metrics.get('blobs.deduplicated') == deduplicated + 4
+    with app.app_context():
+        assets = GeneratedAsset.query.all()
+        assert len(assets) == 2
+        assert assets[0].png_key == assets[1].png_key
+        assert assets[0].png_key.startswith('blobs/')
+        assert StoredBlob.query.count() == 4
+        assert BlobRef.query.count() == 8
+        assert AssetDerivative.query.count() == 2
+
+    assert client.get(f"/api/v1/assets/{second['asset_id']}/download?format=png").data == (
+        client.get(f"/api/v1/assets/{first['asset_id']}/download?format=png").data
+    )
+
+
+def test_sweep_removes_only_unreferenced_blobs_past_the_grace_period(client, app, login_user, generate_asset):
+    from extensions import db
+    from models import AssetDerivative, BlobRef, GeneratedAsset, StoredBlob
+    from colorfulme.services.blob_store import BlobStore
+
+    login_user('blob-sweep@example.com')
+    kept = generate_asset('A whale with a hat')
+    dropped = generate_asset('A cat on a unicycle')
+
+    with app.app_context():
+        store = BlobStore()
+        store.release(owner_type='asset', owner_id=dropped['asset_id'])
+        db.session.commit()
+        assert store.sweep().blobs == 0  # still inside the grace period
+
+        _age_blobs(2 * 3600)
+        dropped_asset = db.session.get(GeneratedAsset, dropped['asset_id'])
+        dropped_path = store.storage.absolute_local_path(dropped_asset.png_key)
+        report = store.sweep()
+
+        assert report.blobs == 4
+        assert report.bytes_freed > 0
+        assert not dropped_path.exists()
+        assert {row.blob_key for row in BlobRef.query.all()} == {row.key for row in StoredBlob.query.all()}
+        assert {row.source_key for row in AssetDerivative.query.all()} == {
+            db.session.get(GeneratedAsset, kept['asset_id']).png_key
+        }
+
+    assert client.get(f"/api/v1/assets/{kept['asset_id']}/download?format=png").status_code == 200
+
+
+def test_render_cache_hit_references_the_cached_blobs(client, app, login_user):
+    from extensions import db
+    from models import BlobRef, GeneratedAsset, RenderCacheEntry
+    from colorfulme.services.blob_store import BlobStore
+
+    login_user('blob-cache@example.com')
+    payload = {'prompt': 'A duck in a raincoat', 'aspect_ratio': '1:1'}
+    first = client.post('/api/v1/generations/text', json=payload).get_json()['job']['asset']
+    second = client.post('/api/v1/generations/text', json=payload).get_json()['job']['asset']
+
+    with app.app_context():
+        assert BlobRef.query.filter_by(owner_id=second['asset_id']).count() == 4
+
+        store = BlobStore()
+        store.release(owner_type='asset', owner_id=first['asset_id'])
+        store.release(owner_type='asset', owner_id=second['asset_id'])
+        db.session.commit()
+        _age_blobs(2 * 3600)
+        store.sweep()
+
+        # The cache entry went with its blobs, so the next request renders again.
+        assert RenderCacheEntry.query.count() == 0
+
+    third = client.post('/api/v1/generations/text', json=payload).get_json()['job']['asset']
+    with app.app_context():
+        assert db.session.get(GeneratedAsset, third['asset_id']).png_key.startswith('blobs/')
+    assert client.get(f"/api/v1/assets/{third['asset_id']}/download?format=png").status_code == 200
@@ -0,0 +1,69 @@
+import re
+
+
+def test_book_assembles_pages_in_order_and_supports_ranges(client, app, login_user, generate_asset):
+    login_user('book@example.com')
+    vector_page = generate_asset('A sleepy owl', '16:9')['asset_id']
+    app.config.update(VECTOR_EXPORT_ENABLED=False)
+    raster_page = generate_asset('A rocket ship')['asset_id']
+
+    response = client.post(
+        '/api/v1/books',
+        json={
+            'asset_ids': [raster_page, vector_page, raster_page],
+            'page_size': 'a4',
+            'margin_in': 0.75,
+            'cover': {'title': 'My (Space) Book', 'subtitle': 'Volume 1'},
+        },
+    )
+    assert response.status_code == 201
+    book = response.get_json()['book']
+    assert book['page_count'] == 4
+    assert book['title'] == 'My (Space) Book'
+
+    pdf = client.get(book['download_url'])
+    assert pdf.status_code == 200
+    data = pdf.data
+    assert data.startswith(b'%PDF') and data.rstrip().endswith(b'%%EOF')
+    assert b'/Count 4' in data
+    assert data.count(b'/MediaBox [0 0 595.28 841.89]') == 4
+    # The raster pages reuse the PNG data behind a predictor; the vector page is embedded as a form.
+    # The repeated raster page draws the same image object rather than a second copy.
+    assert data.count(b'/Predictor 15') == 1
+    assert data.count(b'/Subtype /Form') == 1
+
+    # Every xref entry points at the object it names.
+    xref = int(re.search(rb'startxref\n(\d+)', data).group(1))
+    entries = re.findall(rb'(\d{10}) 00000 n', data[xref:])
+    for number, offset in enumerate(entries, start=1):
+        assert data[int(offset):].startswith(b'%d 0 obj' % number)
+
+    partial = client.get(book['download_url'], headers={'Range': 'bytes=0-99'})
+    assert partial.status_code == 206
+    assert partial.data == data[:100]
+
+
+def test_book_rejects_unknown_or_foreign_assets(client, login_user, generate_asset):
+    login_user('book-owner@example.com')
+    own_page = generate_asset('A friendly robot')['asset_id']
+    client.post('/auth/logout')
+    login_user('book-other@example.com')
+
+    response = client.post('/api/v1/books', json={'asset_ids': [own_page]})
+    assert response.status_code == 400
+    assert 'Unknown asset ids' in response.get_json()['error']
+
+    response = client.post('/api/v1/books', json={'asset_ids': [], 'page_size': 'legal'})
+    assert response.status_code == 400
+
+    response = client.post('/api/v1/books', json={'asset_ids': [{'a': 1}]})
+    assert response.status_code == 400
+    assert 'asset id strings' in response.get_json()['error']
+
+    # Checked before anything is rendered or uploaded; the title column holds 200 characters.
+    response = client.post('/api/v1/books', json={'asset_ids': [own_page], 'cover': {'title': 'x' * 201}})
+    assert response.status_code == 400
+    assert 'at most 200 characters' in response.get_json()['error']
+
+    response = client.post('/api/v1/books', json={'asset_ids': [own_page], 'cover': {'title': 'Book', 'subtitle': 'x' * 301}})
+    assert response.status_code == 400
@@ -0,0 +1,71 @@
+def test_direct_delivery_answers_ranges_and_revalidation(client, login_user, generate_asset):
+    login_user('direct@example.com')
+    asset = generate_asset()
+    url = f"/api/v1/assets/{asset['asset_id']}/download?format=png"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'max-age=31536000, immutable, private'
+
+    partial = client.get(url, headers={'Range': 'bytes=0-7'})
+    assert partial.status_code == 206
+    assert partial.data == b'\x89PNG\r\n\x1a\n'
+
+    cached = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    signed_path = asset['png_url'].split('localhost', 1)[1]
+    signed = client.get(signed_path)
+    assert signed.status_code == 200
+    assert signed.data == response.data
+    assert 'private' in signed.headers['Cache-Control']
+    assert signed.cache_control.max_age <= 3600
+
+    # Blob keys are content hashes, so the bare or re-signed path is refused.
+    assert client.get(signed_path.split('?', 1)[0]).status_code == 403
+    assert client.get(signed_path.replace('signature=', 'signature=0')).status_code == 403
+
+
+def test_proxy_delivery_modes_hand_off_the_transfer(client, app, login_user, generate_asset):
+    login_user('proxy@example.com')
+    asset = generate_asset()
+    url = f"/api/v1/assets/{asset['asset_id']}/download?format=pdf"
+
+    app.config.update(LOCAL_DELIVERY_MODE='x-accel-redirect', LOCAL_ACCEL_REDIRECT_PREFIX='/_protected/generated/')
+    accel = client.get(url)
+    assert accel.status_code == 200
+    assert accel.data == b''
+    assert accel.headers['X-Accel-Redirect'].startswith('/_protected/generated/')
+    assert accel.headers['X-Accel-Redirect'].endswith('.pdf')
+    assert accel.headers['Content-Type'] == 'application/pdf'
+    assert accel.headers['Content-Disposition'] == f"attachment; filename={asset['asset_id']}.pdf"
+    assert 'immutable' in accel.headers['Cache-Control']
+
+    app.config.update(LOCAL_DELIVERY_MODE='x-sendfile', USE_X_SENDFILE=True)
+    sendfile = client.get(url)
+    assert sendfile.status_code == 200
+    assert sendfile.headers['X-Sendfile'].endswith('.pdf')
+    assert sendfile.data == b''
+
+
+def test_signed_local_urls_expire(app, monkeypatch):
+    from colorfulme.services import storage_service
+    from colorfulme.services.storage_service import StorageService
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(storage_service.time, 'time', lambda: now[0])
+    with app.test_request_context():
+        storage = StorageService()
+        url = storage.get_download_url('blobs/ab/page.png')
+        assert storage.get_download_url('blobs/ab/page.png') == url
+        params = dict(part.split('=', 1) for part in url.split('?', 1)[1].split('&'))
+        assert storage.local_url_expiry('blobs/ab/page.png', params['expires'], params['signature']) is not None
+        assert storage.local_url_expiry('blobs/ab/other.png', params['expires'], params['signature']) is None
+
+        now[0] = int(params['expires']) + 1
+        assert storage.local_url_expiry('blobs/ab/page.png', params['expires'], params['signature']) is None
+
+
+def test_local_asset_route_rejects_paths_outside_storage(client):
+    assert client.get('/assets/local/../colorfulme.db').status_code == 404
+    assert client.get('/assets/local/%2E%2E/%2E%2E/app.py').status_code == 404
@@ -0,0 +1,59 @@
+from io import BytesIO
+
+from PIL import Image
+
+
+def test_common_previews_are_warmed_at_generation(client, app, login_user, monkeypatch, generate_asset):
+    from models import AssetDerivative
+    from colorfulme.services.derivative_service import DerivativeService
+
+    login_user('preview-warm@example.com')
+    asset = generate_asset('A turtle reading a book', '16:9')
+    assert asset['preview_url'].endswith('preview?w=256&fmt=webp')
+
+    with app.app_context():
+        variants = sorted((row.width, row.fmt) for row in AssetDerivative.query.all())
+        assert variants == [(256, 'webp'), (1024, 'webp')]
+
+    monkeypatch.setattr(DerivativeService, '_add', lambda *args: (_ for _ in ()).throw(AssertionError('re-rendered')))
+    response = client.get(asset['preview_url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['ETag']
+    assert Image.open(BytesIO(response.data)).size == (256, 144)
+
+    cached = client.get(asset['preview_url'], headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_preview_is_rendered_once_on_demand(client, app, login_user, generate_asset):
+    from models import AssetDerivative
+
+    login_user('preview-demand@example.com')
+    asset = generate_asset('A turtle reading a book', '16:9')
+
+    first = client.get(f"/api/v1/assets/{asset['asset_id']}/preview?w=300&fmt=png")
+    assert first.status_code == 200
+    assert Image.open(BytesIO(first.data)).size == (512, 288)
+
+    second = client.get(f"/api/v1/assets/{asset['asset_id']}/preview?w=512&fmt=png")
+    assert second.data == first.data
+    with app.app_context():
+        assert AssetDerivative.query.filter_by(width=512, fmt='png').count() == 1
+
+    assert client.get(f"/api/v1/assets/{asset['asset_id']}/preview?w=256&fmt=gif").status_code == 400
+
+
+def test_preview_cache_evicts_least_recently_used(client, app, login_user, generate_asset):
+    from models import AssetDerivative
+
+    login_user('preview-evict@example.com')
+    app.config.update(DERIVATIVE_WARM_SIZES='', DERIVATIVE_CACHE_MAX_ENTRIES=2, DERIVATIVE_CACHE_EVICT_INTERVAL_SECONDS=0)
+    asset = generate_asset('A turtle reading a book', '16:9')
+
+    for width in (128, 256, 512):
+        assert client.get(f"/api/v1/assets/{asset['asset_id']}/preview?w={width}&fmt=png").status_code == 200
+
+    with app.app_context():
+        assert sorted(row.width for row in AssetDerivative.query.all()) == [256, 512]
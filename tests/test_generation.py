@@ -85,3 +85,329 @@ def test_explicit_premium_quality_profile(client, login_user):
     assert response.status_code == 200
     data = response.get_json()
     assert data['render']['profile'] == 'premium'
+
+
+def test_batch_generation_debits_once(client, app, login_user):
+    from models import CreditLedger
+
+    user = login_user('batch@example.com')
+
+    response = client.post(
+        '/api/v1/generations/batch',
+        json={
+            'items': [
+                {'prompt': 'A lighthouse by the sea', 'aspect_ratio': '1:1'},
+                {'prompt': 'A fox in a forest', 'aspect_ratio': '16:9'},
+                {'prompt': 'nude explicit content'},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['status'] == 'partial'
+    assert len(data['job_ids']) == 3
+    assert data['credits_used'] == 2
+    statuses = [item['status'] for item in data['batch']['items']]
+    assert statuses == ['completed', 'completed', 'blocked']
+
+    with app.app_context():
+        debits = CreditLedger.query.filter_by(user_id=user['id'], reason='generation_batch').all()
+        assert len(debits) == 1
+        assert debits[0].amount == -2
+
+    fetched = client.get(f"/api/v1/batches/{data['batch_id']}")
+    assert fetched.status_code == 200
+    assert fetched.get_json()['batch']['items'][0]['asset']['asset_id']
+
+
+def test_batch_generation_refunds_failures_in_one_entry(client, app, login_user, monkeypatch):
+    from models import CreditLedger
+    from colorfulme.services.openai_client import OpenAIClient
+
+    user = login_user('batch-refund@example.com')
+    original = OpenAIClient.generate_image
+
+    def flaky_generate(self, **kwargs):
+        if 'broken' in kwargs['prompt']:
+            raise RuntimeError('upstream error')
+        return original(self, **kwargs)
+
+    monkeypatch.setattr(OpenAIClient, 'generate_image', flaky_generate)
+
+    response = client.post(
+        '/api/v1/generations/batch',
+        json={'items': [{'prompt': 'broken castle'}, {'prompt': 'broken bridge'}, {'prompt': 'A teapot'}]},
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['credits_used'] == 1
+    assert data['batch']['refunded_credits'] == 2
+
+    with app.app_context():
+        refunds = CreditLedger.query.filter_by(user_id=user['id'], reason='generation_batch_refund').all()
+        assert [entry.amount for entry in refunds] == [2]
+
+
+def test_batch_generation_rejects_invalid_items(client, login_user):
+    login_user('batch-invalid@example.com')
+
+    response = client.post('/api/v1/generations/batch', json={'items': [{'prompt': ''}]})
+    assert response.status_code == 400
+    assert 'Batch item 0' in response.get_json()['error']
+
+
+def test_identical_prompt_reuses_cached_render(client, app, login_user, monkeypatch):
+    from colorfulme.services.openai_client import OpenAIClient
+
+    login_user('cache@example.com')
+    payload = {'prompt': 'A  Happy Turtle', 'style': 'clean line art', 'aspect_ratio': '1:1'}
+
+    first = client.post('/api/v1/generations/text', json=payload)
+    assert first.status_code == 200
+    assert first.get_json()['render']['cache_hit'] is False
+
+    def no_upstream(self, **kwargs):
+        raise AssertionError('render cache should have answered')
+
+    monkeypatch.setattr(OpenAIClient, 'generate_image', no_upstream)
+
+    second = client.post('/api/v1/generations/text', json={**payload, 'prompt': 'a happy turtle'})
+    assert second.status_code == 200
+    data = second.get_json()
+    assert data['render']['cache_hit'] is True
+    assert data['job']['asset']['asset_id'] != first.get_json()['job']['asset']['asset_id']
+
+    fresh = client.post('/api/v1/generations/text', json={**payload, 'fresh': True})
+    assert fresh.status_code == 422
+    assert fresh.get_json()['status'] == 'failed'
+
+
+def test_render_cache_is_split_by_output_settings(client, app, login_user):
+    login_user('cache-settings@example.com')
+    payload = {'prompt': 'A parrot on a bicycle', 'aspect_ratio': '1:1'}
+
+    app.config.update(VECTOR_EXPORT_ENABLED=False)
+    assert client.post('/api/v1/generations/text', json=payload).get_json()['render']['cache_hit'] is False
+
+    app.config.update(VECTOR_EXPORT_ENABLED=True)
+    vector = client.post('/api/v1/generations/text', json=payload).get_json()
+    assert vector['render']['cache_hit'] is False
+    asset_id = vector['job']['asset']['asset_id']
+    assert client.get(f'/api/v1/assets/{asset_id}/download?format=svg').status_code == 200
+
+    app.config.update(LINE_ART_OUTPUT_MODE='bilevel')
+    bilevel = client.post('/api/v1/generations/text', json=payload).get_json()
+    assert bilevel['render']['cache_hit'] is False
+    png = client.get(f"/api/v1/assets/{bilevel['job']['asset']['asset_id']}/download?format=png").data
+    assert Image.open(BytesIO(png)).mode == '1'
+
+    assert client.post('/api/v1/generations/text', json=payload).get_json()['render']['cache_hit'] is True
+
+
+def test_render_cache_evicts_least_recently_used(app):
+    from models import RenderCacheEntry
+    from colorfulme.services.render_cache import RenderCacheService
+
+    app.config.update(RENDER_CACHE_MAX_ENTRIES=2, RENDER_CACHE_EVICT_INTERVAL_SECONDS=0)
+    with app.app_context():
+        cache = RenderCacheService()
+        for index in range(3):
+            cache.store(
+                f'key-{index}',
+                mode='text',
+                model='m',
+                quality='low',
+                png_key=f'{index}.png',
+                pdf_key=f'{index}.pdf',
+                width=10,
+                height=10,
+                size_bytes=100,
+            )
+            cache.lookup(f'key-{index}')
+
+        assert sorted(entry.cache_key for entry in RenderCacheEntry.query.all()) == ['key-1', 'key-2']
+
+        # The byte budget counts from the most recently used entry down.
+        cache.max_entries, cache.max_bytes = 10, 150
+        assert cache.evict() == 1
+        assert [entry.cache_key for entry in RenderCacheEntry.query.all()] == ['key-2']
+
+
+def _enable_speculative_moderation(app, monkeypatch, *, flagged):
+    from colorfulme.services.moderation_service import ModerationService, clear_verdict_cache
+
+    clear_verdict_cache()
+    app.config.update(SPECULATIVE_MODERATION=True, RENDER_CACHE_ENABLED=False)
+    monkeypatch.setattr(ModerationService, 'uses_upstream', property(lambda self: True))
+    monkeypatch.setattr(ModerationService, '_openai_moderation_check', lambda self, text: flagged)
+
+
+def test_speculative_moderation_passes_clean_prompt(client, app, login_user, monkeypatch):
+    login_user('speculative@example.com')
+    _enable_speculative_moderation(app, monkeypatch, flagged=False)
+
+    response = client.post('/api/v1/generations/text', json={'prompt': 'A bunny with a balloon'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'completed'
+
+
+def test_speculative_moderation_discards_flagged_render(client, app, login_user, monkeypatch):
+    from models import GeneratedAsset, User
+
+    user_data = login_user('speculative-flag@example.com')
+    _enable_speculative_moderation(app, monkeypatch, flagged=True)
+    before = client.get('/api/v1/me/credits').get_json()['credits']
+
+    response = client.post('/api/v1/generations/text', json={'prompt': 'A borderline prompt'})
+    assert response.status_code == 422
+    data = response.get_json()
+    assert data['status'] == 'blocked'
+    assert data['job']['error_message'] == 'Prompt blocked by upstream moderation.'
+    assert client.get('/api/v1/me/credits').get_json()['credits'] == before
+
+    with app.app_context():
+        user = User.query.filter_by(email=user_data['email']).first()
+        assert GeneratedAsset.query.filter_by(user_id=user.id).count() == 0
+
+
+def test_render_artifact_encodes_each_format_once(monkeypatch):
+    from colorfulme.services.pdf_service import PdfService
+    from colorfulme.services.render_artifact import RenderArtifact
+
+    calls = []
+    original = PdfService.image_to_pdf_bytes
+    monkeypatch.setattr(PdfService, 'image_to_pdf_bytes', staticmethod(lambda image: calls.append(image) or original(image)))
+
+    artifact = RenderArtifact(Image.new('L', (300, 200), 255))
+    assert artifact.png is artifact.png
+    assert artifact.pdf is artifact.pdf
+    assert artifact.pdf.startswith(b'%PDF')
+    assert len(calls) == 1
+    assert (artifact.width, artifact.height) == (300, 200)
+
+    thumb = Image.open(BytesIO(artifact.thumbnail(150)))
+    assert thumb.size == (150, 100)
+    assert artifact.thumbnail(150) is artifact.thumbnail(150)
+
+
+def test_bilevel_output_mode_stores_one_bit_png_and_g4_pdf(client, app, login_user):
+    login_user('bilevel@example.com')
+    app.config.update(LINE_ART_OUTPUT_MODE='bilevel')
+
+    response = client.post(
+        '/api/v1/generations/text',
+        json={'prompt': 'A snail on a leaf', 'aspect_ratio': '1:1', 'fresh': True},
+    )
+    assert response.status_code == 200
+    asset_id = response.get_json()['job']['asset']['asset_id']
+
+    png = client.get(f'/api/v1/assets/{asset_id}/download?format=png').data
+    pdf = client.get(f'/api/v1/assets/{asset_id}/download?format=pdf').data
+    assert Image.open(BytesIO(png)).mode == '1'
+    assert b'/CCITTFaxDecode' in pdf
+
+
+def test_vector_exports_are_stored_and_downloadable(client, login_user):
+    login_user('vector@example.com')
+
+    response = client.post(
+        '/api/v1/generations/text',
+        json={'prompt': 'A hedgehog with a balloon', 'aspect_ratio': '16:9', 'fresh': True},
+    )
+    assert response.status_code == 200
+    asset = response.get_json()['job']['asset']
+    assert asset['svg_url'] and asset['vector_pdf_url']
+
+    svg = client.get(f"/api/v1/assets/{asset['asset_id']}/download?format=svg")
+    assert svg.status_code == 200
+    assert svg.mimetype == 'image/svg+xml'
+    assert b'fill-rule="evenodd"' in svg.data
+
+    vector_pdf = client.get(f"/api/v1/assets/{asset['asset_id']}/download?format=vector-pdf")
+    assert vector_pdf.status_code == 200
+    assert vector_pdf.data.startswith(b'%PDF') and b'/MediaBox [0 0 792 612]' in vector_pdf.data
+    assert b'/Image' not in vector_pdf.data
+
+
+def test_fast_png_is_recompressed_under_a_new_blob(client, app, login_user):
+    from extensions import db
+    from models import BlobRef, GeneratedAsset, RenderCacheEntry, StoredBlob
+    from colorfulme.services.png_recompress import recompress_pending
+
+    login_user('recompress@example.com')
+    response = client.post('/api/v1/generations/text', json={'prompt': 'A kite over a hill', 'aspect_ratio': '1:1'})
+    assert response.status_code == 200
+    asset_id = response.get_json()['job']['asset']['asset_id']
+    fast_png = client.get(f'/api/v1/assets/{asset_id}/download?format=png').data
+
+    with app.app_context():
+        asset = db.session.get(GeneratedAsset, asset_id)
+        assert asset.png_profile == 'fast'
+        fast_key = asset.png_key
+        cached_size = RenderCacheEntry.query.filter_by(png_key=asset.png_key).one().size_bytes
+
+        report = recompress_pending(limit=10)
+        assert report.objects == 1 and report.bytes_saved > 0
+
+        asset = db.session.get(GeneratedAsset, asset_id)
+        assert asset.png_profile == 'compact'
+        # Blob keys name their bytes, so the compact PNG lives under a key of its own.
+        assert asset.png_key != fast_key and asset.png_key.startswith('blobs/')
+        assert BlobRef.query.filter_by(blob_key=fast_key).count() == 0
+        assert db.session.get(StoredBlob, asset.png_key).size_bytes == len(fast_png) - report.bytes_saved
+        entry = RenderCacheEntry.query.filter_by(png_key=asset.png_key).one()
+        assert entry.size_bytes == cached_size - report.bytes_saved
+        assert recompress_pending(limit=10).objects == 0
+
+    compact_png = client.get(f'/api/v1/assets/{asset_id}/download?format=png').data
+    assert len(compact_png) < len(fast_png)
+    assert Image.open(BytesIO(compact_png)).tobytes() == Image.open(BytesIO(fast_png)).tobytes()
+
+
+def test_cpu_pool_renders_match_inline_renders(client, app, login_user):
+    from colorfulme.services.generation_service import clear_placeholder_renders
+    from colorfulme.utils import metrics
+    from colorfulme.utils.executors import shutdown_executors
+
+    login_user('cpu-pool@example.com')
+    payload = {'prompt': 'A turtle under a palm tree', 'aspect_ratio': '4:5', 'fresh': True}
+
+    def render_png():
+        response = client.post('/api/v1/generations/text', json=payload)
+        assert response.status_code == 200
+        asset_id = response.get_json()['job']['asset']['asset_id']
+        return client.get(f'/api/v1/assets/{asset_id}/download?format=png').data
+
+    inline_png = render_png()
+    clear_placeholder_renders()
+    app.config.update(CPU_POOL_WORKERS=1)
+    try:
+        pooled_png = render_png()
+    finally:
+        shutdown_executors()
+
+    assert metrics.get('cpu_pool.broken') == 0
+    assert pooled_png == inline_png
+    assert Image.open(BytesIO(pooled_png)).size == (1200, 1500)
+
+
+def test_repeated_fallback_prompt_reuses_rendered_page(client, login_user):
+    from colorfulme.services.generation_service import clear_placeholder_renders
+    from colorfulme.utils import metrics
+
+    login_user('fallback-cache@example.com')
+    clear_placeholder_renders()
+    hits = metrics.get('fallback.render_cache.hits')
+    pngs = []
+    for style in ('bold lines', 'bold lines', 'thin lines'):
+        response = client.post(
+            '/api/v1/generations/text',
+            json={'prompt': 'A fox in the snow', 'style': style, 'aspect_ratio': '1:1', 'fresh': True},
+        )
+        assert response.status_code == 200
+        asset_id = response.get_json()['job']['asset']['asset_id']
+        pngs.append(client.get(f'/api/v1/assets/{asset_id}/download?format=png').data)
+
+    assert metrics.get('fallback.render_cache.hits') == hits + 1
+    assert pngs[0] == pngs[1]
+    assert pngs[2] != pngs[0]
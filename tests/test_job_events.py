@@ -0,0 +1,108 @@
+import json
+
+from extensions import db
+from models import GenerationJob
+from colorfulme.services import job_events
+
+
+def _parse_events(body: str):
+    events = []
+    for chunk in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in chunk.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_async_generation_streams_status_and_final_job(client, app, login_user):
+    login_user('events@example.com')
+
+    response = client.post(
+        '/api/v1/generations/text',
+        json={'prompt': 'A turtle reading a map', 'aspect_ratio': '1:1', 'async': True},
+    )
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['events_url'].endswith(f"/api/v1/jobs/{data['job_id']}/events")
+
+    stream = client.get(data['events_url'])
+    assert stream.status_code == 200
+    assert stream.mimetype == 'text/event-stream'
+
+    events = _parse_events(stream.get_data(as_text=True))
+    assert events[0][0] == 'status'
+    assert [payload['status'] for name, payload in events if name == 'status'][-1] == 'completed'
+    name, job = events[-1]
+    assert name == 'job'
+    assert job['job_id'] == data['job_id']
+    assert job['status'] == 'completed'
+    assert job['asset']['png_url']
+
+    with app.app_context():
+        # Queued durably and claimed like a queue job, so workers can recover it after a restart.
+        stored = db.session.get(GenerationJob, data['job_id'])
+        assert stored.queued_at is not None
+        assert stored.worker_id.endswith('/web')
+
+
+def test_event_stream_requires_owner(client, app, login_user):
+    login_user('owner@example.com')
+    response = client.post('/api/v1/generations/text', json={'prompt': 'A lighthouse', 'aspect_ratio': '1:1'})
+    job_id = response.get_json()['job_id']
+
+    client.post('/auth/logout')
+    login_user('intruder@example.com')
+    assert client.get(f'/api/v1/jobs/{job_id}/events').status_code == 404
+
+
+def test_publish_skips_repeated_status():
+    subscription = job_events.subscribe('job-1', 'queued')
+    try:
+        job_events.publish('job-1', 'queued')
+        job_events.publish('job-1', 'processing')
+        job_events.publish('job-1', 'processing')
+        assert subscription.get(timeout=0.01) == 'processing'
+        assert subscription.get(timeout=0.01) is None
+    finally:
+        job_events.unsubscribe(subscription)
+    assert 'job-1' not in job_events.watched_job_ids()
+
+
+def test_poller_picks_up_transitions_from_other_processes(client, app, login_user):
+    login_user('poller@example.com')
+    app.config.update(GENERATION_QUEUE_ENABLED=True, JOB_EVENTS_POLL_SECONDS=0.05)
+    job_id = client.post('/api/v1/generations/text', json={'prompt': 'A kite', 'aspect_ratio': '1:1'}).get_json()['job_id']
+
+    subscription = job_events.subscribe(job_id, 'queued', app=app)
+    try:
+        # Simulate a worker in another process: the row changes without an in-process publish.
+        with app.app_context():
+            GenerationJob.query.filter_by(id=job_id).update({'status': 'processing'})
+            db.session.commit()
+        assert subscription.get(timeout=2) == 'processing'
+    finally:
+        job_events.unsubscribe(subscription)
+        job_events.stop_poller()
+
+
+def test_event_streams_are_capped_per_process(client, app, login_user):
+    login_user('stream-cap@example.com')
+    # Streams from earlier tests stay counted until their responses are closed.
+    already_open = job_events.open_stream_count()
+    app.config.update(JOB_EVENTS_MAX_STREAMS=already_open + 1)
+    job_id = client.post('/api/v1/generations/text', json={'prompt': 'A fox', 'aspect_ratio': '1:1'}).get_json()['job_id']
+
+    assert job_events.open_stream(already_open + 1)
+    try:
+        rejected = client.get(f'/api/v1/jobs/{job_id}/events')
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == '5'
+        assert rejected.get_json()['poll_url'].endswith(f'/api/v1/jobs/{job_id}')
+    finally:
+        job_events.close_stream()
+
+    stream = client.get(f'/api/v1/jobs/{job_id}/events')
+    assert stream.status_code == 200
+    stream.get_data()
+    stream.close()
+    assert job_events.open_stream_count() == already_open
@@ -0,0 +1,131 @@
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+from extensions import db
+from models import GenerationJob
+from colorfulme.services.job_queue import claim_next_job, process_next_job
+
+
+def _sample_image_b64():
+    image = Image.new('RGB', (64, 64), 'white')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def test_queued_generation_is_processed_by_worker(client, app, login_user):
+    login_user('queue@example.com')
+    app.config.update(GENERATION_QUEUE_ENABLED=True)
+
+    response = client.post(
+        '/api/v1/generations/text',
+        json={'prompt': 'A friendly dragon reading a book', 'aspect_ratio': '1:1'},
+    )
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['status'] == 'queued'
+    assert data['job']['asset'] is None
+    assert data['poll_url'].endswith(f"/api/v1/jobs/{data['job_id']}")
+
+    with app.app_context():
+        result = process_next_job('test-worker')
+        assert result is not None
+        assert result.job.status == 'completed'
+        assert result.job.worker_id == 'test-worker'
+        assert process_next_job('test-worker') is None
+
+    polled = client.get(data['poll_url'])
+    assert polled.status_code == 200
+    job = polled.get_json()['job']
+    assert job['status'] == 'completed'
+    assert job['asset']['asset_id']
+    assert job['render']['model'] == 'fallback-deterministic'
+
+
+def test_inline_jobs_are_never_claimed(client, app, login_user):
+    login_user('inline@example.com')
+
+    response = client.post('/api/v1/generations/text', json={'prompt': 'A sleepy cat'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert claim_next_job('test-worker') is None
+
+
+def test_queued_photo_generation_keeps_source_for_worker(client, app, login_user):
+    login_user('queue-photo@example.com')
+    app.config.update(GENERATION_QUEUE_ENABLED=True)
+
+    response = client.post(
+        '/api/v1/generations/photo',
+        json={'prompt': 'Turn this into coloring page', 'source_image_base64': _sample_image_b64()},
+    )
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    with app.app_context():
+        assert db.session.get(GenerationJob, job_id).source_key
+        result = process_next_job('test-worker')
+        assert result.job.status == 'completed'
+        assert result.asset is not None
+        assert result.job.source_key is None
+
+
+def test_queued_batch_is_processed_by_worker(client, app, login_user):
+    from colorfulme.services.job_queue import process_next_batch
+
+    login_user('queue-batch@example.com')
+    app.config.update(GENERATION_QUEUE_ENABLED=True)
+
+    response = client.post(
+        '/api/v1/generations/batch',
+        json={'items': [{'prompt': 'A robot gardener'}, {'prompt': 'A snail race'}]},
+    )
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['status'] == 'queued'
+
+    with app.app_context():
+        assert process_next_job('test-worker') is None
+        result = process_next_batch('test-worker')
+        assert result.batch.status == 'completed'
+        assert result.credits_used == 2
+
+    polled = client.get(data['poll_url'])
+    assert [item['status'] for item in polled.get_json()['batch']['items']] == ['completed', 'completed']
+
+
+def test_stale_claims_are_refunded_and_requeued(client, app, login_user):
+    from datetime import timedelta
+
+    from colorfulme.services.credits_service import debit_credits
+    from colorfulme.services.job_queue import claim_next_job, reclaim_stale_claims
+    from colorfulme.utils.security import utcnow
+
+    user = login_user('queue-stale@example.com')
+    app.config.update(GENERATION_QUEUE_ENABLED=True)
+    job_id = client.post('/api/v1/generations/text', json={'prompt': 'A lighthouse'}).get_json()['job_id']
+
+    with app.app_context():
+        from models import User
+
+        owner = db.session.get(User, user['id'])
+        balance = owner.wallet.balance
+        for attempt in (1, 2):
+            job = claim_next_job('dead-worker')
+            assert job.id == job_id and job.attempts == attempt
+            # The worker charged the job, then died mid-render.
+            debit_credits(owner, job.cost_credits, reason='generation', reference_id=job.id)
+            job.claimed_at = utcnow() - timedelta(hours=1)
+            db.session.commit()
+
+            assert reclaim_stale_claims(900, max_attempts=2) == 1
+            assert reclaim_stale_claims(900, max_attempts=2) == 0
+            db.session.refresh(job)
+            assert job.status == ('queued' if attempt == 1 else 'failed')
+            assert owner.wallet.balance == balance
+
+        assert (job.status, job.worker_id) == ('failed', 'dead-worker')
+        assert claim_next_job('test-worker') is None
@@ -0,0 +1,85 @@
+from datetime import timedelta
+import os
+import time
+
+
+def test_retention_expires_assets_per_plan(client, app, login_user, generate_asset):
+    from extensions import db
+    from models import BlobRef, ColoringBook, GeneratedAsset, Plan, Subscription
+    from colorfulme.services.asset_lifecycle import AssetLifecycleManager
+    from colorfulme.services.storage_service import StorageService
+    from colorfulme.utils.security import utcnow
+
+    app.config.update(ASSET_RETENTION_DAYS='free:30', LIFECYCLE_BATCH_SIZE=1)
+    login_user('retention-free@example.com')
+    blob_asset = generate_asset('An owl with a lantern')
+    app.config.update(BLOB_STORE_ENABLED=False)
+    legacy_asset = generate_asset('An owl with a scarf')
+    assert client.post('/api/v1/books', json={'asset_ids': [legacy_asset['asset_id']]}).status_code == 201
+    pro_user = login_user('retention-pro@example.com')
+    pro_asset = generate_asset('An owl with a book')
+
+    with app.app_context():
+        db.session.add(Subscription(user_id=pro_user['id'], plan_id=Plan.query.filter_by(code='pro').one().id))
+        GeneratedAsset.query.update({'created_at': utcnow() - timedelta(days=40)})
+        ColoringBook.query.update({'created_at': utcnow() - timedelta(days=40)})
+        db.session.commit()
+        book_path = StorageService().absolute_local_path(ColoringBook.query.one().pdf_key)
+
+        legacy = db.session.get(GeneratedAsset, legacy_asset['asset_id'])
+        legacy_path = StorageService().absolute_local_path(legacy.png_key)
+        assert len(legacy.png_key.split('/')) == 4  # <ab>/<cd>/<folder hash>/<uuid>.png
+        assert legacy_path.exists()
+
+        preview = AssetLifecycleManager().run(dry_run=True)
+        assert (preview.assets, preview.assets_by_plan, preview.blobs_released, preview.books) == (2, {'free': 2}, 4, 1)
+        assert preview.objects_deleted == 7  # PNG, PDF, SVG, vector PDF, two previews and the book
+        assert GeneratedAsset.query.count() == 3
+
+        report = AssetLifecycleManager().run()
+        assert (report.assets, report.books, report.objects_deleted, report.failed) == (2, 1, 7, 0)
+        assert [asset.id for asset in GeneratedAsset.query.all()] == [pro_asset['asset_id']]
+        assert BlobRef.query.filter_by(owner_id=blob_asset['asset_id']).count() == 0
+        assert ColoringBook.query.count() == 0
+        assert not legacy_path.exists()
+        assert not book_path.exists()
+
+    assert client.get(f"/api/v1/assets/{pro_asset['asset_id']}/download?format=png").status_code == 200
+
+
+def test_orphan_scan_removes_only_old_unreferenced_objects(app, monkeypatch):
+    import uuid
+
+    from extensions import db
+    from models import GenerationJob, User
+    from colorfulme.services.asset_lifecycle import AssetLifecycleManager
+    from colorfulme.services.storage_service import StorageService
+
+    with app.app_context():
+        storage = StorageService()
+        folder = f'orphans/{uuid.uuid4().hex}'
+        (orphan, _), (fresh, _), (source, _) = storage.save_many([(b'o', 'png', folder), (b'f', 'png', folder), (b's', 'bin', folder)])
+        user = User(email='orphans@example.com')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(GenerationJob(user_id=user.id, mode='photo', status='processing', source_key=source))
+        db.session.commit()
+
+        old = time.time() - 2 * 24 * 3600
+        for key in (orphan, source):
+            os.utime(storage.absolute_local_path(key), (old, old))
+
+        # A bucket may hold other data, so without a prefix only the app's own key spaces are listed.
+        with monkeypatch.context() as patch:
+            patch.setattr(StorageService, 'uses_s3', property(lambda self: True))
+            assert AssetLifecycleManager().orphan_prefixes() == ['blobs/', f'{user.id}/']
+
+        prefix = orphan.rsplit('/', 1)[0]
+        assert AssetLifecycleManager().run(dry_run=True, orphans=True, orphan_prefix=prefix).orphans == 1
+        assert storage.absolute_local_path(orphan).exists()
+
+        report = AssetLifecycleManager().run(orphans=True, orphan_prefix=prefix)
+        assert (report.orphans, report.orphan_bytes) == (1, 1)
+        assert not storage.absolute_local_path(orphan).exists()
+        assert storage.absolute_local_path(fresh).exists()
+        assert storage.absolute_local_path(source).exists()
@@ -0,0 +1,32 @@
+import pytest
+from PIL import Image, ImageDraw
+
+from colorfulme.services import line_art
+
+
+def _sample(width, height):
+    image = Image.new('L', (width, height), 228)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((width // 6, height // 6, width * 5 // 6, height * 5 // 6), outline=30, width=3)
+    draw.line((0, 0, width, height), fill=90, width=2)
+    return Image.blend(image, Image.effect_noise((width, height), 30), 0.2)
+
+
+@pytest.mark.parametrize('size', [(96, 64), (3, 3), (1, 5)])
+def test_numpy_pipeline_matches_pil(size):
+    pytest.importorskip('numpy')
+    image = _sample(*size)
+
+    for fn in (line_art.clean_line_art, line_art.photo_edges):
+        assert fn(image, pipeline='numpy').tobytes() == fn(image, pipeline='pil').tobytes()
+
+
+def test_flat_input_keeps_pil_autocontrast_semantics():
+    pytest.importorskip('numpy')
+    image = Image.new('L', (16, 16), 200)
+    assert line_art.clean_line_art(image, pipeline='numpy').tobytes() == bytes([255]) * 256
+
+
+def test_unknown_pipeline_is_rejected():
+    with pytest.raises(ValueError):
+        line_art.resolve_pipeline('opencv')
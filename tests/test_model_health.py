@@ -0,0 +1,122 @@
+from colorfulme.services.model_health import CircuitBreaker
+from colorfulme.services.openai_client import OpenAIClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_opens_on_error_rate_and_probes_after_cooldown(tmp_path):
+    clock = FakeClock()
+    breaker = CircuitBreaker(str(tmp_path / 'health.sqlite3'), min_requests=4, failure_rate_threshold=0.5, open_seconds=30, clock=clock)
+
+    breaker.record('model-a', ok=True, latency_seconds=1.0)
+    breaker.record('model-a', ok=False)
+    breaker.record('model-a', ok=True, latency_seconds=1.0)
+    assert breaker.allow('model-a')
+
+    breaker.record('model-a', ok=False)
+    assert not breaker.allow('model-a')
+
+    # A second process opening the same file sees the open circuit.
+    other_worker = CircuitBreaker(breaker.path, clock=clock)
+    assert not other_worker.allow('model-a')
+
+    clock.now += 31
+    assert breaker.allow('model-a')
+    assert not other_worker.allow('model-a')
+
+    breaker.record('model-a', ok=True, latency_seconds=0.5)
+    assert other_worker.allow('model-a')
+    # Closing starts a clean window.
+    assert breaker.status() == []
+
+
+def test_slow_calls_count_against_the_circuit(tmp_path):
+    breaker = CircuitBreaker(str(tmp_path / 'health.sqlite3'), min_requests=2, slow_call_seconds=10)
+    breaker.record('model-a', ok=True, latency_seconds=30)
+    breaker.record('model-a', ok=True, latency_seconds=45)
+    assert not breaker.allow('model-a')
+    assert breaker.status()[0]['state'] == 'open'
+
+
+def test_open_circuit_routes_to_healthy_model(app, monkeypatch):
+    calls = []
+
+    def fake_generate(self, *, model, **kwargs):
+        calls.append(model)
+        if model == 'gpt-image-1.5':
+            raise RuntimeError('upstream 503')
+        return b'fallback'
+
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', fake_generate)
+    app.config.update(MODEL_CIRCUIT_MIN_REQUESTS=2)
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+        for _ in range(3):
+            image = openai_client.generate_image(prompt='a fox', mode='text', model='gpt-image-1.5')
+            assert image.model == 'gpt-image-1-mini'
+
+    # The third request skipped the failing primary entirely.
+    assert calls == ['gpt-image-1.5', 'gpt-image-1-mini', 'gpt-image-1.5', 'gpt-image-1-mini', 'gpt-image-1-mini']
+
+
+def test_all_circuits_open_uses_deterministic_fallback(app, monkeypatch):
+    def failing_generate(self, *, model, **kwargs):
+        raise RuntimeError('upstream 503')
+
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', failing_generate)
+    app.config.update(MODEL_CIRCUIT_MIN_REQUESTS=1)
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+        openai_client.generate_image(prompt='a fox', mode='text')
+        monkeypatch.setattr(OpenAIClient, '_generate_openai_image', lambda *args, **kwargs: b'unexpected')
+        image = openai_client.generate_image(prompt='a fox', mode='text')
+
+    assert image.model == 'fallback-deterministic'
+
+
+def test_health_models_endpoint(client, app):
+    with app.app_context():
+        from colorfulme.services.model_health import get_circuit_breaker
+
+        get_circuit_breaker(app.config).record('gpt-image-1.5', ok=True, latency_seconds=2.0)
+
+    assert client.get('/health/models').status_code == 404
+    app.config.update(METRICS_TOKEN='metrics-secret')
+    assert client.get('/health/models').status_code == 401
+
+    response = client.get('/health/models', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['enabled'] is True
+    assert payload['models'][0]['model'] == 'gpt-image-1.5'
+    assert payload['models'][0]['state'] == 'closed'
+    assert payload['models'][0]['calls'] == 1
+
+
+def test_fallback_probe_is_only_claimed_when_the_fallback_is_tried(app, monkeypatch):
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', lambda self, *, model, **kwargs: b'primary')
+    app.config.update(MODEL_CIRCUIT_MIN_REQUESTS=1, MODEL_CIRCUIT_OPEN_SECONDS=0)
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+        openai_client.breaker.record('gpt-image-1-mini', ok=False)
+
+        assert openai_client.generate_image(prompt='a fox', mode='text').model == 'gpt-image-1.5'
+        # The fallback was never needed, so its cooled-down circuit still has its probe to give.
+        assert {row['model']: row['state'] for row in openai_client.breaker.status()}['gpt-image-1-mini'] == 'open'
+
+
+def test_breaker_reuses_its_connection_per_thread(tmp_path):
+    breaker = CircuitBreaker(str(tmp_path / 'health.sqlite3'))
+    breaker.record('model-a', ok=True, latency_seconds=1.0)
+    conn = breaker._local.conn
+    assert breaker.allow('model-a')
+    assert breaker._local.conn is conn
@@ -0,0 +1,37 @@
+from colorfulme.services.moderation_service import ModerationService, clear_verdict_cache
+from colorfulme.utils import metrics
+
+
+def test_blocked_terms_match_in_one_pass(app):
+    app.config.update(MODERATION_EXTRA_BLOCKED_TERMS='zombie, chainsaw')
+    with app.app_context():
+        service = ModerationService()
+        assert service.check_local('A cute puppy') == (True, None)
+        assert service.check_local('Self-Harm awareness')[0] is False
+        allowed, reason = service.check_local('a zombie at the fair')
+        assert allowed is False
+        assert '(zombie)' in reason
+
+
+def test_upstream_verdicts_are_cached(app, monkeypatch):
+    calls = []
+
+    def fake_check(self, text):
+        calls.append(text)
+        return 'spooky' in text
+
+    monkeypatch.setattr(ModerationService, 'uses_upstream', property(lambda self: True))
+    monkeypatch.setattr(ModerationService, '_openai_moderation_check', fake_check)
+    clear_verdict_cache()
+    metrics.reset()
+
+    with app.app_context():
+        service = ModerationService()
+        assert service.check_prompt('A spooky  house') == (False, 'Prompt blocked by upstream moderation.')
+        assert service.check_prompt('a SPOOKY house')[0] is False
+        assert service.check_prompt('A sunny beach') == (True, None)
+
+    assert len(calls) == 2
+    assert metrics.get('moderation.verdict_cache.hits') == 1
+    assert metrics.get('moderation.verdict_cache.misses') == 2
+    clear_verdict_cache()
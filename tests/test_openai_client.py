@@ -9,3 +9,125 @@ def test_estimate_image_cost_known_model():
 def test_estimate_image_cost_unknown_model_returns_none():
     cost = OpenAIClient.estimate_image_cost_usd('unknown-model', 'medium', '1024x1024')
     assert cost is None
+
+
+def test_openai_clients_are_pooled_per_key():
+    from colorfulme.services.openai_pool import OpenAIPoolSettings, get_openai_client, reset_openai_clients
+    from colorfulme.utils import metrics
+
+    reset_openai_clients()
+    metrics.reset()
+    settings = OpenAIPoolSettings(max_connections=4, timeout_seconds=5)
+
+    first = get_openai_client('sk-test-one', settings)
+    again = get_openai_client('sk-test-one', settings)
+    other = get_openai_client('sk-test-two', settings)
+
+    assert first is again
+    assert first is not other
+    assert metrics.get('openai.clients.created') == 2
+    assert metrics.get('openai.clients.reused') == 1
+    reset_openai_clients()
+
+
+def test_metrics_endpoint_reports_counters(client, app):
+    from colorfulme.utils import metrics
+
+    metrics.increment('test.counter')
+    assert client.get('/health/metrics').status_code == 404
+
+    app.config.update(METRICS_TOKEN='metrics-secret')
+    assert client.get('/health/metrics').status_code == 401
+    assert client.get('/health/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/health/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.status_code == 200
+    assert response.get_json()['counters']['test.counter'] >= 1
+
+
+def test_hedged_request_takes_fallback_when_primary_is_slow(app, monkeypatch):
+    import threading
+
+    from colorfulme.services import model_health
+
+    model_health.reset_latencies()
+    app.config.update(OPENAI_HEDGE_ENABLED=True, OPENAI_HEDGE_DELAY_SECONDS=0.05)
+    release_primary = threading.Event()
+
+    def fake_generate(self, *, model, **kwargs):
+        if model == 'gpt-image-1.5':
+            release_primary.wait(5)
+            return b'primary'
+        return b'fallback'
+
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', fake_generate)
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+        image = openai_client.generate_image(prompt='a fox', mode='text', model='gpt-image-1.5', quality='medium')
+    release_primary.set()
+
+    assert image.png_bytes == b'fallback'
+    assert image.model == 'gpt-image-1-mini'
+    assert image.hedged is True
+    both_legs = OpenAIClient.estimate_image_cost_usd('gpt-image-1.5', 'medium', '1024x1024') + (
+        OpenAIClient.estimate_image_cost_usd('gpt-image-1-mini', 'medium', '1024x1024')
+    )
+    assert image.estimated_cost_usd == round(both_legs, 6)
+
+
+def test_hedge_not_fired_when_primary_is_fast(app, monkeypatch):
+    from colorfulme.services import model_health
+
+    model_health.reset_latencies()
+    app.config.update(OPENAI_HEDGE_ENABLED=True, OPENAI_HEDGE_DELAY_SECONDS=5)
+    calls = []
+
+    def fake_generate(self, *, model, **kwargs):
+        calls.append(model)
+        return b'primary'
+
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', fake_generate)
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+        image = openai_client.generate_image(prompt='a fox', mode='text', model='gpt-image-1.5', quality='medium')
+
+    assert calls == ['gpt-image-1.5']
+    assert image.hedged is False
+    assert image.model == 'gpt-image-1.5'
+    assert model_health.latency_percentile('gpt-image-1.5', 95) is not None
+
+
+def test_hedging_is_skipped_while_legs_are_outstanding(app, monkeypatch):
+    import time
+
+    from colorfulme.services import openai_client as openai_module
+    from colorfulme.utils import metrics
+
+    app.config.update(OPENAI_HEDGE_ENABLED=True, OPENAI_HEDGE_DELAY_SECONDS=0, OPENAI_HEDGE_POOL_SIZE=2)
+    calls = []
+
+    def fake_generate(self, *, model, **kwargs):
+        calls.append(model)
+        time.sleep(0.05)
+        return b'image'
+
+    monkeypatch.setattr(OpenAIClient, '_generate_openai_image', fake_generate)
+    saturated = metrics.get('openai.hedge.saturated')
+    with app.app_context():
+        openai_client = OpenAIClient()
+        openai_client.api_key = 'sk-test'
+
+        # Abandoned primaries still hold every hedge thread: render inline, without a hedge.
+        monkeypatch.setitem(openai_module._outstanding_legs, openai_module.HEDGE_PRIMARY_POOL, 2)
+        image = openai_client.generate_image(prompt='a fox', mode='text', model='gpt-image-1.5')
+        assert (image.model, image.hedged) == ('gpt-image-1.5', False)
+
+        # Fallback legs saturated: the slow primary is awaited instead of hedged.
+        monkeypatch.setitem(openai_module._outstanding_legs, openai_module.HEDGE_PRIMARY_POOL, 0)
+        monkeypatch.setitem(openai_module._outstanding_legs, openai_module.HEDGE_FALLBACK_POOL, 2)
+        image = openai_client.generate_image(prompt='a fox', mode='text', model='gpt-image-1.5')
+        assert (image.model, image.hedged) == ('gpt-image-1.5', False)
+
+    assert calls == ['gpt-image-1.5', 'gpt-image-1.5']
+    assert metrics.get('openai.hedge.saturated') == saturated + 2
@@ -0,0 +1,242 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+import uuid
+
+import pytest
+
+
+class _FakeS3Handler(BaseHTTPRequestHandler):
+    """Just enough of the S3 REST API (path-style) for put, multipart upload, get and (bulk) delete."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _target(self):
+        parts = urlsplit(self.path)
+        _bucket, _, key = parts.path.lstrip('/').partition('/')
+        return unquote(key), parse_qs(parts.query, keep_blank_values=True)
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_PUT(self):
+        state = self.server.state
+        key, query = self._target()
+        body = self._body()
+        with state['lock']:
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        try:
+            time.sleep(state['delay'])
+            if key.endswith(state['fail_suffix'] or '\0'):
+                self._reply(403, b'<Error><Code>AccessDenied</Code><Message>denied</Message></Error>')
+                return
+            if 'uploadId' in query:
+                state['uploads'][query['uploadId'][0]][int(query['partNumber'][0])] = body
+                state['calls'].append(('upload_part', key))
+            else:
+                state['objects'][key] = (body, self.headers.get('Content-Type'))
+                state['calls'].append(('put', key))
+            self._reply(200, headers={'ETag': f'"{uuid.uuid4().hex}"'})
+        finally:
+            with state['lock']:
+                state['in_flight'] -= 1
+
+    def do_POST(self):
+        state = self.server.state
+        key, query = self._target()
+        body = self._body()
+        if 'delete' in query:
+            keys = [unquote(match) for match in re.findall(r'<Key>(.*?)</Key>', body.decode())]
+            for deleted in keys:
+                state['objects'].pop(deleted, None)
+            state['calls'].append(('delete_objects', tuple(keys)))
+            self._reply(200, b'<DeleteResult></DeleteResult>')
+            return
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            state['uploads'][upload_id] = {}
+            state['content_types'][upload_id] = self.headers.get('Content-Type')
+            state['calls'].append(('create_multipart', key))
+            self._reply(
+                200,
+                f'<InitiateMultipartUploadResult><Bucket>media</Bucket><Key>{key}</Key>'
+                f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'.encode(),
+            )
+            return
+        upload_id = query['uploadId'][0]
+        parts = state['uploads'].pop(upload_id)
+        state['objects'][key] = (b''.join(parts[number] for number in sorted(parts)), state['content_types'][upload_id])
+        state['calls'].append(('complete_multipart', key))
+        self._reply(200, b'<CompleteMultipartUploadResult><ETag>"done"</ETag></CompleteMultipartUploadResult>')
+
+    def do_GET(self):
+        key, _query = self._target()
+        if key not in self.server.state['objects']:
+            self._reply(404, b'<Error><Code>NoSuchKey</Code><Message>missing</Message></Error>')
+            return
+        body, content_type = self.server.state['objects'][key]
+        self._reply(200, body, {'Content-Type': content_type or 'application/octet-stream'})
+
+    def do_DELETE(self):
+        key, query = self._target()
+        if 'uploadId' in query:
+            self.server.state['uploads'].pop(query['uploadId'][0], None)
+        else:
+            self.server.state['objects'].pop(key, None)
+            self.server.state['calls'].append(('delete', key))
+        self._reply(204)
+
+
+@pytest.fixture()
+def fake_s3(app, monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeS3Handler)
+    server.state = {
+        'objects': {},
+        'uploads': {},
+        'content_types': {},
+        'calls': [],
+        'lock': threading.Lock(),
+        'in_flight': 0,
+        'max_in_flight': 0,
+        'delay': 0.0,
+        'fail_suffix': None,
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('S3_BUCKET', 'media')
+    monkeypatch.setenv('S3_ACCESS_KEY', 'test-access')
+    monkeypatch.setenv('S3_SECRET_KEY', 'test-secret')
+    monkeypatch.setenv('S3_ENDPOINT_URL', f'http://127.0.0.1:{server.server_port}')
+    yield server.state
+    server.shutdown()
+    server.server_close()
+
+
+def test_save_many_uploads_concurrently(app, fake_s3):
+    from colorfulme.services.storage_service import StorageService
+
+    fake_s3['delay'] = 0.2
+    with app.app_context():
+        storage = StorageService()
+        assert storage.uses_s3
+        saved = storage.save_many([(b'png', 'png', 'u/1'), (b'pdf', 'pdf', 'u/1'), (b'<svg/>', 'svg', 'u/1')])
+
+    assert [key.rsplit('.', 1)[1] for key, _url in saved] == ['png', 'pdf', 'svg']
+    assert fake_s3['max_in_flight'] > 1
+    assert fake_s3['objects'][saved[0][0]] == (b'png', 'image/png')
+    assert fake_s3['objects'][saved[2][0]] == (b'<svg/>', 'image/svg+xml')
+    assert all(url.split('?', 1)[0].endswith(key) for key, url in saved)
+
+
+def test_save_many_removes_uploaded_objects_when_one_fails(app, fake_s3):
+    from botocore.exceptions import ClientError
+
+    from colorfulme.services.storage_service import StorageService
+
+    fake_s3['fail_suffix'] = '.svg'
+    with app.app_context():
+        with pytest.raises(ClientError):
+            StorageService().save_many([(b'png', 'png', 'u/2'), (b'<svg/>', 'svg', 'u/2')])
+
+    assert fake_s3['objects'] == {}
+    assert [call for call, _key in fake_s3['calls']] == ['put', 'delete']
+
+
+def test_large_objects_use_multipart_upload(app, fake_s3):
+    from colorfulme.services.storage_service import StorageService
+
+    app.config.update(S3_MULTIPART_THRESHOLD_MB=8, S3_MULTIPART_CHUNK_MB=5)
+    payload = bytes(range(256)) * (12 * 1024 * 1024 // 256)
+    with app.app_context():
+        storage = StorageService()
+        key, _url = storage.save_bytes(payload, extension='pdf', folder='u/books')
+        assert storage.load_bytes(key) == payload
+
+    calls = [call for call, _key in fake_s3['calls']]
+    assert calls == ['create_multipart', 'upload_part', 'upload_part', 'upload_part', 'complete_multipart']
+    assert fake_s3['objects'][key][1] == 'application/pdf'
+
+
+def test_local_writes_leave_no_temp_files(app):
+    from colorfulme.services.storage_service import StorageService
+
+    folder = f'local/{uuid.uuid4().hex}'
+    with app.app_context():
+        storage = StorageService()
+        saved = storage.save_many([(b'one', 'png', folder), (b'two', 'pdf', folder)])
+        storage.write_bytes(saved[0][0], b'three')
+        directory = storage.absolute_local_path(saved[0][0]).parent
+
+    assert sorted(path.name.startswith('.') for path in directory.iterdir()) == [False, False]
+    assert (directory / saved[0][0].rsplit('/', 1)[1]).read_bytes() == b'three'
+
+
+def test_storage_services_share_one_s3_client(app, fake_s3):
+    from colorfulme.services.storage_service import StorageService
+    from colorfulme.utils import metrics
+
+    created = metrics.get('s3.clients.created')
+    reused = metrics.get('s3.clients.reused')
+    with app.app_context():
+        first = StorageService()
+        second = StorageService()
+        key, _url = first.save_bytes(b'png', extension='png', folder='u/4')
+        assert second.load_bytes(key) == b'png'
+
+    assert first._s3_client is second._s3_client
+    assert first._s3_client.meta.config.max_pool_connections == 50
+    assert metrics.get('s3.clients.created') == created + 1
+    assert metrics.get('s3.clients.reused') == reused + 1
+
+
+def test_presigned_urls_are_reused_within_their_window(app, fake_s3, monkeypatch):
+    from colorfulme.services import storage_service
+    from colorfulme.services.storage_service import StorageService, clear_signed_url_cache
+
+    clear_signed_url_cache()
+    now = [2700.0 * 666_667]  # the start of a 2700s reuse window
+    monkeypatch.setattr(storage_service.time, 'time', lambda: now[0])
+    with app.app_context():
+        storage = StorageService()
+        first = storage.get_download_url('u/5/page.png')
+        now[0] += 2000
+        assert StorageService().get_download_url('u/5/page.png') == first
+        assert storage.get_download_url('u/5/page.png', expires_seconds=600) != first
+
+        # 3600s URLs are handed out for at most 2700s after signing, then re-signed.
+        now[0] += 1000
+        assert storage.get_download_url('u/5/page.png') != first
+
+    # A fraction of 1.0 would hand out URLs about to expire; it is capped at 0.9.
+    app.config.update(PRESIGNED_URL_REUSE_FRACTION=1.0)
+    with app.app_context():
+        assert StorageService().signed_url_reuse_fraction == storage_service.MAX_SIGNED_URL_REUSE_FRACTION
+
+
+def test_delete_many_sends_batched_delete_requests(app, fake_s3, monkeypatch):
+    from colorfulme.services import storage_service
+    from colorfulme.services.storage_service import StorageService
+
+    monkeypatch.setattr(storage_service, 'DELETE_BATCH_SIZE', 2)
+    with app.app_context():
+        storage = StorageService()
+        keys = [key for key, _url in storage.save_many([(b'x', 'png', 'u/6')] * 5)]
+        fake_s3['calls'].clear()
+        assert storage.delete_many(keys) == []
+
+    assert fake_s3['objects'] == {}
+    assert [len(batch) for call, batch in fake_s3['calls']] == [2, 2, 1]
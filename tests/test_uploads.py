@@ -0,0 +1,77 @@
+import base64
+from io import BytesIO
+
+from PIL import Image
+import pytest
+
+
+def _encoded(size, fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_spool_base64_decodes_in_chunks(monkeypatch):
+    from colorfulme.services import uploads
+
+    monkeypatch.setattr(uploads, 'BASE64_CHUNK_CHARS', 7)
+    payload = bytes(range(256)) * 3
+    encoded = base64.b64encode(payload).decode('ascii')
+    wrapped = '\n'.join(encoded[i:i + 60] for i in range(0, len(encoded), 60))
+
+    with uploads.spool_base64('data:image/png;base64,' + wrapped, max_bytes=10_000) as spool:
+        assert spool.read() == payload
+
+    with pytest.raises(uploads.UploadTooLarge):
+        uploads.spool_base64(encoded, max_bytes=100)
+    with pytest.raises(ValueError):
+        uploads.spool_base64(encoded[:-1], max_bytes=10_000)
+
+
+def test_prepare_source_image_downscales_only_oversized_images():
+    from colorfulme.services.uploads import UploadTooLarge, WORKING_SIZE, prepare_source_image
+
+    small = _encoded((800, 600))
+    assert prepare_source_image(BytesIO(small), max_decode_bytes=64 * 1024 * 1024) == small
+
+    large = prepare_source_image(BytesIO(_encoded((4000, 3200))), max_decode_bytes=64 * 1024 * 1024)
+    assert Image.open(BytesIO(large)).size == (round(4000 * WORKING_SIZE / 3200), WORKING_SIZE)
+
+    with pytest.raises(UploadTooLarge):
+        prepare_source_image(BytesIO(_encoded((4000, 3200))), max_decode_bytes=32 * 1024 * 1024)
+
+
+def test_large_jpeg_is_sized_at_draft_scale():
+    from colorfulme.services.uploads import prepare_source_image
+
+    # 6400x4800 decodes at 1/2 scale (3200x2400 * 4 bytes ~ 29 MB), so it fits a 32 MB budget as-is.
+    photo = _encoded((6400, 4800), fmt='JPEG')
+    assert prepare_source_image(BytesIO(photo), max_decode_bytes=32 * 1024 * 1024) == photo
+
+
+def test_photo_upload_limits_return_413(client, app, login_user):
+    login_user('upload-limits@example.com')
+    data_url = 'data:image/png;base64,' + base64.b64encode(_encoded((1024, 1024))).decode('ascii')
+
+    app.config.update(SOURCE_IMAGE_MAX_DECODE_MB=1)
+    response = client.post('/api/v1/generations/photo', json={'prompt': 'Trace', 'source_image_base64': data_url})
+    assert response.status_code == 413
+
+    app.config.update(SOURCE_IMAGE_MAX_DECODE_MB=96, SOURCE_IMAGE_MAX_BYTES=1024)
+    response = client.post('/api/v1/generations/photo', json={'prompt': 'Trace', 'source_image_base64': data_url})
+    assert response.status_code == 413
+
+    response = client.post('/api/v1/generations/photo', json={'prompt': 'Trace', 'source_image_base64': 'abc'})
+    assert response.status_code == 400
+
+
+def test_multipart_photo_upload(client, login_user):
+    login_user('upload-multipart@example.com')
+
+    response = client.post(
+        '/api/v1/generations/photo',
+        data={'source_image': (BytesIO(_encoded((640, 480), fmt='JPEG')), 'photo.jpg')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'completed'
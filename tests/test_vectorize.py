@@ -0,0 +1,53 @@
+from collections import defaultdict
+import random
+
+from PIL import Image, ImageDraw
+
+from colorfulme.services import vectorize
+
+
+def _inside(loops, px, py):
+    crossings = 0
+    for loop in loops:
+        for (x0, y0), (x1, y1) in zip(loop, loop[1:] + loop[:1]):
+            if (y0 > py) != (y1 > py) and px < x0 + (py - y0) * (x1 - x0) / (y1 - y0):
+                crossings ^= 1
+    return bool(crossings)
+
+
+def test_traced_outlines_cover_exactly_the_black_pixels():
+    rng = random.Random(7)
+    image = Image.new('L', (23, 17), 255)
+    for y in range(17):
+        for x in range(23):
+            if rng.random() < 0.45:
+                image.putpixel((x, y), 0)
+
+    width, height = image.size
+    black = image.point(lambda p: 1 if p < 128 else 0)
+    segments = defaultdict(list)
+    vectorize._horizontal_runs(black.tobytes(), width, height, segments, transpose=False)
+    vectorize._horizontal_runs(black.transpose(Image.Transpose.TRANSPOSE).tobytes(), height, width, segments, transpose=True)
+    loops = vectorize._chain(segments)
+
+    for y in range(height):
+        for x in range(width):
+            assert _inside(loops, x + 0.5, y + 0.5) == (image.getpixel((x, y)) < 128)
+
+
+def test_trace_drops_specks_and_smooths_curves():
+    image = Image.new('L', (200, 200), 255)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((20, 20, 180, 180), outline=0, width=4)
+    image.putpixel((5, 5), 0)
+
+    outlines = vectorize.trace(image)
+    # Outer and inner edge of the ring; the single-pixel speck is dropped.
+    assert len(outlines) == 2
+    assert any(command[0] == 'Q' for command in outlines[0])
+
+    svg = vectorize.to_svg(outlines, 200, 200)
+    assert svg.startswith(b'<svg') and b'viewBox="0 0 200 200"' in svg
+    pdf = vectorize.to_pdf(outlines, 200, 200, page_size='a4')
+    assert pdf.startswith(b'%PDF-1.4') and pdf.rstrip().endswith(b'%%EOF')
+    assert b'/MediaBox [0 0 595.28 841.89]' in pdf